@@ -0,0 +1,332 @@
+"""Benchmark of the of_core receive path with recorded or synthesized streams.
+
+OpenFlow byte streams sent by a switch are split in chunks of random sizes and
+fed to :meth:`Main.handle_raw_data`, as if read from a socket, using a
+stand-in controller and connections without sockets. Results are written as
+JSON to be compared with those of other commits::
+
+    python -m napps.legacy.of_core.benchmark -o before.json
+    python -m napps.legacy.of_core.benchmark -o after.json -c before.json
+
+A recorded stream is a file with the bytes received from a switch, starting
+with its hello message (e.g. the TCP payload saved by Wireshark with "Follow
+TCP Stream" and "Save as Raw").
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from kytos.core.buffers import KytosBuffers
+from kytos.core.connection import Connection
+from kytos.core.switch import Switch
+from pyof.foundation.basic_types import DPID
+from pyof.utils import PYOF_VERSION_LIBS
+from pyof.v0x04.common.flow_match import Match as MatchV0x04
+from pyof.v0x04.common.flow_match import MatchType
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.counters import get_counters
+from napps.legacy.of_core.main import Main
+from napps.legacy.of_core.simulator import (flow_stats_v0x01,
+                                            flow_stats_v0x04, HEADER,
+                                            message, MULTIPART_V0x04,
+                                            OFPST_FLOW, REPLY_MORE,
+                                            STATS_REPLY, STATS_V0x01)
+
+#: Weight of each message type in synthesized streams
+MIX = (('packet_in', 80), ('echo_request', 10), ('flow_stats', 10))
+
+#: Flows in each flow stats reply fragment of synthesized streams
+FLOWS_PER_FRAGMENT = 20
+
+
+class StandInController:
+    """Controller with buffers and switches, but no server or NApps."""
+
+    def __init__(self):
+        """Create empty buffers."""
+        self.buffers = KytosBuffers()
+        self.switches = {}
+        self.connections = {}
+
+    def get_switch_by_dpid(self, dpid):
+        """Return the switch with ``dpid``, if any."""
+        return self.switches.get(dpid)
+
+    def get_switch_or_create(self, dpid, connection):
+        """Return the switch with ``dpid`` using ``connection``."""
+        switch = self.switches.get(dpid)
+        if switch is None:
+            switch = Switch(dpid)
+            self.switches[dpid] = switch
+        switch.update_connection(connection)
+        return switch
+
+
+class StandInSocket:
+    """Socket that discards the data sent."""
+
+    def sendall(self, data):
+        """Discard ``data``."""
+
+    def shutdown(self, how):
+        """Do nothing."""
+
+    def close(self):
+        """Do nothing."""
+
+
+def _flow_stats_reply(version, xid, fragments, first_index):
+    """Return the fragments of a flow stats reply."""
+    if version == 0x01:
+        header, flow_stats = STATS_V0x01, flow_stats_v0x01
+    else:
+        header, flow_stats = MULTIPART_V0x04, flow_stats_v0x04
+    messages = []
+    for fragment in range(fragments):
+        flags = REPLY_MORE if fragment < fragments - 1 else 0
+        start = first_index + fragment * FLOWS_PER_FRAGMENT
+        body = b''.join(flow_stats(index) for index in
+                        range(start, start + FLOWS_PER_FRAGMENT))
+        messages.append(message(version, STATS_REPLY[version], xid,
+                                header.pack(OFPST_FLOW, flags) + body))
+    return messages
+
+
+def synthesize(version, messages=10000, seed=0):
+    """Return a stream sent by a switch and its number of messages.
+
+    The stream starts with hello and features reply messages, followed by a
+    random mix (:data:`MIX`) of packet in, echo request and flow stats reply
+    messages. Flow stats replies have 1 to 3 fragments.
+    """
+    lib = PYOF_VERSION_LIBS[version]
+    rand = random.Random(seed)
+    features = {'xid': 2, 'datapath_id': DPID('00:00:00:00:00:00:00:01'),
+                'n_buffers': 256, 'n_tables': 1, 'capabilities': 0}
+    if version == 0x01:
+        features.update(actions=0, ports=[])
+        packet_in_fields = {'in_port': 1}
+    else:
+        features.update(auxiliary_id=0, reserved=0)
+        packet_in_fields = {'table_id': 0, 'cookie': 0,
+                            'match': MatchV0x04(
+                                match_type=MatchType.OFPMT_OXM)}
+    stream = [lib.symmetric.hello.Hello(xid=1).pack(),
+              lib.controller2switch.features_reply.FeaturesReply(
+                  **features).pack()]
+    names, weights = zip(*MIX)
+    xid = 3
+    while len(stream) < messages:
+        name = rand.choices(names, weights)[0]
+        if name == 'packet_in':
+            data = bytes(rand.randrange(60, 1500))
+            stream.append(lib.asynchronous.packet_in.PacketIn(
+                xid=xid, buffer_id=xid, total_len=len(data), reason=0,
+                data=data, **packet_in_fields).pack())
+        elif name == 'echo_request':
+            stream.append(lib.symmetric.echo_request.EchoRequest(
+                xid=xid, data=b'').pack())
+        else:
+            stream.extend(_flow_stats_reply(version, xid, rand.randint(1, 3),
+                                            xid))
+        xid += 1
+    return b''.join(stream), len(stream)
+
+
+def count_messages(stream):
+    """Return the number of OpenFlow messages in ``stream``."""
+    total = offset = 0
+    while offset + HEADER.size <= len(stream):
+        offset += max(HEADER.unpack_from(stream, offset)[2], HEADER.size)
+        total += 1
+    return total
+
+
+def split(stream, min_size=1, max_size=4096, seed=0):
+    """Return ``stream`` split in chunks of random sizes."""
+    rand = random.Random(seed)
+    chunks = []
+    offset = 0
+    while offset < len(stream):
+        size = rand.randint(min_size, max_size)
+        chunks.append(stream[offset:offset + size])
+        offset += size
+    return chunks
+
+
+class Replay:
+    """Replay of chunked streams in new connections of an of_core NApp."""
+
+    def __init__(self):
+        """Load of_core with a stand-in controller."""
+        self.controller = StandInController()
+        self.napp = Main(self.controller)
+        self._port = 0
+
+    def run(self, chunks):
+        """Feed ``chunks`` to a new connection.
+
+        Events are consumed after each chunk and features replies are handled
+        to complete the handshake.
+
+        Returns:
+            tuple: The connection and the seconds spent in the receive path.
+        """
+        self._port += 1
+        connection = Connection('127.0.0.1', self._port, StandInSocket())
+        self.controller.connections[connection.id] = connection
+        elapsed = 0.0
+        for chunk in chunks:
+            start = perf_counter()
+            self.napp.handle_raw_data(connection, chunk)
+            elapsed += perf_counter() - start
+            self._consume_events()
+        connection.close()
+        del self.controller.connections[connection.id]
+        return connection, elapsed
+
+    def _consume_events(self):
+        """Discard the events emitted, completing handshakes."""
+        buffers = self.controller.buffers
+        while not buffers.msg_in.empty():
+            event = buffers.msg_in.get()
+            if event.name.endswith('.ofpt_features_reply'):
+                self.napp.complete_handshake(event)
+        for buffer in buffers.msg_out, buffers.app:
+            while not buffer.empty():
+                buffer.get()
+
+
+def measure(replay, chunks, messages, repeat=5):
+    """Return throughput, per-stage times and allocations of ``chunks``.
+
+    Throughput is the median of ``repeat`` replays without timing samples.
+    Stage times come from a replay with all reads sampled, and allocations
+    from another one traced by tracemalloc: the peak memory allocated and the
+    memory still allocated for the closed connection.
+    """
+    sample_rate = settings.TIMING_SAMPLE_RATE
+    try:
+        settings.TIMING_SAMPLE_RATE = 0
+        elapsed = median(replay.run(chunks)[1] for _ in range(repeat))
+        settings.TIMING_SAMPLE_RATE = 1
+        connection, _ = replay.run(chunks)
+    finally:
+        settings.TIMING_SAMPLE_RATE = sample_rate
+    timing = get_counters(connection).as_dict()['timing']
+    stages = {stage: timing[stage]['total'] for stage in
+              ('slicer', 'unpack', 'emit') if stage in timing}
+
+    settings.TIMING_SAMPLE_RATE = 0
+    gc.collect()
+    tracemalloc.start()
+    try:
+        connection, _ = replay.run(chunks)
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        settings.TIMING_SAMPLE_RATE = sample_rate
+
+    size = sum(len(chunk) for chunk in chunks)
+    return {'messages': messages,
+            'bytes': size,
+            'chunks': len(chunks),
+            'seconds': elapsed,
+            'messages_per_sec': messages / elapsed,
+            'bytes_per_sec': size / elapsed,
+            'stage_seconds': stages,
+            'allocations': {'peak_bytes': peak,
+                            'retained_bytes': retained}}
+
+
+def _commit():
+    """Return the git commit of this file, if known."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=str(Path(__file__).parent),
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Return lines with the throughput change of each stream in percent."""
+    lines = []
+    for name, result in sorted(results['streams'].items()):
+        old = baseline['streams'].get(name)
+        if old is None:
+            continue
+        change = (result['messages_per_sec'] / old['messages_per_sec'] - 1)
+        lines.append('%s: %+.1f%% messages/sec (%.0f -> %.0f)' %
+                     (name, change * 100, old['messages_per_sec'],
+                      result['messages_per_sec']))
+    return lines
+
+
+def _parse_args(args):
+    """Return the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Replay OpenFlow streams through of_core.')
+    parser.add_argument('-s', '--stream', action='append', default=[],
+                        help='recorded stream file (default: synthesized'
+                        ' OpenFlow 1.0 and 1.3 streams)')
+    parser.add_argument('-n', '--messages', type=int, default=10000,
+                        help='messages in synthesized streams')
+    parser.add_argument('--min-chunk', type=int, default=1,
+                        help='minimum chunk size in bytes')
+    parser.add_argument('--max-chunk', type=int, default=4096,
+                        help='maximum chunk size in bytes')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='replays of each stream to time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='JSON results file')
+    parser.add_argument('-c', '--compare',
+                        help='JSON results file to compare with')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Run the benchmark from the command line."""
+    args = _parse_args(args)
+    streams = {}
+    for path in args.stream:
+        stream = Path(path).read_bytes()
+        streams[Path(path).name] = (stream, count_messages(stream))
+    if not streams:
+        for version in settings.OPENFLOW_VERSIONS:
+            streams['synthesized_v0x%02x' % version] = synthesize(
+                version, args.messages, args.seed)
+
+    replay = Replay()
+    results = {'commit': _commit(),
+               'date': datetime.now(timezone.utc).isoformat(),
+               'python': platform.python_version(),
+               'streams': {}}
+    for name, (stream, messages) in sorted(streams.items()):
+        chunks = split(stream, args.min_chunk, args.max_chunk, args.seed)
+        result = measure(replay, chunks, messages, args.repeat)
+        results['streams'][name] = result
+        print('%s: %.0f messages/sec, %.1f MB/sec' %
+              (name, result['messages_per_sec'],
+               result['bytes_per_sec'] / 1e6))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print('\n'.join(compare(results, baseline)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
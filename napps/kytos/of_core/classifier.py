@@ -0,0 +1,209 @@
+"""Tuple space search classifier of packet headers over flows.
+
+Flows are grouped by the fields and masks they match (their tuple). Each
+tuple has a hash table of the masked field values of its flows, so a lookup
+takes one hash lookup per tuple instead of a comparison per flow. Tuples are
+searched in decreasing order of their highest flow priority, and the search
+stops when no remaining tuple can have a higher priority than the best match.
+"""
+import socket
+from bisect import bisect_left, insort
+
+#: Header fields that flows can match
+HEADER_FIELDS = ('in_port', 'dl_src', 'dl_dst', 'dl_vlan', 'dl_vlan_pcp',
+                 'dl_type', 'nw_proto', 'nw_src', 'nw_dst', 'tp_src',
+                 'tp_dst')
+
+#: OpenFlow 1.0 wildcard bits (OFPFW_*) of fields matched exactly
+WILDCARD_BITS = (('in_port', 1 << 0), ('dl_vlan', 1 << 1),
+                 ('dl_src', 1 << 2), ('dl_dst', 1 << 3),
+                 ('dl_type', 1 << 4), ('nw_proto', 1 << 5),
+                 ('tp_src', 1 << 6), ('tp_dst', 1 << 7),
+                 ('dl_vlan_pcp', 1 << 20))
+
+#: Shift of the number of wildcarded bits of IPv4 addresses (OFPFW_NW_*)
+WILDCARD_SHIFTS = (('nw_src', 8), ('nw_dst', 14))
+
+#: Mask of a field matched exactly
+EXACT = -1
+
+
+def to_int(value):
+    """Return a port, hardware address or IPv4 address as an integer.
+
+    Raises:
+        ValueError: if ``value`` is not valid.
+    """
+    if isinstance(value, int):
+        return value
+    if ':' in value:
+        return int(value.replace(':', ''), 16)
+    try:
+        return int.from_bytes(socket.inet_aton(value), 'big')
+    except OSError:
+        raise ValueError('invalid address: %s' % value)
+
+
+def _value_mask(value):
+    """Return the value and mask of a field value, maybe with a mask."""
+    if isinstance(value, int):
+        return value, EXACT
+    value, _, mask = value.partition('/')
+    if not mask:
+        return to_int(value), EXACT
+    if mask.isdigit():
+        return to_int(value), (1 << 32) - (1 << 32 - int(mask))
+    return to_int(value), to_int(mask)
+
+
+def get_rule(flow):
+    """Return the tuple and masked values matched by ``flow``.
+
+    OpenFlow 1.0 flows match the fields not wildcarded by ``flow.wildcards``.
+    Other flows match the fields that are not None.
+
+    Returns:
+        tuple: ((field, mask) pairs, masked values), or None if the flow
+            matches fields other than :data:`HEADER_FIELDS`.
+    """
+    if flow.oxm_fields:
+        return None
+    if flow.wildcards is None:
+        fields = [(name, getattr(flow, name)) for name in HEADER_FIELDS
+                  if getattr(flow, name) is not None]
+    else:
+        fields = [(name, getattr(flow, name)) for name, bit in WILDCARD_BITS
+                  if not flow.wildcards & bit]
+        for name, shift in WILDCARD_SHIFTS:
+            bits = flow.wildcards >> shift & 0x3f
+            if bits < 32:
+                fields.append((name, '%s/%d' % (getattr(flow, name),
+                                                32 - bits)))
+    pairs = []
+    values = []
+    try:
+        for name, value in sorted(fields):
+            value, mask = _value_mask(value)
+            pairs.append((name, mask))
+            values.append(value & mask)
+    except (AttributeError, ValueError):
+        return None
+    return tuple(pairs), tuple(values)
+
+
+class Subtable:
+    """Flows of a tuple by their masked values."""
+
+    def __init__(self, pairs):
+        """Create an empty table of the (field, mask) ``pairs``."""
+        self.pairs = pairs
+        #: Sorted lists of (-priority, item), highest priority first, by
+        #: values
+        self.rules = {}
+        #: Number of rules by priority
+        self.priorities = {}
+        self.max_priority = -1
+
+    def key(self, header):
+        """Return the masked values of ``header``, or None if incomplete."""
+        try:
+            return tuple(header[name] & mask for name, mask in self.pairs)
+        except KeyError:
+            return None
+
+    def add(self, values, priority, item):
+        """Add ``item`` with ``priority`` and masked ``values``."""
+        insort(self.rules.setdefault(values, []), (-priority, item))
+        self.priorities[priority] = self.priorities.get(priority, 0) + 1
+        self.max_priority = max(self.max_priority, priority)
+
+    def remove(self, values, priority, item):
+        """Remove ``item`` added with ``priority``, if present."""
+        rules = self.rules.get(values)
+        if rules is None:
+            return
+        index = bisect_left(rules, (-priority, item))
+        if index == len(rules) or rules[index] != (-priority, item):
+            return
+        del rules[index]
+        if not rules:
+            del self.rules[values]
+        count = self.priorities[priority] - 1
+        if count:
+            self.priorities[priority] = count
+        else:
+            del self.priorities[priority]
+            if priority == self.max_priority:
+                self.max_priority = max(self.priorities, default=-1)
+
+
+class Classifier:
+    """Flows by tuple, to find the flow of highest priority for a packet.
+
+    Items added are any orderable values identifying the flows, such as rows
+    of a flow table.
+    """
+
+    def __init__(self):
+        """Create an empty classifier."""
+        self._subtables = {}
+        #: Subtables by decreasing highest priority, sorted on the next lookup
+        self._sorted = None
+
+    def __len__(self):
+        """Return the number of tuples."""
+        return len(self._subtables)
+
+    def add(self, item, flow):
+        """Add ``item`` matching as ``flow``.
+
+        Returns:
+            bool: Whether the flow could be added.
+        """
+        rule = get_rule(flow)
+        if rule is None:
+            return False
+        pairs, values = rule
+        subtable = self._subtables.get(pairs)
+        if subtable is None:
+            subtable = self._subtables[pairs] = Subtable(pairs)
+        subtable.add(values, flow.priority, item)
+        self._sorted = None
+        return True
+
+    def remove(self, item, flow):
+        """Remove ``item`` added with ``flow``."""
+        rule = get_rule(flow)
+        if rule is None:
+            return
+        pairs, values = rule
+        subtable = self._subtables.get(pairs)
+        if subtable is not None:
+            subtable.remove(values, flow.priority, item)
+            if not subtable.rules:
+                del self._subtables[pairs]
+            self._sorted = None
+
+    def lookup(self, header):
+        """Return the item of highest priority matching ``header``.
+
+        Args:
+            header (dict): Integer values of :data:`HEADER_FIELDS` by name
+                (see :func:`to_int`). Flows matching missing fields do not
+                match.
+
+        Returns:
+            The item of the matching flow, or None.
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self._subtables.values(),
+                                  key=lambda subtable: -subtable.max_priority)
+        best = None
+        best_priority = -1
+        for subtable in self._sorted:
+            if subtable.max_priority <= best_priority:
+                break
+            rules = subtable.rules.get(subtable.key(header))
+            if rules and -rules[0][0] > best_priority:
+                best_priority, best = -rules[0][0], rules[0][1]
+        return best
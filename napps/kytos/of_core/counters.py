@@ -0,0 +1,161 @@
+"""Per-connection OpenFlow traffic counters and timing."""
+from collections import Counter
+from itertools import count
+from threading import Lock
+
+from kytos.core.helpers import now
+from pyof.foundation.base import GenericMessage
+from pyof.utils import PYOF_VERSION_LIBS
+
+from napps.legacy.of_core import settings
+
+#: Calls to :func:`is_sampled`
+_CALLS = count()
+
+
+def is_sampled():
+    """Whether the next read or listener call should be timed.
+
+    One in each :data:`settings.TIMING_SAMPLE_RATE` calls is timed. Timing is
+    disabled if the rate is zero.
+    """
+    rate = settings.TIMING_SAMPLE_RATE
+    return rate > 0 and next(_CALLS) % rate == 0
+
+
+def sample_queue_wait(event):
+    """Time how long a message ``event`` waited to be dispatched, if sampled.
+
+    Called by of_core listeners of incoming messages.
+    """
+    if is_sampled():
+        get_counters(event.source).add_queue_wait(event)
+
+
+def get_counters(connection):
+    """Return the counters of ``connection``, creating them if needed.
+
+    The counters are kept in the connection, so they are discarded with it.
+    """
+    counters = getattr(connection, 'counters', None)
+    if counters is None:
+        counters = ConnectionCounters()
+        connection.counters = counters
+    return counters
+
+
+def count_message_out(event):
+    """Count the message of an event written to its destination.
+
+    Called by of_core for every message written, including messages sent by
+    other NApps. python-openflow messages are counted by their header, whose
+    length was set when the controller packed them, so they are not packed
+    again.
+    """
+    message = event.content['message']
+    if isinstance(message, GenericMessage):
+        packet = message.header.pack()
+    else:
+        packet = message.pack()
+    get_counters(event.destination).count_out(packet)
+
+
+class Timer:
+    """Accumulate durations of a processing stage."""
+
+    def __init__(self):
+        """Start with no samples."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add a sample of ``seconds``."""
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        """Return sample count, total, average and maximum in seconds."""
+        average = self.total / self.count if self.count else 0.0
+        return {'count': self.count, 'total': self.total, 'avg': average,
+                'max': self.max}
+
+
+class ConnectionCounters:
+    """Messages, bytes and processing time of a single connection.
+
+    Messages are counted by their header fields, without unpacking them.
+    """
+
+    #: Stages timed when a read is sampled
+    STAGES = ('slicer', 'unpack', 'emit', 'queue_wait')
+
+    def __init__(self):
+        """Start all counters at zero."""
+        self.bytes_in = 0
+        self.bytes_out = 0
+        #: Messages in and out by (version, message type)
+        self.messages_in = Counter()
+        self.messages_out = Counter()
+        self.timers = {stage: Timer() for stage in self.STAGES}
+        self._lock = Lock()
+
+    def count_read(self, data):
+        """Count bytes read from the connection."""
+        with self._lock:
+            self.bytes_in += len(data)
+
+    def count_in(self, packet):
+        """Count an incoming message by its header."""
+        with self._lock:
+            self.messages_in[packet[0], packet[1]] += 1
+
+    def count_out(self, buffer):
+        """Count each message in an outgoing ``buffer`` and its bytes.
+
+        Bytes are counted by the lengths in the headers, so ``buffer`` may be
+        only the header of a message.
+        """
+        with self._lock:
+            offset = 0
+            while offset + 4 <= len(buffer):
+                self.messages_out[buffer[offset], buffer[offset + 1]] += 1
+                length = int.from_bytes(buffer[offset + 2:offset + 4], 'big')
+                self.bytes_out += length
+                offset += max(length, 8)
+
+    def add_time(self, stage, seconds):
+        """Add a sample of ``seconds`` spent in ``stage``."""
+        with self._lock:
+            self.timers[stage].add(seconds)
+
+    def add_queue_wait(self, event):
+        """Add the time since ``event`` was created as queue wait sample."""
+        self.add_time('queue_wait',
+                      (now() - event.timestamp).total_seconds())
+
+    def as_dict(self):
+        """Return all the counters as a JSON serializable dictionary."""
+        with self._lock:
+            return {'bytes_in': self.bytes_in,
+                    'bytes_out': self.bytes_out,
+                    'messages_in': self._by_type(self.messages_in),
+                    'messages_out': self._by_type(self.messages_out),
+                    'timing': {stage: timer.as_dict()
+                               for stage, timer in self.timers.items()}}
+
+    @staticmethod
+    def _by_type(messages):
+        """Use message type names as keys, as in event names."""
+        by_type = {}
+        for (version, message_type), total in messages.items():
+            try:
+                type_enum = PYOF_VERSION_LIBS[version].common.header.Type
+                name = type_enum(message_type).name.lower()
+            except (KeyError, ValueError):
+                name = 'unknown'
+            key = 'v0x%0.2x.%s' % (version, name)
+            by_type[key] = by_type.get(key, 0) + total
+        return by_type
@@ -0,0 +1,98 @@
+"""Round-trip time of echo requests and unresponsive switch detection."""
+import struct
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+from napps.legacy.of_core import settings
+
+
+def get_echo_monitor(connection):
+    """Return the echo monitor of ``connection``, creating it if needed."""
+    monitor = getattr(connection, 'echo_monitor', None)
+    if monitor is None:
+        monitor = EchoMonitor()
+        connection.echo_monitor = monitor
+    return monitor
+
+
+class EchoMonitor:
+    """Track echo requests sent through a connection and their replies.
+
+    Each echo request carries a sequence number and the time it was sent, so
+    the round-trip time is calculated from the reply alone.
+    """
+
+    #: Prefix of the echo data, followed by sequence number and send time
+    PREFIX = b'kytosd'
+    PAYLOAD = struct.Struct('!Id')
+
+    def __init__(self):
+        """Start without echoes sent."""
+        self._sequence = 0
+        #: Send time of the echoes not answered yet by sequence number
+        self._pending = {}
+        #: Latest round-trip times in seconds
+        self._rtts = deque(maxlen=settings.ECHO_RTT_SAMPLES)
+        self._lock = Lock()
+
+    @property
+    def missed(self):
+        """Number of echoes sent after the last one replied."""
+        return len(self._pending)
+
+    def new_data(self):
+        """Return the data for a new echo request."""
+        with self._lock:
+            self._sequence = sequence = (self._sequence + 1) % 2**32
+            sent_at = monotonic()
+            self._pending[sequence] = sent_at
+        return self.PREFIX + self.PAYLOAD.pack(sequence, sent_at)
+
+    def clear(self):
+        """Stop waiting for the echoes sent so far.
+
+        Used when other data from the switch shows that it is alive.
+        """
+        with self._lock:
+            self._pending.clear()
+
+    def reply(self, data):
+        """Account for the echo reply with ``data``.
+
+        Echoes sent before the replied one are not waited for anymore.
+
+        Returns:
+            float: round-trip time in seconds or None if ``data`` was not
+            created by :meth:`new_data`.
+        """
+        size = len(self.PREFIX) + self.PAYLOAD.size
+        if len(data) != size or not data.startswith(self.PREFIX):
+            return None
+        sequence, sent_at = self.PAYLOAD.unpack_from(data, len(self.PREFIX))
+        rtt = monotonic() - sent_at
+        with self._lock:
+            if self._pending.pop(sequence, None) is None:
+                return None
+            self._pending = {seq: sent for seq, sent in self._pending.items()
+                             if sent > sent_at}
+            self._rtts.append(rtt)
+        return rtt
+
+    def as_dict(self):
+        """Return missed echoes and round-trip time percentiles in seconds."""
+        with self._lock:
+            rtts = sorted(self._rtts)
+            last = self._rtts[-1] if self._rtts else None
+        return {'missed': self.missed,
+                'samples': len(rtts),
+                'last': last,
+                'p50': self._percentile(rtts, 0.5),
+                'p99': self._percentile(rtts, 0.99)}
+
+    @staticmethod
+    def _percentile(values, fraction):
+        """Nearest-rank percentile of sorted ``values``."""
+        if not values:
+            return None
+        return values[round(fraction * (len(values) - 1))]
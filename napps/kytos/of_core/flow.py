@@ -2,26 +2,72 @@
 
 import hashlib
 import json
+from operator import attrgetter
 
 from pyof.v0x01.common.action import ActionOutput, ActionType
 from pyof.v0x01.common.flow_match import Match
 from pyof.v0x01.controller2switch.flow_mod import FlowMod, FlowModCommand
 
 
+#: Attributes that identify a flow, in the order of :attr:`Flow.key`
+FLOW_FIELDS = ('idle_timeout', 'hard_timeout', 'cookie', 'priority',
+               'table_id', 'buffer_id', 'wildcards', 'in_port', 'dl_src',
+               'dl_dst', 'dl_vlan', 'dl_vlan_pcp', 'dl_type', 'nw_proto',
+               'nw_src', 'nw_dst', 'tp_src', 'tp_dst', 'oxm_fields',
+               'actions')
+
+
+def _read_only(name):
+    """Return a property reading the private slot of attribute ``name``."""
+    return property(attrgetter('_' + name),
+                    doc='Read-only ``%s`` of the flow.' % name)
+
+
 class Flow(object):
     """Class to abstract a Flow to switches.
 
     This class represents a Flow installed or to be installed inside the
     switch. A flow, in this case is represented by a Match object and a set of
     actions that should occur in case any match happen.
+
+    The attributes in :data:`FLOW_FIELDS` identify the flow and are read
+    only, since its key is computed only once. Flows with the same key are
+    equal and have the same hash and id.
     """
 
+    __slots__ = tuple('_' + name for name in FLOW_FIELDS) + (
+        'packet_count', 'byte_count', 'duration_sec', '_key', '_hash', '_id')
+
+    idle_timeout = _read_only('idle_timeout')
+    hard_timeout = _read_only('hard_timeout')
+    cookie = _read_only('cookie')
+    priority = _read_only('priority')
+    table_id = _read_only('table_id')
+    buffer_id = _read_only('buffer_id')
+    wildcards = _read_only('wildcards')
+    in_port = _read_only('in_port')
+    dl_src = _read_only('dl_src')
+    dl_dst = _read_only('dl_dst')
+    dl_vlan = _read_only('dl_vlan')
+    dl_vlan_pcp = _read_only('dl_vlan_pcp')
+    dl_type = _read_only('dl_type')
+    nw_proto = _read_only('nw_proto')
+    nw_src = _read_only('nw_src')
+    nw_dst = _read_only('nw_dst')
+    tp_src = _read_only('tp_src')
+    tp_dst = _read_only('tp_dst')
+    oxm_fields = _read_only('oxm_fields')
+    actions = _read_only('actions')
+    #: Values of :data:`FLOW_FIELDS`, with the OXM fields sorted
+    key = _read_only('key')
+
     # pylint: disable=too-many-arguments,too-many-locals
     def __init__(self, idle_timeout=0, hard_timeout=0, cookie=0,  # noqa
                  priority=0, table_id=0xff, buffer_id=None, wildcards=None,
                  in_port=None, dl_src=None, dl_dst=None, dl_vlan=None,
                  dl_vlan_pcp=None, dl_type=None, nw_proto=None, nw_src=None,
-                 nw_dst=None, tp_src=None, tp_dst=None, actions=None):
+                 nw_dst=None, tp_src=None, tp_dst=None, actions=None,
+                 oxm_fields=None):
         """Assign parameters to attributes.
 
         Args:
@@ -43,63 +89,73 @@ class Flow(object):
             tp_src (int): TCP/UDP source port.
             tp_dst (int): TCP/UDP destination port.
             actions (|list_of_actions|): List of action to apply.
+            oxm_fields (dict): OpenFlow 1.3 match fields without an attribute
+                above, by name.
         """
-        if actions is None:
-            actions = []
-        self.idle_timeout = idle_timeout
-        self.hard_timeout = hard_timeout
-        self.cookie = cookie
-        self.priority = priority
-        self.table_id = table_id
-        self.buffer_id = buffer_id
-        self.wildcards = wildcards
-        self.in_port = in_port
-        self.dl_src = dl_src
-        self.dl_dst = dl_dst
-        self.dl_vlan = dl_vlan
-        self.dl_vlan_pcp = dl_vlan_pcp
-        self.dl_type = dl_type
-        self.nw_proto = nw_proto
-        self.nw_src = nw_src
-        self.nw_dst = nw_dst
-        self.tp_src = tp_src
-        self.tp_dst = tp_dst
-        self.actions = actions
+        self._idle_timeout = idle_timeout
+        self._hard_timeout = hard_timeout
+        self._cookie = cookie
+        self._priority = priority
+        self._table_id = table_id
+        self._buffer_id = buffer_id
+        self._wildcards = wildcards
+        self._in_port = in_port
+        self._dl_src = dl_src
+        self._dl_dst = dl_dst
+        self._dl_vlan = dl_vlan
+        self._dl_vlan_pcp = dl_vlan_pcp
+        self._dl_type = dl_type
+        self._nw_proto = nw_proto
+        self._nw_src = nw_src
+        self._nw_dst = nw_dst
+        self._tp_src = tp_src
+        self._tp_dst = tp_dst
+        self._actions = tuple(actions) if actions else ()
+        self._oxm_fields = oxm_fields or None
+        #: Counters from the latest flow stats, not part of the flow id
+        self.packet_count = 0
+        self.byte_count = 0
+        self.duration_sec = 0
+        self._key = (idle_timeout, hard_timeout, cookie, priority, table_id,
+                     buffer_id, wildcards, in_port, dl_src, dl_dst, dl_vlan,
+                     dl_vlan_pcp, dl_type, nw_proto, nw_src, nw_dst, tp_src,
+                     tp_dst,
+                     tuple(sorted(oxm_fields.items())) if oxm_fields else None,
+                     self._actions)
+        self._hash = None
+        self._id = None
+
+    def __eq__(self, other):
+        """Whether ``other`` is a flow with the same key."""
+        if not isinstance(other, Flow):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        """Return the hash of the key, computed on the first call."""
+        if self._hash is None:
+            self._hash = hash(self.key)
+        return self._hash
+
+    def __repr__(self):
+        """Return the class and the key."""
+        return 'Flow%r' % (self.key,)
 
     @property
     def id(self):  # pylint: disable=invalid-name
-        """Return the hash of the object.
+        """Return the MD5 hex digest of the flow key.
 
-        Calculates the hash of the object by using the hashlib we use md5 of
-        strings.
+        The digest is computed on the first access from the repr of the key,
+        which has only numbers, strings, None and tuples, and is the same in
+        every run.
 
         Returns:
             string: Hash of object.
 
         """
-        hash_result = hashlib.md5()
-        hash_result.update(str(self.idle_timeout).encode('utf-8'))
-        hash_result.update(str(self.hard_timeout).encode('utf-8'))
-        hash_result.update(str(self.cookie).encode('utf-8'))
-        hash_result.update(str(self.priority).encode('utf-8'))
-        hash_result.update(str(self.table_id).encode('utf-8'))
-        hash_result.update(str(self.buffer_id).encode('utf-8'))
-        hash_result.update(str(self.wildcards).encode('utf-8'))
-        hash_result.update(str(self.in_port).encode('utf-8'))
-        hash_result.update(str(self.dl_src).encode('utf-8'))
-        hash_result.update(str(self.dl_dst).encode('utf-8'))
-        hash_result.update(str(self.dl_vlan).encode('utf-8'))
-        hash_result.update(str(self.dl_vlan_pcp).encode('utf-8'))
-        hash_result.update(str(self.dl_type).encode('utf-8'))
-        hash_result.update(str(self.nw_proto).encode('utf-8'))
-        hash_result.update(str(self.nw_src).encode('utf-8'))
-        hash_result.update(str(self.nw_dst).encode('utf-8'))
-        hash_result.update(str(self.tp_src).encode('utf-8'))
-        hash_result.update(str(self.tp_dst).encode('utf-8'))
-        for action in self.actions:
-            hash_result.update(action.id.encode('utf-8'))
-
-        return hash_result.hexdigest()
+        if self._id is None:
+            self._id = hashlib.md5(repr(self.key).encode('utf-8')).hexdigest()
+        return self._id
 
     def as_dict(self):
         """Return the representation of a flow as a python dictionary.
@@ -122,10 +178,17 @@ class Flow(object):
                                    "dl_vlan": self.dl_vlan,
                                    "dl_vlan_pcp": self.dl_vlan_pcp,
                                    "dl_type": self.dl_type,
+                                   "nw_proto": self.nw_proto,
                                    "nw_src": self.nw_src,
                                    "nw_dst": self.nw_dst,
                                    "tp_src": self.tp_src,
-                                   "tp_dst": self.tp_dst}}
+                                   "tp_dst": self.tp_dst,
+                                   "packet_count": self.packet_count,
+                                   "byte_count": self.byte_count,
+                                   "duration_sec": self.duration_sec}}
+
+        if self.oxm_fields:
+            dictionary_rep["flow"]["oxm_fields"] = self.oxm_fields
 
         actions = []
         for action in self.actions:
@@ -162,6 +225,9 @@ class Flow(object):
     def from_dict(dict_content):
         """Build a Flow object from a python dict.
 
+        Keys other than the Flow arguments, such as the id and counters of
+        :meth:`as_dict`, are ignored.
+
         Args:
             dict_content (dict): Python dictionary with flow attributes.
 
@@ -169,19 +235,12 @@ class Flow(object):
             :class:`Flow`: Flow built from json.
 
         """
-        flow = Flow()
-
-        for attribute_name, value in dict_content.items():
-            # "actions" key has a list of actions as value, and each action on
-            # the list must be created separately
-            if attribute_name == "actions":
-                for action_dict in value:
-                    action = OutputAction.from_dict(action_dict)
-                    flow.actions.append(action)
-            else:
-                setattr(flow, attribute_name, value)
-
-        return flow
+        attributes = {name: value for name, value in dict_content.items()
+                      if name in FLOW_FIELDS and name != 'actions'}
+        # Each action on the list must be created separately
+        actions = [OutputAction.from_dict(action_dict)
+                   for action_dict in dict_content.get('actions', [])]
+        return Flow(actions=actions, **attributes)
 
     @staticmethod
     def from_flow_stats(flow_stats):
@@ -194,29 +253,41 @@ class Flow(object):
             :class:`Flow`: Flow built from json.
 
         """
-        flow = Flow()
-        flow.idle_timeout = flow_stats.idle_timeout.value
-        flow.hard_timeout = flow_stats.hard_timeout.value
-        flow.cookie = flow_stats.cookie.value
-        flow.priority = flow_stats.priority.value
-        flow.table_id = flow_stats.table_id.value
-        flow.wildcards = flow_stats.match.wildcards.value
-        flow.in_port = flow_stats.match.in_port.value
-        flow.dl_src = flow_stats.match.dl_src.value
-        flow.dl_dst = flow_stats.match.dl_dst.value
-        flow.dl_vlan = flow_stats.match.dl_vlan.value
-        flow.dl_vlan_pcp = flow_stats.match.dl_vlan_pcp.value
-        flow.dl_type = flow_stats.match.dl_type.value
-        flow.nw_src = flow_stats.match.nw_src.value
-        flow.nw_dst = flow_stats.match.nw_dst.value
-        flow.tp_src = flow_stats.match.tp_src.value
-        flow.tp_dst = flow_stats.match.tp_dst.value
-        flow.actions = []
-        for ofp_action in flow_stats.actions:
-            if ofp_action.action_type == ActionType.OFPAT_OUTPUT:
-                flow.actions.append(OutputAction.from_of_action(ofp_action))
+        match = flow_stats.match
+        actions = [OutputAction.from_of_action(ofp_action)
+                   for ofp_action in flow_stats.actions
+                   if ofp_action.action_type == ActionType.OFPAT_OUTPUT]
+        flow = Flow(idle_timeout=flow_stats.idle_timeout.value,
+                    hard_timeout=flow_stats.hard_timeout.value,
+                    cookie=flow_stats.cookie.value,
+                    priority=flow_stats.priority.value,
+                    table_id=flow_stats.table_id.value,
+                    wildcards=match.wildcards.value,
+                    in_port=match.in_port.value,
+                    dl_src=match.dl_src.value,
+                    dl_dst=match.dl_dst.value,
+                    dl_vlan=match.dl_vlan.value,
+                    dl_vlan_pcp=match.dl_vlan_pcp.value,
+                    dl_type=match.dl_type.value,
+                    nw_proto=match.nw_proto.value,
+                    nw_src=match.nw_src.value,
+                    nw_dst=match.nw_dst.value,
+                    tp_src=match.tp_src.value,
+                    tp_dst=match.tp_dst.value,
+                    actions=actions)
+        flow.update_counters(flow_stats)
         return flow
 
+    def update_counters(self, flow_stats):
+        """Update packet, byte and duration counters from a stats reply.
+
+        Args:
+            flow_stats (FlowStats): Flow stats of this flow.
+        """
+        self.packet_count = flow_stats.packet_count.value
+        self.byte_count = flow_stats.byte_count.value
+        self.duration_sec = flow_stats.duration_sec.value
+
     def as_flow_mod(self, flow_type=FlowModCommand.OFPFC_ADD):
         """Transform a Flow object into a flow_mod message.
 
@@ -254,7 +325,31 @@ class Flow(object):
 
 
 class FlowAction(object):
-    """FlowAction represents a action to be executed once a flow is actived."""
+    """FlowAction represents a action to be executed once a flow is actived.
+
+    Actions are values: those of the same class and attributes are equal.
+    """
+
+    __slots__ = ()
+
+    def _values(self):
+        """Return the attribute values in the order of ``__slots__``."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        """Whether ``other`` is the same action with the same attributes."""
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        """Return the hash of the class name and attributes."""
+        return hash((type(self).__name__,) + self._values())
+
+    def __repr__(self):
+        """Return the class and attributes, as part of the flow id."""
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join(map(repr, self._values())))
 
     @staticmethod
     def from_dict(dict_content):
@@ -269,6 +364,8 @@ class FlowAction(object):
 class OutputAction(FlowAction):
     """FlowAction represents a change in forwarding network into a port."""
 
+    __slots__ = ('output_port',)
+
     def __init__(self, output_port):
         """Require an output port.
 
@@ -338,6 +435,8 @@ class OutputAction(FlowAction):
 class DLChangeAction(FlowAction):
     """FlowAction that represents a change in hardware address."""
 
+    __slots__ = ('dl_src', 'dl_dst')
+
     def __init__(self, dl_src=None, dl_dst=None):
         """Require source and destination DLs.
 
@@ -352,6 +451,8 @@ class DLChangeAction(FlowAction):
 class NWChangeAction(FlowAction):
     """FlowAction that represents new change in ip address."""
 
+    __slots__ = ('nw_src', 'nw_dst')
+
     def __init__(self, nw_src, nw_dst):
         """Contructor receive the parameters below.
 
@@ -0,0 +1,205 @@
+"""Columnar storage of the flows of a switch.
+
+Fixed-width flow fields and counters are kept in arrays, one row per flow.
+Values that do not fit a column (masked addresses, enums, etc.), OXM fields
+and actions are kept in a side table of shared tuples. Flow objects are only
+created on demand, as views of a row.
+
+Counters are written per row by flow table updates. Aggregations read whole
+columns, or the rows of an index, with C-level iteration instead of building
+a Flow per row.
+"""
+import socket
+from array import array
+
+from napps.legacy.of_core.flow import Flow, FLOW_FIELDS, OutputAction
+
+#: Fixed-width Flow fields and their array type codes
+COLUMNS = (('idle_timeout', 'H'), ('hard_timeout', 'H'), ('cookie', 'Q'),
+           ('priority', 'H'), ('table_id', 'B'), ('buffer_id', 'I'),
+           ('wildcards', 'I'), ('in_port', 'I'), ('dl_src', 'Q'),
+           ('dl_dst', 'Q'), ('dl_vlan', 'H'), ('dl_vlan_pcp', 'B'),
+           ('dl_type', 'H'), ('nw_proto', 'B'), ('nw_src', 'I'),
+           ('nw_dst', 'I'), ('tp_src', 'H'), ('tp_dst', 'H'))
+
+#: Flow counters and their array type codes
+COUNTERS = (('packet_count', 'Q'), ('byte_count', 'Q'),
+            ('duration_sec', 'I'))
+
+
+def _encode_mac(value):
+    """Return a hardware address string as an integer."""
+    return int(value.replace(':', ''), 16)
+
+
+def _decode_mac(value):
+    """Return an integer as a hardware address string."""
+    digits = '%012x' % value
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def _encode_ipv4(value):
+    """Return an IPv4 address string as an integer."""
+    return int.from_bytes(socket.inet_aton(value), 'big')
+
+
+def _decode_ipv4(value):
+    """Return an integer as an IPv4 address string."""
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+#: Conversion of string fields to and from integers
+CODECS = {'dl_src': (_encode_mac, _decode_mac),
+          'dl_dst': (_encode_mac, _decode_mac),
+          'nw_src': (_encode_ipv4, _decode_ipv4),
+          'nw_dst': (_encode_ipv4, _decode_ipv4)}
+
+
+class FlowColumns:
+    """Flow fields and counters in arrays, with a side table.
+
+    Rows of removed flows are reused by new flows. Each row has a bitmask of
+    the columns holding its values; other fields are None or in the side
+    table.
+    """
+
+    def __init__(self):
+        """Create empty columns."""
+        #: Arrays by Flow attribute
+        self.columns = {name: array(code) for name, code in
+                        COLUMNS + COUNTERS}
+        #: Bit of each column in the ``present`` mask
+        self._bits = {name: 1 << bit for bit, (name, _) in
+                      enumerate(COLUMNS)}
+        #: Name, array, bit, maximum value and codec of each column
+        self._fields = tuple(
+            (name, self.columns[name], self._bits[name],
+             (1 << 8 * self.columns[name].itemsize) - 1, CODECS.get(name))
+            for name, _ in COLUMNS)
+        self._present = array('I')
+        #: (extra fields, OXM fields, actions) by row, shared between rows
+        self._side = []
+        self._shared = {}
+        self._free = []
+
+    def __len__(self):
+        """Return the number of rows in use."""
+        return len(self._side) - len(self._free)
+
+    @staticmethod
+    def _encode(value, maximum, codec):
+        """Return ``value`` as stored in a column, or None if it does not fit.
+
+        Values are only stored if they are decoded back to an equal value of
+        the same type, so views have the same flow id.
+        """
+        try:
+            if codec is not None:
+                encoded = codec[0](value)
+                if codec[1](encoded) != value:
+                    return None
+            elif type(value) is int:  # pylint: disable=unidiomatic-typecheck
+                encoded = value
+            else:
+                return None
+        except (AttributeError, OSError, TypeError, ValueError):
+            return None
+        return encoded if 0 <= encoded <= maximum else None
+
+    def store(self, flow, row=None):
+        """Store ``flow`` in ``row``, or in a free row.
+
+        Returns:
+            int: The row of the flow.
+        """
+        if row is None:
+            row = self._allocate()
+        present = 0
+        extras = []
+        for name, column, bit, maximum, codec in self._fields:
+            value = getattr(flow, name)
+            encoded = None if value is None else \
+                self._encode(value, maximum, codec)
+            if encoded is None:
+                column[row] = 0
+                if value is not None:
+                    extras.append((name, value))
+            else:
+                column[row] = encoded
+                present |= bit
+        self._present[row] = present
+        self.set_counters(row, flow.packet_count, flow.byte_count,
+                          flow.duration_sec)
+        oxm_fields = tuple(sorted(flow.oxm_fields.items())) \
+            if flow.oxm_fields else None
+        side = (tuple(extras), oxm_fields, flow.actions)
+        self._side[row] = self._shared.setdefault(side, side)
+        return row
+
+    def _allocate(self):
+        """Return a free row, adding one if needed."""
+        if self._free:
+            return self._free.pop()
+        for column in self.columns.values():
+            column.append(0)
+        self._present.append(0)
+        self._side.append(None)
+        return len(self._side) - 1
+
+    def free(self, row):
+        """Release ``row`` to be reused."""
+        self._side[row] = None
+        self._free.append(row)
+        # Forget side values no longer used when most of them are unused
+        if len(self._shared) > 2 * len(self) + 64:
+            self._shared = {side: side for side in self._side
+                            if side is not None}
+
+    def set_counters(self, row, packet_count, byte_count, duration_sec):
+        """Update the counters of ``row``."""
+        columns = self.columns
+        columns['packet_count'][row] = packet_count
+        columns['byte_count'][row] = byte_count
+        columns['duration_sec'][row] = duration_sec
+
+    def value(self, row, name):
+        """Return the value of a Flow attribute in ``row``."""
+        bit = self._bits.get(name)
+        if bit is not None:
+            if self._present[row] & bit:
+                codec = CODECS.get(name)
+                value = self.columns[name][row]
+                return codec[1](value) if codec is not None else value
+            return dict(self._side[row][0]).get(name)
+        if name == 'oxm_fields':
+            oxm_fields = self._side[row][1]
+            return dict(oxm_fields) if oxm_fields else None
+        if name == 'actions':
+            return self._side[row][2]
+        if name in self.columns:
+            return self.columns[name][row]
+        raise AttributeError("'Flow' object has no attribute '%s'" % name)
+
+    def output_ports(self, row):
+        """Return the output ports of the flow in ``row``."""
+        return tuple(action.output_port for action in self._side[row][2]
+                     if isinstance(action, OutputAction))
+
+    def flow(self, row):
+        """Return a new Flow with the values of ``row``."""
+        columns = self.columns
+        present = self._present[row]
+        extras, oxm_fields, actions = self._side[row]
+        values = dict.fromkeys(FLOW_FIELDS)
+        for name, column, bit, _, codec in self._fields:
+            if present & bit:
+                value = column[row]
+                values[name] = codec[1](value) if codec is not None else value
+        values.update(extras)
+        values['oxm_fields'] = dict(oxm_fields) if oxm_fields else None
+        values['actions'] = actions
+        flow = Flow(**values)
+        flow.packet_count = columns['packet_count'][row]
+        flow.byte_count = columns['byte_count'][row]
+        flow.duration_sec = columns['duration_sec'][row]
+        return flow
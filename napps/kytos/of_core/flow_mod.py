@@ -0,0 +1,108 @@
+"""Packing of OpenFlow 1.0 flow modifications of many flows and switches.
+
+The flow mod of each flow is packed by python-openflow only once and kept as
+a template. Messages are copies of the template in which only the xid and
+the command are set, so pushing the same flows to many switches packs their
+match and actions only once. The flow mods of many flows can be packed in a
+single buffer, sent to each switch with a single write.
+"""
+import struct
+from functools import lru_cache
+from random import getrandbits
+
+from pyof.v0x01.controller2switch.flow_mod import FlowModCommand
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.utils import LazyMessage, PackedMessages
+from napps.legacy.of_core.v0x01.utils import BARRIER_REQUEST
+
+#: Xid in the header of a message
+XID = struct.Struct('!I')
+#: Command of ofp_flow_mod, after the header, match and cookie
+COMMAND = struct.Struct('!H')
+COMMAND_OFFSET = 8 + 40 + 8
+
+
+@lru_cache(maxsize=settings.FLOW_MOD_CACHE_SIZE)
+def get_template(flow):
+    """Return the packed flow mod of ``flow``, with zero xid and command.
+
+    Templates are kept by flow key: equal flows share the same template.
+    """
+    flow_mod = flow.as_flow_mod(FlowModCommand.OFPFC_ADD)
+    flow_mod.header.xid = 0
+    return flow_mod.pack()
+
+
+def pack_into(buffer, flow, command, xid):
+    """Append the flow mod of ``flow`` to ``buffer``.
+
+    Args:
+        buffer (bytearray): Buffer of messages.
+        flow (Flow): Flow to be modified.
+        command (FlowModCommand): Flow mod command.
+        xid (int): Message xid.
+    """
+    offset = len(buffer)
+    buffer += get_template(flow)
+    XID.pack_into(buffer, offset + 4, xid)
+    COMMAND.pack_into(buffer, offset + COMMAND_OFFSET, int(command))
+
+
+def pack_flow_mods(flows, command=FlowModCommand.OFPFC_ADD, xids=None):
+    """Return the flow mods of ``flows`` in a single buffer.
+
+    Args:
+        flows (iterable): Flows to be modified.
+        command (FlowModCommand): Command of all the flow mods.
+        xids (iterable): Xid of each flow mod. Defaults to random xids.
+
+    Returns:
+        bytes: Packed flow mods, one after the other.
+    """
+    buffer = bytearray()
+    if xids is None:
+        for flow in flows:
+            pack_into(buffer, flow, command, getrandbits(32))
+    else:
+        for flow, xid in zip(flows, xids):
+            pack_into(buffer, flow, command, xid)
+    return bytes(buffer)
+
+
+def new_flow_mod(flow, command=FlowModCommand.OFPFC_ADD, xid=None):
+    """Return the flow mod of ``flow`` as a message ready to be emitted.
+
+    Args:
+        flow (Flow): Flow to be modified.
+        command (FlowModCommand): Flow mod command.
+        xid (int): Message xid. Defaults to a random integer.
+
+    Returns:
+        LazyMessage: The flow mod, unpacked only if a listener needs it.
+    """
+    return LazyMessage(pack_flow_mods(
+        (flow,), command, None if xid is None else (xid,)))
+
+
+def new_flow_mods(flows, command=FlowModCommand.OFPFC_ADD, xids=None,
+                  barrier_xid=None):
+    """Return the flow mods of ``flows`` as a single message buffer.
+
+    The same buffer can be emitted to many switches: xids only need to be
+    unique per connection.
+
+    Args:
+        flows (iterable): Flows to be modified, at least one.
+        command (FlowModCommand): Command of all the flow mods.
+        xids (iterable): Xid of each flow mod. Defaults to random xids.
+        barrier_xid (int): If given, the flow mods are followed by a barrier
+            request with this xid, answered once the switch processed them.
+
+    Returns:
+        PackedMessages: The flow mods, to be sent with a single write.
+    """
+    packet = pack_flow_mods(flows, command, xids)
+    if barrier_xid is not None:
+        packet += BARRIER_REQUEST.new_message(barrier_xid).pack()
+    return PackedMessages(packet)
@@ -0,0 +1,435 @@
+"""Flow table of a switch, updated from flow stats replies."""
+import json
+from array import array
+from threading import Lock
+
+from kytos.core import log
+from pyof.v0x01.common.action import ActionType
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.classifier import Classifier
+from napps.legacy.of_core.flow import Flow
+from napps.legacy.of_core.flow_columns import FlowColumns
+
+
+def get_flow_table(switch):
+    """Return the flow table of ``switch``, creating it if needed."""
+    table = getattr(switch, 'flow_table', None)
+    if table is None:
+        table = FlowTable()
+        switch.flow_table = table
+    return table
+
+
+def flow_stats_key(flow_stats):
+    """Return the fields that identify a flow entry in the switch.
+
+    A switch has at most one entry with the same table, priority and match.
+    """
+    match = flow_stats.match
+    return (flow_stats.table_id.value, flow_stats.priority.value,
+            match.wildcards.value, match.in_port.value, match.dl_src.value,
+            match.dl_dst.value, match.dl_vlan.value, match.dl_vlan_pcp.value,
+            match.dl_type.value, match.nw_tos.value, match.nw_proto.value,
+            match.nw_src.value, match.nw_dst.value, match.tp_src.value,
+            match.tp_dst.value)
+
+
+def flow_stats_content(flow_stats):
+    """Return the fields of an entry that a flow modification can change."""
+    outputs = tuple(action.port.value for action in flow_stats.actions
+                    if action.action_type == ActionType.OFPAT_OUTPUT)
+    return (flow_stats.cookie.value, flow_stats.idle_timeout.value,
+            flow_stats.hard_timeout.value, outputs)
+
+
+def flow_stats_counters(flow_stats):
+    """Return the packet count, byte count and duration of an entry."""
+    return (flow_stats.packet_count.value, flow_stats.byte_count.value,
+            flow_stats.duration_sec.value)
+
+
+#: Flow counters, appended to the cached JSON of each flow
+JSON_COUNTERS = ('packet_count', 'byte_count', 'duration_sec')
+
+
+#: Functions returning the values of a row of FlowColumns for each index
+INDEXES = {'id': lambda columns, row: (columns.flow(row).id,),
+           'cookie': lambda columns, row: (columns.value(row, 'cookie'),),
+           'priority': lambda columns, row: (columns.value(row,
+                                                           'priority'),),
+           'in_port': lambda columns, row: (columns.value(row, 'in_port'),),
+           'dl_src': lambda columns, row: (columns.value(row, 'dl_src'),),
+           'dl_dst': lambda columns, row: (columns.value(row, 'dl_dst'),),
+           'out_port': FlowColumns.output_ports}
+
+
+class FlowChanges:
+    """Flows added, removed and modified by a flow table update."""
+
+    def __init__(self):
+        """Start with no changes."""
+        self.added = []
+        self.removed = []
+        #: Pairs of (previous, current) flows
+        self.modified = []
+
+    def __bool__(self):
+        """Whether there is any change."""
+        return bool(self.added or self.removed or self.modified)
+
+
+class FlowTable:
+    """Flows of a switch by :func:`flow_stats_key`.
+
+    Flows are stored in :class:`FlowColumns` and the Flow objects returned
+    are views created on each access: they are equal to, but not the same
+    object as, those returned before. Updating the table from flow stats
+    creates Flow objects only for new or modified entries. Other entries only
+    have their counters updated.
+
+    Flows can be queried by the fields in :data:`INDEXES`, and the flow
+    matching a packet is found by a :class:`Classifier`. Each index and the
+    classifier are built by the first query using them and then updated with
+    the changes of each table update. The JSON of each flow is also kept,
+    without the counters, until the flow changes.
+    """
+
+    def __init__(self):
+        """Create an empty table."""
+        self._columns = FlowColumns()
+        #: Row by flow_stats_key
+        self._rows = {}
+        #: flow_stats_content by row
+        self._contents = []
+        #: Rows in switch order
+        self._order = array('I')
+        #: Sets of rows by value, by index name
+        self._indexes = {}
+        #: Rows by the packets they match
+        self._classifier = None
+        #: JSON of the flows without the counters by row, None if not cached
+        self._json = []
+        #: Incremented by each update that adds, removes or modifies flows
+        self._version = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        """Return the number of flows."""
+        return len(self._order)
+
+    def __iter__(self):
+        """Iterate over views of the flows, in switch order.
+
+        The views are created when the iteration starts, so they are not
+        mixed with those of a later update.
+        """
+        with self._lock:
+            flow = self._columns.flow
+            return iter([flow(row) for row in self._order])
+
+    def update(self, flows_stats):
+        """Replace the table contents by the entries in ``flows_stats``.
+
+        Args:
+            flows_stats (list): FlowStats of all flows in the switch.
+
+        Returns:
+            FlowChanges: Flows added, removed and modified.
+        """
+        update = self.start_update()
+        update.add(flows_stats)
+        return update.finish()
+
+    def start_update(self):
+        """Return a :class:`FlowTableUpdate` to replace the table contents."""
+        return FlowTableUpdate(self)
+
+    def get_rows(self):
+        """Return the table version and a copy of the rows by key.
+
+        The rows are valid until the version changes.
+        """
+        with self._lock:
+            return self._version, dict(self._rows)
+
+    def has_content(self, row, content):
+        """Whether the entry in ``row`` has the flow_stats_content given."""
+        return self._contents[row] == content
+
+    def replace(self, entries, removed, version):
+        """Replace the entries and update the indexes.
+
+        Called by :meth:`FlowTableUpdate.finish`. Updates started before
+        another one changed the table are discarded, since their rows may
+        have been freed and reused. The next update replaces the table.
+
+        Args:
+            entries (list): (flow_stats_key, flow_stats_content, row, Flow,
+                counters) of each entry, in switch order. The row is None
+                for new entries. The Flow is None for unchanged entries,
+                whose packet count, byte count and duration are updated to
+                the counters.
+            removed (dict): Rows of the entries removed, by flow_stats_key.
+            version (int): Table version when the rows were read.
+
+        Returns:
+            FlowChanges: Flows added, removed and modified.
+        """
+        changes = FlowChanges()
+        columns = self._columns
+        with self._lock:
+            if version != self._version:
+                log.debug('Discarding flow table update of version %s, the'
+                          ' table is at version %s', version, self._version)
+                return changes
+            classifier = self._classifier
+            for row in removed.values():
+                flow = columns.flow(row)
+                changes.removed.append(flow)
+                if classifier is not None:
+                    classifier.remove(row, flow)
+                self._unindex(row)
+                self._contents[row] = None
+                self._json[row] = None
+                columns.free(row)
+            rows = {}
+            order = array('I')
+            for key, content, row, flow, counters in entries:
+                if flow is None:
+                    columns.set_counters(row, *counters)
+                else:
+                    if row is None:
+                        changes.added.append(flow)
+                    else:
+                        previous = columns.flow(row)
+                        changes.modified.append((previous, flow))
+                        if classifier is not None:
+                            classifier.remove(row, previous)
+                        self._unindex(row)
+                    row = columns.store(flow, row)
+                    if classifier is not None:
+                        classifier.add(row, flow)
+                    if row == len(self._contents):
+                        self._contents.append(content)
+                        self._json.append(None)
+                    else:
+                        self._contents[row] = content
+                        self._json[row] = None
+                    self._index(row)
+                rows[key] = row
+                order.append(row)
+            self._rows = rows
+            self._order = order
+            if changes:
+                self._version += 1
+        return changes
+
+    def _index(self, row):
+        """Add ``row`` to the indexes."""
+        for name, index in self._indexes.items():
+            for value in INDEXES[name](self._columns, row):
+                index.setdefault(value, set()).add(row)
+
+    def _unindex(self, row):
+        """Remove ``row`` from the indexes."""
+        for name, index in self._indexes.items():
+            for value in INDEXES[name](self._columns, row):
+                rows = index.get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del index[value]
+
+    def _get_index(self, name):
+        """Return an index by name, building it if needed."""
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            values = INDEXES[name]
+            for row in self._order:
+                for value in values(self._columns, row):
+                    index.setdefault(value, set()).add(row)
+            self._indexes[name] = index
+        return index
+
+    def get(self, flow_id):
+        """Return the flow with ``flow_id``, or None."""
+        flows = self.query(id=flow_id)
+        return flows[0] if flows else None
+
+    def query(self, **filters):
+        """Return the flows with all the attribute values in ``filters``.
+
+        Filters in :data:`INDEXES` use the indexes. ``out_port`` matches flows
+        with an output action to that port. Other filters are Flow attribute
+        names, compared with the flows selected by the indexes, or with all
+        flows if there is no indexed filter.
+
+        Raises:
+            AttributeError: if a filter is not a Flow attribute.
+
+        Returns:
+            list: Matching flows.
+        """
+        with self._lock:
+            return [self._columns.flow(row)
+                    for row in self._query_rows(filters)]
+
+    def _query_rows(self, filters):
+        """Return the rows of the flows matching ``filters``."""
+        columns = self._columns
+        indexed = sorted((len(rows), id(rows), rows) for rows in (
+            self._get_index(name).get(value, ())
+            for name, value in filters.items() if name in INDEXES))
+        if indexed:
+            rows = set(indexed[0][2])
+            for _, _, other in indexed[1:]:
+                rows &= other
+            rows = sorted(rows)
+        else:
+            rows = list(self._order)
+        for name, value in filters.items():
+            if name not in INDEXES:
+                rows = [row for row in rows
+                        if columns.value(row, name) == value]
+        return rows
+
+    def iter_json(self, **filters):
+        """Yield the JSON of the flows matching ``filters``, in chunks.
+
+        Each chunk has the ``"id": {...}`` members of up to
+        ``JSON_CHUNK_SIZE`` flows, separated by commas, to be joined by
+        commas inside a JSON object. The JSON of each flow is cached until
+        the flow changes, and only the counters are formatted again.
+
+        The table lock is held only while each chunk is formatted, so flows
+        changed by an update during the iteration are yielded as they are
+        after the update, and flows removed are skipped.
+
+        Raises:
+            AttributeError: if a filter is not a Flow attribute.
+        """
+        with self._lock:
+            version = self._version
+            rows = array('I', self._query_rows(filters))
+        matching = None
+        for start in range(0, len(rows), settings.JSON_CHUNK_SIZE):
+            with self._lock:
+                if self._version != version:
+                    version = self._version
+                    matching = set(self._query_rows(filters))
+                chunk = [self._format_json(row)
+                         for row in rows[start:start +
+                                         settings.JSON_CHUNK_SIZE]
+                         if matching is None or row in matching]
+            if chunk:
+                yield ', '.join(chunk)
+
+    def _format_json(self, row):
+        """Return the JSON member of the flow in ``row``, with counters."""
+        cached = self._json[row]
+        if cached is None:
+            flow = self._columns.flow(row).as_dict()['flow']
+            flow_id = flow.pop('self.id')
+            for name in JSON_COUNTERS:
+                del flow[name]
+            cached = '%s: %s' % (json.dumps(flow_id), json.dumps(flow)[:-1])
+            self._json[row] = cached
+        columns = self._columns.columns
+        return cached + ''.join(', "%s": %d' % (name, columns[name][row])
+                                for name in JSON_COUNTERS) + '}'
+
+    def classify(self, header):
+        """Return the flow of highest priority matching a packet.
+
+        Flows with OXM fields are not considered.
+
+        Args:
+            header (dict): Packet header, as in :meth:`Classifier.lookup`.
+
+        Returns:
+            Flow: The matching flow, or None.
+        """
+        with self._lock:
+            if self._classifier is None:
+                self._classifier = Classifier()
+                for row in self._order:
+                    self._classifier.add(row, self._columns.flow(row))
+            row = self._classifier.lookup(header)
+            return None if row is None else self._columns.flow(row)
+
+    def sum_by_output_port(self, counter='byte_count'):
+        """Return the sum of a counter of the flows by output port.
+
+        Flows with many output ports are counted in each of them. The rows of
+        each port are taken from the ``out_port`` index, built on the first
+        call and updated with the table, and their counters are added in bulk
+        from the counter column.
+
+        Args:
+            counter (str): ``packet_count`` or ``byte_count``.
+
+        Returns:
+            dict: Counter sums by port number.
+        """
+        values = self._columns.columns[counter]
+        with self._lock:
+            return {port: sum(map(values.__getitem__, rows))
+                    for port, rows in self._get_index('out_port').items()}
+
+
+class FlowTableUpdate:
+    """Replacement of the contents of a :class:`FlowTable`.
+
+    Flow stats are added as they arrive, in many multipart reply fragments,
+    and applied to the table when the update is finished.
+
+    The functions below handle OpenFlow 1.0 FlowStats of python-openflow and
+    are replaced by subclasses for other flow stats representations.
+    """
+
+    #: Return the fields that identify the flow entry
+    key = staticmethod(flow_stats_key)
+    #: Return the fields that a flow modification can change
+    content = staticmethod(flow_stats_content)
+    #: Return a new Flow
+    new_flow = staticmethod(Flow.from_flow_stats)
+    #: Return the packet count, byte count and duration of the entry
+    counters = staticmethod(flow_stats_counters)
+
+    def __init__(self, table):
+        """Start an update of ``table``."""
+        self._table = table
+        #: Table version and rows of the entries not added yet, by key
+        self._version, self._previous = table.get_rows()
+        self._entries = []
+
+    def add(self, flows_stats):
+        """Add entries of the switch flow table.
+
+        Args:
+            flows_stats (iterable): Flow stats of some flows in the switch.
+        """
+        previous = self._previous
+        table = self._table
+        entries = self._entries
+        for flow_stats in flows_stats:
+            key = self.key(flow_stats)
+            content = self.content(flow_stats)
+            row = previous.pop(key, None)
+            if row is not None and table.has_content(row, content):
+                entries.append((key, content, row, None,
+                                self.counters(flow_stats)))
+            else:
+                entries.append((key, content, row, self.new_flow(flow_stats),
+                                None))
+
+    def finish(self):
+        """Replace the table contents by the entries added.
+
+        Returns:
+            FlowChanges: Flows added, removed and modified.
+        """
+        return self._table.replace(self._entries, self._previous,
+                                   self._version)
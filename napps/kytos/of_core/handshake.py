@@ -0,0 +1,111 @@
+"""OpenFlow handshake state machine of the connections.
+
+The state of a connection is an integer in ``connection.protocol.state``. What
+to do with each incoming packet is looked up in :data:`DISPATCH` by state and
+message type, read from the raw packet before unpacking it.
+"""
+from threading import Lock
+from time import monotonic
+
+from napps.legacy.of_core.counters import Timer
+
+#: Connection states
+NEW = 0
+SENDING_FEATURES = 1
+WAITING_FEATURES_REPLY = 2
+HANDSHAKE_COMPLETE = 3
+HELLO_FAILED = 4
+
+STATE_NAMES = ('new', 'sending_features', 'waiting_features_reply',
+               'handshake_complete', 'hello_failed')
+
+#: Allowed transitions by state
+TRANSITIONS = {NEW: (SENDING_FEATURES, HELLO_FAILED),
+               SENDING_FEATURES: (WAITING_FEATURES_REPLY, HANDSHAKE_COMPLETE),
+               WAITING_FEATURES_REPLY: (HANDSHAKE_COMPLETE,),
+               HANDSHAKE_COMPLETE: (),
+               HELLO_FAILED: ()}
+
+#: Packet actions
+NEGOTIATE = 0  #: Negotiate the version with a hello message
+IN_ORDER = 1  #: Emit after the messages deferred during the handshake
+EMIT = 2  #: Emit now, even during the handshake
+DROP = 3  #: Ignore
+
+#: Message type values, the same in all supported versions
+OFPT_FEATURES_REPLY = 6
+
+#: Action of all message types by state
+DEFAULT_ACTIONS = {NEW: NEGOTIATE,
+                   SENDING_FEATURES: IN_ORDER,
+                   WAITING_FEATURES_REPLY: IN_ORDER,
+                   HANDSHAKE_COMPLETE: IN_ORDER,
+                   HELLO_FAILED: DROP}
+
+#: Actions of specific (state, message type) pairs. The features reply
+#: completes the handshake, so it is never deferred.
+ACTIONS = {(SENDING_FEATURES, OFPT_FEATURES_REPLY): EMIT,
+           (WAITING_FEATURES_REPLY, OFPT_FEATURES_REPLY): EMIT}
+
+#: Action by state and message type: DISPATCH[state][message_type]
+DISPATCH = tuple(tuple(ACTIONS.get((state, message_type), action)
+                       for message_type in range(256))
+                 for state, action in sorted(DEFAULT_ACTIONS.items()))
+
+#: Durations of each transition, by (old state, new state)
+TIMERS = {(old, new): Timer() for old, news in TRANSITIONS.items()
+          for new in news}
+
+_LOCK = Lock()
+
+
+def start(connection):
+    """Set the initial state of a new connection."""
+    connection.protocol.state = NEW
+    connection.protocol.state_since = monotonic()
+
+
+def get_action(connection, packet):
+    """Return what to do with ``packet`` received by ``connection``."""
+    return DISPATCH[connection.protocol.state][packet[1]]
+
+
+def transition(connection, old_states, new_state):
+    """Change the state of ``connection`` if it is one of ``old_states``.
+
+    The time spent in the old state is added to :data:`TIMERS`.
+
+    Returns:
+        bool: Whether the state was changed.
+    """
+    with _LOCK:
+        old_state = connection.protocol.state
+        if old_state not in old_states:
+            return False
+        if new_state not in TRANSITIONS[old_state]:
+            raise ValueError('Invalid transition from %s to %s' %
+                             (STATE_NAMES[old_state], STATE_NAMES[new_state]))
+        now = monotonic()
+        TIMERS[old_state, new_state].add(now - connection.protocol.state_since)
+        connection.protocol.state = new_state
+        connection.protocol.state_since = now
+        return True
+
+
+def get_state_name(connection):
+    """Return the name of the state of ``connection``."""
+    state = connection.protocol.state
+    return STATE_NAMES[state] if state is not None else None
+
+
+def as_dict(connections):
+    """Return transition durations and the number of connections by state."""
+    with _LOCK:
+        timers = {'%s->%s' % (STATE_NAMES[old], STATE_NAMES[new]):
+                  timer.as_dict() for (old, new), timer in TIMERS.items()}
+    states = dict.fromkeys(STATE_NAMES, 0)
+    for connection in connections:
+        name = get_state_name(connection)
+        if name is not None:
+            states[name] += 1
+    return {'transitions': timers, 'states': states}
@@ -1,9 +1,15 @@
 """NApp responsible for the main OpenFlow basic operations."""
-from kytos.core import KytosEvent, KytosNApp, log
+import json
+from functools import partial
+from logging import DEBUG, getLogger
+from threading import Lock
+from time import perf_counter, time
+
+from kytos.core import KytosEvent, KytosNApp, log, rest
 from kytos.core.connection import ConnectionState
 from kytos.core.helpers import listen_to
 from pyof.foundation.exceptions import UnpackException
-from pyof.utils import unpack, PYOF_VERSION_LIBS
+from pyof.utils import PYOF_VERSION_LIBS
 
 import pyof.v0x01.asynchronous.error_msg
 import pyof.v0x01.common.header
@@ -24,13 +30,28 @@ from pyof.v0x04.controller2switch.common import MultipartTypes
 from pyof.v0x04.symmetric.hello import Hello as HelloV0x04
 
 from napps.legacy.of_core.v0x01 import utils as of_core_v0x01_utils
+from napps.legacy.of_core.v0x01.flow_stats import FlowTableUpdateV0x01
 from napps.legacy.of_core.v0x04 import utils as of_core_v0x04_utils
-
-from napps.legacy.of_core import settings
-from napps.legacy.of_core.flow import Flow
-from napps.legacy.of_core.utils import (emit_message_in, emit_message_out,
-                                       GenericHello, NegotiationException,
-                                       of_slicer)
+from napps.legacy.of_core.v0x04.flow_stats import FlowTableUpdateV0x04
+
+from napps.legacy.of_core import handshake, settings
+from napps.legacy.of_core.counters import (count_message_out, get_counters,
+                                           is_sampled, sample_queue_wait)
+from napps.legacy.of_core.echo import get_echo_monitor
+from napps.legacy.of_core.flow_table import get_flow_table
+from napps.legacy.of_core.multipart import get_reassembly, number_fragment
+from napps.legacy.of_core.outbound import outbound
+from napps.legacy.of_core.scheduler import scheduler
+from napps.legacy.of_core.utils import (DeferredMessages, emit_message_in,
+                                        emit_message_out, emit_messages_in,
+                                        GenericHello, iter_messages,
+                                        LazyMessage, listen_in_order,
+                                        NegotiationException, ReceiveBuffer,
+                                        SizeHistogram)
+
+#: Logger of the per-packet path. ``log`` inspects the stack on every call to
+#: find the NApp name, which costs more than handling the packet.
+PACKET_LOG = getLogger('legacy/of_core')
 
 
 class Main(KytosNApp):
@@ -45,7 +66,19 @@ class Main(KytosNApp):
         self.name = 'legacy/of_core'
         self.of_core_version_utils = {0x01: of_core_v0x01_utils,
                                       0x04: of_core_v0x04_utils}
-        self.execute_as_loop(settings.STATS_INTERVAL)
+        #: Number of packets in each raw data read
+        self.chunk_sizes = SizeHistogram()
+        #: Number of messages in each batch event
+        self.batch_sizes = SizeHistogram()
+        #: Held while the receive buffer of a connection is created
+        self.buffers_lock = Lock()
+        scheduler.register('legacy/of_core.flow_stats',
+                           settings.STATS_INTERVAL, self.update_flow_list)
+        if settings.SEND_ECHO_REQUESTS:
+            scheduler.register('legacy/of_core.keepalive',
+                               settings.ECHO_IDLE_TIME, self.keepalive)
+        outbound.start(self.controller)
+        self.execute_as_loop(settings.SCHEDULER_TICK)
 
     def execute(self):
         """Method to be run once on app 'start' or in a loop.
@@ -53,36 +86,119 @@ class Main(KytosNApp):
         The execute method is called by the run method of KytosNApp class.
         Users shouldn't call this method directly.
         """
-        for switch in self.controller.switches.values():
-            if switch.is_connected():
-                version_utils = \
-                    self.of_core_version_utils[switch.
-                                               connection.protocol.version]
-                version_utils.update_flow_list(self.controller, switch)
-                if settings.SEND_ECHO_REQUESTS:
-                    version_utils.send_echo(self.controller, switch)
+        scheduler.run_pending()
 
+    def update_flow_list(self, switch):
+        """Request the flows of ``switch``. Scheduled for each switch."""
+        version_utils = \
+            self.of_core_version_utils[switch.connection.protocol.version]
+        version_utils.update_flow_list(self.controller, switch)
 
-    @staticmethod
-    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_stats_reply')
-    def handle_flow_stats_reply(event):
+    def keepalive(self, switch):
+        """Send an echo request to ``switch`` if it is idle.
+
+        A switch that sent data in the last :data:`settings.ECHO_IDLE_TIME`
+        seconds is alive, so it is checked again only when it would be idle.
+
+        Returns:
+            float: Seconds until the next check, if the switch is not idle.
+        """
+        idle_time = time() - switch.lastseen.timestamp()
+        if idle_time < settings.ECHO_IDLE_TIME:
+            get_echo_monitor(switch.connection).clear()
+            return settings.ECHO_IDLE_TIME - idle_time
+        version_utils = \
+            self.of_core_version_utils[switch.connection.protocol.version]
+        self.send_echo(switch, version_utils)
+        return None
+
+    def send_echo(self, switch, version_utils):
+        """Send an echo request unless too many were not replied.
+
+        A switch that missed :data:`settings.ECHO_MAX_MISSED` echoes is
+        considered dead and its connection is closed.
+        """
+        connection = switch.connection
+        missed = get_echo_monitor(connection).missed
+        if missed < settings.ECHO_MAX_MISSED:
+            version_utils.send_echo(self.controller, switch)
+            return
+        log.warning('Connection %s, Switch %s: %s echo requests not replied.'
+                    ' Closing connection.', connection.id, switch.dpid,
+                    missed)
+        event = KytosEvent(name='kytos/of_core.echo_timeout',
+                           content={'source': connection})
+        self.controller.buffers.app.put(event)
+        connection.close()
+
+
+    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_stats_reply',
+               'kytos/of_core.v0x01.messages.in.batch.ofpt_stats_reply')
+    def handle_flow_stats_reply(self, event):
         """Handle flow stats reply message.
 
-        This method updates the switches list with its Flow Stats.
+        This method updates the switches list with its Flow Stats. Only new or
+        modified flows are created, and their changes are notified by the
+        ``kytos/of_core.flows.added``, ``.removed`` and ``.modified`` events.
+        Replies split in many fragments update the list once, after the last
+        fragment. Flow replies are decoded from the binary message, without
+        unpacking it.
 
         Args:
             event (:class:`~kytos.core.events.KytosEvent):
                 Event with ofpt_stats_reply in message.
         """
-        msg = event.content['message']
-        if msg.body_type == \
-                pyof.v0x01.controller2switch.common.StatsTypes.OFPST_FLOW:
-            switch = event.source.switch
-            flows = []
-            for flow_stat in msg.body:
-                new_flow = Flow.from_flow_stats(flow_stat)
-                flows.append(new_flow)
-            switch.flows = flows
+        sample_queue_wait(event)
+        for msg in iter_messages(event):
+            stats_type, flags, body = \
+                of_core_v0x01_utils.unpack_stats_reply(msg.get_packet())
+            if stats_type == \
+                    pyof.v0x01.controller2switch.common.StatsTypes.OFPST_FLOW:
+                self.update_flow_table(event.source, msg.header.xid, flags,
+                                       body, FlowTableUpdateV0x01,
+                                       msg.fragment)
+
+    def update_flow_table(self, connection, xid, flags, body, update_class,
+                          index=None):
+        """Add a flow stats reply fragment to the flow table of the switch.
+
+        Args:
+            connection: Connection of the switch.
+            xid (int): Reply xid.
+            flags (int): Reply flags.
+            body: Flow stats in the reply.
+            update_class (type): :class:`FlowTableUpdate` for the OpenFlow
+                version of the reply.
+            index (int): Position of the fragment in the reply.
+        """
+        switch = connection.switch
+        table = get_flow_table(switch)
+        reassembly = get_reassembly(connection, 'legacy/of_core.flow_stats')
+        changes = reassembly.add(xid, flags, body,
+                                 partial(update_class, table), index)
+        if changes is None:
+            return
+        switch.flows = table
+        if changes:
+            self.emit_flow_changes(switch, changes)
+
+    def emit_flow_changes(self, switch, changes):
+        """Send an event for each kind of change in the flows of ``switch``.
+
+        Modified flows are sent as the current flows, along with the previous
+        ones in the same order.
+        """
+        contents = {'added': {'flows': changes.added},
+                    'removed': {'flows': changes.removed},
+                    'modified': {'flows': [new for _, new in changes.modified],
+                                 'previous': [old for old, _ in
+                                              changes.modified]}}
+        for kind, content in contents.items():
+            if content['flows']:
+                content['switch'] = switch
+                event = KytosEvent(name='kytos/of_core.flows.' + kind,
+                                   content=content)
+                self.controller.buffers.app.put(event)
 
     @listen_to('kytos/of_core.v0x0[14].messages.in.ofpt_features_reply')
     def handle_features_reply(self, event):
@@ -90,6 +206,15 @@ class Main(KytosNApp):
 
         This is the end of the Handshake workflow of the OpenFlow Protocol.
 
+        Args:
+            event (KytosEvent): Event with features reply message.
+        """
+        sample_queue_wait(event)
+        self.complete_handshake(event)
+
+    def complete_handshake(self, event):
+        """Update the switch features and complete the handshake, if needed.
+
         Args:
             event (KytosEvent): Event with features reply message.
         """
@@ -97,10 +222,14 @@ class Main(KytosNApp):
         version_utils = self.of_core_version_utils[connection.protocol.version]
         switch = version_utils.handle_features_reply(self.controller, event)
 
-        if (connection.is_during_setup() and
-                connection.protocol.state == 'waiting_features_reply'):
-            connection.protocol.state = 'handshake_complete'
+        # The reply may be handled before the request sent event
+        if connection.is_during_setup() and handshake.transition(
+                connection, (handshake.SENDING_FEATURES,
+                             handshake.WAITING_FEATURES_REPLY),
+                handshake.HANDSHAKE_COMPLETE):
             connection.set_established_state()
+            self.replay_deferred_messages(connection)
+            scheduler.add_switch(switch)
             if settings.SEND_SET_CONFIG:
                 version_utils.send_set_config(self.controller, switch)
             log.info('Connection %s, Switch %s: OPENFLOW HANDSHAKE COMPLETE',
@@ -110,44 +239,120 @@ class Main(KytosNApp):
             #                        content={'source': connection})
             # self.controller.buffers.app.put(event_raw)
 
-    @listen_to('kytos/of_core.v0x04.messages.in.ofpt_multipart_reply')
-    def handle_port_desc_reply(self, event):
-        """Handles Port Description Reply messages."""
-        switch = event.source.switch
-        reply = event.content['message']
-        if reply.multipart_type == MultipartTypes.OFPMP_PORT_DESC:
-            of_core_v0x04_utils.handle_port_desc(switch, reply.body)
+    @listen_to('kytos/of_core.v0x04.messages.in.ofpt_multipart_reply',
+               'kytos/of_core.v0x04.messages.in.batch.ofpt_multipart_reply')
+    def handle_multipart_reply(self, event):
+        """Handles Port Description and Flow Multipart Reply messages.
 
-    @listen_to('kytos/core.openflow.raw.in')
+        Flow replies are decoded from the binary message, without unpacking
+        it.
+        """
+        sample_queue_wait(event)
+        switch = event.source.switch
+        for reply in iter_messages(event):
+            multipart_type, flags, body = \
+                of_core_v0x04_utils.unpack_multipart_reply(reply.get_packet())
+            if multipart_type == MultipartTypes.OFPMP_PORT_DESC:
+                of_core_v0x04_utils.handle_port_desc(switch, reply.body)
+            elif multipart_type == MultipartTypes.OFPMP_FLOW:
+                self.update_flow_table(event.source, reply.header.xid, flags,
+                                       body, FlowTableUpdateV0x04,
+                                       reply.fragment)
+
+    @listen_to('kytos/core.openflow.connection.new')
+    def handle_connection_new(self, event):
+        """Create the receive buffer of a new connection."""
+        self.get_receive_buffer(event.source)
+
+    def get_receive_buffer(self, connection):
+        """Return the receive buffer of ``connection``.
+
+        The buffer is created, and the handshake started, by the first of the
+        connection.new and raw.in events, which run on different threads.
+        """
+        buffer = connection.remaining_data
+        if isinstance(buffer, ReceiveBuffer):
+            return buffer
+        with self.buffers_lock:
+            if not isinstance(connection.remaining_data, ReceiveBuffer):
+                connection.remaining_data = \
+                    ReceiveBuffer(connection.remaining_data)
+                handshake.start(connection)
+            return connection.remaining_data
+
+    @listen_in_order('kytos/core.openflow.raw.in')
     def handle_raw_in(self, event):
         """Handle a RawEvent and generate a kytos/core.messages.in.* event.
 
+        Raw data is handled by the thread of the raw buffer, in the order it
+        was read, instead of on a new thread per read.
+
         Args:
             event (KytosEvent): RawEvent with openflow message to be unpacked
         """
+        self.handle_raw_data(event.source, event.content['new_data'])
+
+    def handle_raw_data(self, connection, data):
+        """Unpack the OpenFlow messages in ``data`` and emit their events.
+
+        Calls for the same connection are serialized by the lock of its
+        receive buffer.
 
+        Args:
+            connection: Connection that received ``data``.
+            data (bytes): Data read from the connection, ending anywhere in
+                a message.
+        """
         # If the switch is already known to the controller, update the
         # 'lastseen' attribute
-        switch = event.source.switch
+        switch = connection.switch
         if switch:
             switch.update_lastseen()
 
-        connection = event.source
+        buffer = self.get_receive_buffer(connection)
+        with buffer.lock:
+            self.read_packets(connection, buffer, data)
+
+    def read_packets(self, connection, buffer, data):
+        """Emit the events of the messages completed by ``data``.
+
+        Call holding ``buffer.lock``.
+
+        Args:
+            connection: Connection that received ``data``.
+            buffer (ReceiveBuffer): Receive buffer of ``connection``.
+            data (bytes): Data read from the connection.
+        """
+        counters = get_counters(connection)
+        counters.count_read(data)
+        sampled = is_sampled()
 
-        data = connection.remaining_data + event.content['new_data']
-        packets, connection.remaining_data = of_slicer(data)
+        buffer.feed(data)
+        start = perf_counter() if sampled else None
+        try:
+            packets = buffer.slice_packets()
+        except UnpackException as e:
+            log.debug('Connection %s: %s', connection.id, e)
+            connection.close()
+            return
+        if sampled:
+            counters.add_time('slicer', perf_counter() - start)
         if not packets:
             return
+        self.chunk_sizes.add(len(packets))
 
-        unprocessed_packets = []
-
+        debug = PACKET_LOG.isEnabledFor(DEBUG)
+        messages = []
         for packet in packets:
             if not connection.is_alive():
                 return
-            log.debug('Connection %s: New Raw Openflow packet - %s',
-                      connection.id, packet.hex())
+            counters.count_in(packet)
+            if debug:
+                PACKET_LOG.debug('Connection %s: New Raw Openflow packet - %s',
+                                 connection.id, packet.hex())
 
-            if connection.is_new():
+            action = handshake.get_action(connection, packet)
+            if action == handshake.NEGOTIATE:
                 try:
                     message = GenericHello(packet=packet)
                     self._negotiate(connection, message)
@@ -158,15 +363,19 @@ class Main(KytosNApp):
                     else:
                         log.debug('Connection %s: Negotiation Failed',
                                   connection.id)
-                    connection.protocol.state = 'hello_failed'
+                    handshake.transition(connection, (handshake.NEW,),
+                                         handshake.HELLO_FAILED)
                     connection.close()
                     connection.state = ConnectionState.FAILED
                     return
                 connection.set_setup_state()
                 continue
+            if action == handshake.DROP:
+                return
 
+            start = perf_counter() if sampled else None
             try:
-                message = connection.protocol.unpack(packet)
+                message = connection.protocol.unpack(bytes(packet))
             except (UnpackException, AttributeError) as e:
                 log.debug(e)
                 if type(e) == AttributeError:
@@ -174,24 +383,68 @@ class Main(KytosNApp):
                     log.debug('Connection %s: %s' , connection.id, debug_msg)
                 connection.close()
                 return
-
-            log.debug('Connection %s: IN OFP, version: %s, type: %s, xid: %s',
-                      connection.id,
-                      message.header.version,
-                      message.header.message_type,
-                      message.header.xid)
-
-            if connection.is_during_setup():
-                if not (str(message.header.message_type) ==
-                        'Type.OFPT_FEATURES_REPLY' and
-                        connection.protocol.state == 'waiting_features_reply'):
-                    unprocessed_packets.append(packet)
+            if sampled:
+                counters.add_time('unpack', perf_counter() - start)
+            number_fragment(connection, message)
+
+            if debug:
+                PACKET_LOG.debug('Connection %s: IN OFP, version: %s,'
+                                 ' type: %s, xid: %s', connection.id,
+                                 message.header.version,
+                                 message.header.message_type,
+                                 message.header.xid)
+
+            # Messages received during the handshake are deferred until it is
+            # complete. Later ones wait for them to be replayed.
+            deferred = getattr(connection, 'deferred_messages', None)
+            if action == handshake.IN_ORDER and deferred is not None:
+                if deferred.defer(connection, message):
                     continue
+                connection.deferred_messages = None
+            messages.append(message)
 
-            self.emit_message_in(connection, message)
+        self.dispatch_messages(connection, messages, counters, sampled)
 
-        connection.remaining_data = b''.join(unprocessed_packets) + \
-                                    connection.remaining_data
+    def dispatch_messages(self, connection, messages, counters,
+                          sampled=False):
+        """Emit events for incoming ``messages``, in batches if configured.
+
+        Args:
+            connection: Source of the messages.
+            messages (list): Unpacked messages, in the order received.
+            counters (ConnectionCounters): Counters of ``connection``.
+            sampled (bool): Whether to time the emit stage.
+        """
+        batches = {}
+        for message in messages:
+            message_type = message.header.message_type
+            if message_type.name.lower() in settings.BATCH_MESSAGES_IN:
+                batches.setdefault(message_type, []).append(message)
+                continue
+
+            start = perf_counter() if sampled else None
+            self.emit_message_in(connection, message)
+            if sampled:
+                counters.add_time('emit', perf_counter() - start)
+
+        for batch in batches.values():
+            start = perf_counter() if sampled else None
+            self.emit_messages_in(connection, batch)
+            if sampled:
+                counters.add_time('emit', perf_counter() - start)
+
+    def replay_deferred_messages(self, connection):
+        """Emit the messages received during the handshake, in order."""
+        deferred = getattr(connection, 'deferred_messages', None)
+        if deferred is None:
+            return
+        counters = get_counters(connection)
+        deferred.replay(partial(self.dispatch_messages, connection,
+                                counters=counters))
+        connection.deferred_messages = None
+        if deferred.dropped:
+            log.warning('Connection %s: %s messages discarded during'
+                        ' handshake', connection.id, deferred.dropped)
 
     def emit_message_in(self, connection, message):
         """Emit a KytosEvent for an incoming message containing the message
@@ -199,13 +452,40 @@ class Main(KytosNApp):
         if connection.is_alive():
             emit_message_in(self.controller, connection, message)
 
+    def emit_messages_in(self, connection, messages):
+        """Emit a single KytosEvent for many incoming messages of a type."""
+        if connection.is_alive():
+            emit_messages_in(self.controller, connection, messages)
+            self.batch_sizes.add(len(messages))
+
     def emit_message_out(self, connection, message):
         """Emit a KytosEvent for an outgoing message containing the message
         and the destination."""
         if connection.is_alive():
             emit_message_out(self.controller, connection, message)
 
-    @listen_to('kytos/of_core.v0x0[14].messages.in.ofpt_echo_request')
+    @rest('counters')
+    def get_counters(self):
+        """Return message, byte and timing counters of each connection."""
+        connections = {}
+        for connection in list(self.controller.connections.values()):
+            counters = getattr(connection, 'counters', None)
+            if counters is None:
+                continue
+            conn_id = '%s:%s' % connection.id
+            connections[conn_id] = counters.as_dict()
+            connections[conn_id]['dpid'] = \
+                connection.switch.dpid if connection.switch else None
+        return json.dumps(connections)
+
+    @rest('batches')
+    def get_batch_sizes(self):
+        """Return the distribution of packets per read and batch sizes."""
+        return json.dumps({'raw_chunks': self.chunk_sizes.as_dict(),
+                           'batches': self.batch_sizes.as_dict()})
+
+    @listen_to('kytos/of_core.v0x0[14].messages.in.ofpt_echo_request',
+               'kytos/of_core.v0x0[14].messages.in.batch.ofpt_echo_request')
     def handle_echo_request(self, event):
         """Handle Echo Request Messages.
 
@@ -217,14 +497,46 @@ class Main(KytosNApp):
                 Event with echo request in message.
         """
 
+        sample_queue_wait(event)
         pyof_lib = PYOF_VERSION_LIBS[event.source.protocol.version]
-        echo_request = event.message
-        echo_reply = pyof_lib.symmetric.echo_reply.EchoReply(
-            xid=echo_request.header.xid,
-            data=echo_request.data)
-        self.emit_message_out(event.source, echo_reply)
+        for echo_request in iter_messages(event):
+            echo_reply = pyof_lib.symmetric.echo_reply.EchoReply(
+                xid=echo_request.header.xid,
+                data=echo_request.data)
+            self.emit_message_out(event.source, echo_reply)
 
 
+    @staticmethod
+    @listen_to('kytos/of_core.v0x0[14].messages.in.ofpt_echo_reply',
+               'kytos/of_core.v0x0[14].messages.in.batch.ofpt_echo_reply')
+    def handle_echo_reply(event):
+        """Measure the round-trip time of the echo requests we sent."""
+        monitor = get_echo_monitor(event.source)
+        for echo_reply in iter_messages(event):
+            # Echo data follows the header and does not require unpacking
+            monitor.reply(echo_reply.pack()[8:])
+
+    @rest('echo')
+    def get_echo_stats(self):
+        """Return missed echoes and round-trip times of each switch."""
+        switches = {}
+        for switch in list(self.controller.switches.values()):
+            monitor = getattr(switch.connection, 'echo_monitor', None)
+            if monitor is not None:
+                switches[switch.dpid] = monitor.as_dict()
+        return json.dumps(switches)
+
+    @rest('outbound')
+    def get_outbound_queues(self):
+        """Return the messages waiting by lane and flow mod tokens, by dpid."""
+        return json.dumps(outbound.as_dict())
+
+    @rest('handshake')
+    def get_handshake_stats(self):
+        """Return handshake transition times and connections by state."""
+        connections = list(self.controller.connections.values())
+        return json.dumps(handshake.as_dict(connections))
+
     def _get_version_from_bitmask(self, message_versions):
         """Get common version from hello message version bitmap."""
         try:
@@ -265,8 +577,12 @@ class Main(KytosNApp):
 
         connection.protocol.name = 'openflow'
         connection.protocol.version = version
-        connection.protocol.unpack = unpack
-        connection.protocol.state = 'sending_features'
+        connection.protocol.unpack = LazyMessage
+        connection.deferred_messages = DeferredMessages(
+            settings.DEFERRED_MESSAGES_MAX,
+            settings.DEFERRED_MESSAGES_OVERFLOW)
+        handshake.transition(connection, (handshake.NEW,),
+                             handshake.SENDING_FEATURES)
         self.send_features_request(connection)
         log.debug('Connection %s: Hello complete', connection.id)
 
@@ -274,7 +590,8 @@ class Main(KytosNApp):
         """Send Error message and emit event upon negotiation failure."""
         log.warning('connection %s: version negotiation failed',
                     connection.id)
-        connection.protocol.state = 'hello_failed'
+        handshake.transition(connection, (handshake.NEW,),
+                             handshake.HELLO_FAILED)
         event_raw = KytosEvent(
             name='kytos/of_core.hello_failed',
             content={'source': connection})
@@ -291,6 +608,16 @@ class Main(KytosNApp):
             OFPHFC_INCOMPATIBLE)
         self.emit_message_out(connection, error_message)
 
+    @staticmethod
+    @listen_in_order('.+[.]messages[.]out[.].+')
+    def handle_message_out(event):
+        """Count each message written and wake the outbound scheduler.
+
+        Called by the thread of the msg_out buffer after writing each message.
+        """
+        count_message_out(event)
+        outbound.written()
+
     # May be removed
     @listen_to('kytos/of_core.v0x0[14].messages.out.ofpt_echo_reply')
     def handle_queued_openflow_echo_reply(self, event):
@@ -305,17 +632,16 @@ class Main(KytosNApp):
 
     def send_features_request(self, destination):
         """Send a feature request to the switch."""
-        version = destination.protocol.version
-        pyof_lib = PYOF_VERSION_LIBS[version]
-        features_request = pyof_lib.controller2switch.\
-            features_request.FeaturesRequest()
-        self.emit_message_out(destination, features_request)
+        if destination.is_alive():
+            version_utils = \
+                self.of_core_version_utils[destination.protocol.version]
+            version_utils.send_features_request(self.controller, destination)
 
     @listen_to('kytos/of_core.v0x0[14].messages.out.ofpt_features_request')
     def handle_features_request_sent(self, event):
         """Ensure request has actually been sent before changing state."""
-        if event.destination.protocol.state == 'sending_features':
-            event.destination.protocol.state = 'waiting_features_reply'
+        handshake.transition(event.destination, (handshake.SENDING_FEATURES,),
+                             handshake.WAITING_FEATURES_REPLY)
 
     @staticmethod
     @listen_to('kytos/of_core.v0x[0-9a-f]{2}.messages.in.hello_failed',
@@ -328,3 +654,6 @@ class Main(KytosNApp):
     def shutdown(self):
         """End of the application."""
         log.debug('Shutting down...')
+        scheduler.unregister('legacy/of_core.flow_stats')
+        scheduler.unregister('legacy/of_core.keepalive')
+        outbound.stop()
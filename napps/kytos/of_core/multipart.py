@@ -0,0 +1,199 @@
+"""Reassembly of multipart replies split by the switch.
+
+Raw data of each connection is read in order, holding the lock of its
+receive buffer, and the fragments of each reply are numbered as they are
+read (:func:`number_fragment`). Their listeners run on a thread per event,
+so fragments may be added out of order, but they are passed to the builder
+in the order of their numbers.
+"""
+import struct
+from collections import OrderedDict
+from threading import Lock
+
+from kytos.core import log
+
+from napps.legacy.of_core import settings
+
+#: Flag of fragments followed by others with the same xid (OFPSF_REPLY_MORE
+#: in OpenFlow 1.0 and OFPMPF_REPLY_MORE in 1.3)
+REPLY_MORE = 1
+
+#: Message types of multipart reply fragments, in all OpenFlow versions
+REPLY_TYPES = ('OFPT_STATS_REPLY', 'OFPT_MULTIPART_REPLY')
+
+#: Flags of StatsReply (OpenFlow 1.0) and MultipartReply (1.3) messages,
+#: after the header and the reply type
+FLAGS = struct.Struct('!H')
+FLAGS_OFFSET = 10
+
+
+def get_reassembly(connection, name):
+    """Return the replies of ``connection`` being reassembled by ``name``.
+
+    Each NApp uses its own name, so the same fragments can be consumed by many
+    NApps.
+    """
+    replies = getattr(connection, 'multipart_replies', None)
+    if replies is None:
+        replies = connection.multipart_replies = {}
+    return replies.setdefault(name, Reassembly())
+
+
+def number_fragment(connection, message):
+    """Set ``message.fragment`` if it is a multipart reply fragment.
+
+    The fragments of each xid are numbered from 0 in the order they were
+    read. Call holding the lock of the receive buffer of ``connection``,
+    which serializes the reads of the connection.
+
+    Args:
+        connection: Connection that received ``message``.
+        message (LazyMessage): Message just read.
+    """
+    if message.header.message_type.name not in REPLY_TYPES:
+        return
+    packet = message.get_packet()
+    if len(packet) < FLAGS_OFFSET + FLAGS.size:
+        return
+    flags, = FLAGS.unpack_from(packet, FLAGS_OFFSET)
+    counts = getattr(connection, 'multipart_fragments', None)
+    if counts is None:
+        counts = connection.multipart_fragments = OrderedDict()
+    xid = message.header.xid
+    message.fragment = counts.pop(xid, 0)
+    if flags & REPLY_MORE:
+        counts[xid] = message.fragment + 1
+        if len(counts) > settings.MULTIPART_MAX_PENDING:
+            counts.popitem(last=False)
+
+
+def _int(value):
+    """Return the int value of a pyof basic type or int."""
+    return getattr(value, 'value', value)
+
+
+class _PendingReply:
+    """Builder of a reply and its fragments that arrived before their turn.
+
+    When the builder fails, the reply keeps the indexes of its fragments,
+    without their bodies, so the fragments still to arrive are ignored.
+    """
+
+    def __init__(self, xid, builder):
+        """Start expecting the first fragment."""
+        self.xid = xid
+        self.builder = builder
+        #: Index of the next fragment to be added to the builder
+        self.next = 0
+        #: Index of the last fragment, once it arrived
+        self.last = None
+        #: Bodies of fragments waiting for previous ones, by index
+        self.early = {}
+
+    def add(self, index, more, body):
+        """Add the fragments in order, up to the first missing one.
+
+        Returns:
+            bool: Whether all fragments were added.
+        """
+        if not more:
+            self.last = index
+        self.early[index] = None if self.builder is None else body
+        while self.next in self.early:
+            body = self.early.pop(self.next)
+            self.next += 1
+            if self.builder is not None:
+                try:
+                    self.builder.add(body)
+                except Exception as error:  # pylint: disable=broad-except
+                    self.fail(error)
+        return self.last is not None and self.next > self.last
+
+    def finish(self):
+        """Return the result of the builder, or None if it failed."""
+        if self.builder is None:
+            return None
+        try:
+            return self.builder.finish()
+        except Exception as error:  # pylint: disable=broad-except
+            self.fail(error)
+            return None
+
+    def fail(self, reason):
+        """Discard the builder and the fragment bodies kept."""
+        log.warning('Discarding multipart reply with xid %s: %s', self.xid,
+                    reason)
+        self.builder = None
+        self.early = dict.fromkeys(self.early)
+
+
+class Reassembly:
+    """Multipart replies being received in a connection, by xid.
+
+    Fragments are added to a builder as soon as the previous ones were added,
+    so most of them are not kept in memory. A builder has ``add(body)`` and
+    ``finish()`` methods, the last one returning the result of the whole
+    reply.
+    """
+
+    def __init__(self, max_pending=None, max_early=None):
+        """Start with no pending replies.
+
+        Args:
+            max_pending (int): Maximum replies being reassembled. When a new
+                reply arrives, the oldest one is discarded. Defaults to
+                :data:`settings.MULTIPART_MAX_PENDING`.
+            max_early (int): Maximum fragments of a reply waiting for a
+                previous one. Defaults to
+                :data:`settings.MULTIPART_MAX_EARLY`.
+        """
+        if max_pending is None:
+            max_pending = settings.MULTIPART_MAX_PENDING
+        if max_early is None:
+            max_early = settings.MULTIPART_MAX_EARLY
+        self.max_pending = max_pending
+        self.max_early = max_early
+        self._builders = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        """Return the number of replies being reassembled."""
+        return len(self._builders)
+
+    def add(self, xid, flags, body, new_builder, index=None):
+        """Add the body of a reply fragment to the builder of its xid.
+
+        Args:
+            xid (int): Reply xid.
+            flags (int): Reply flags, as in the StatsReply (OpenFlow 1.0) or
+                MultipartReply (1.3) messages.
+            body: Fragment body, passed to the builder.
+            new_builder (callable): Returns the builder of a new reply.
+            index (int): Position of the fragment in the reply, as numbered
+                by :func:`number_fragment`. Defaults to the order in which
+                fragments are added.
+
+        Returns:
+            The result of the builder once all fragments were added.
+            Otherwise, or if the builder failed, None. Builder errors are
+            logged and the remaining fragments of the reply are ignored.
+        """
+        xid = _int(xid)
+        more = _int(flags) & REPLY_MORE
+        with self._lock:
+            reply = self._builders.pop(xid, None)
+            if reply is None:
+                reply = _PendingReply(xid, new_builder())
+            if index is None:
+                index = reply.next
+            if reply.add(index, more, body):
+                return reply.finish()
+            if reply.builder is not None and \
+                    len(reply.early) > self.max_early:
+                reply.fail('%d fragments out of order' % len(reply.early))
+            self._builders[xid] = reply
+            if len(self._builders) > self.max_pending:
+                dropped, _ = self._builders.popitem(last=False)
+                log.warning('Discarding incomplete multipart reply with xid'
+                            ' %s.', dropped)
+        return None
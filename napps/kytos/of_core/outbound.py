@@ -0,0 +1,345 @@
+"""Per-switch outbound scheduler with priority lanes, shared by the NApps.
+
+NApps send messages with :data:`outbound` instead of putting their events
+directly in the controller ``msg_out`` buffer, which is written to all
+switches in order by a single thread. Messages are sent in three lanes:
+
+- :data:`CONTROL` messages (handshake, echo and stats requests and replies)
+  are put in ``msg_out`` at once.
+- :data:`PACKET_OUT` messages (packet outs and the reactive flow mods sent
+  with them) are sent before any bulk flow mod.
+- :data:`FLOW_MOD` messages (bulk flow mods) are sent to each switch at the
+  rate of its token bucket. Buffers of many flow mods are split in chunks of
+  the tokens available.
+
+Each lane is served in round robin over the switches with pending messages,
+so a large push to a switch does not delay the messages of other switches.
+The lanes below CONTROL wait while ``msg_out`` has :data:`OUTBOUND_BACKLOG`
+events, so control messages never wait behind many of them. of_core calls
+:meth:`OutboundScheduler.written` for each message written, which wakes the
+waiting thread.
+"""
+from collections import deque
+from threading import Condition, Thread
+from time import monotonic
+
+from kytos.core import KytosEvent, log
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.utils import PackedMessages
+
+#: Lanes, in priority order
+CONTROL = 0
+PACKET_OUT = 1
+FLOW_MOD = 2
+
+#: Lanes queued by the scheduler, in priority order
+QUEUED_LANES = (PACKET_OUT, FLOW_MOD)
+
+#: Seconds waited for a message to be written when msg_out has
+#: OUTBOUND_BACKLOG events, doubled up to BACKLOG_WAIT_MAX while it is full.
+#: Events to closed connections are discarded without calling
+#: :meth:`OutboundScheduler.written`, so the wait is not indefinite.
+BACKLOG_WAIT = 0.001
+BACKLOG_WAIT_MAX = 0.1
+
+
+def _count_flow_mods(event):
+    """Return the number of flow mods in a message event."""
+    message = event.content['message']
+    if isinstance(message, PackedMessages):
+        return message.count
+    return 1 if event.name.endswith('ofpt_flow_mod') else 0
+
+
+class TokenBucket:
+    """Rate limit of a switch, with ``rate`` tokens per second."""
+
+    def __init__(self, rate, burst):
+        """Start with ``burst`` tokens, the maximum.
+
+        Raises:
+            ValueError: if ``rate`` is not positive or ``burst`` is less
+                than one token.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError('invalid flow mod rate %s and burst %s' %
+                             (rate, burst))
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._last = monotonic()
+
+    def refill(self, now):
+        """Add the tokens of the time since the last refill."""
+        if now > self._last:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def consume(self, count):
+        """Take ``count`` tokens. Tokens may become negative."""
+        self.tokens -= count
+
+    def get_delay(self):
+        """Return the seconds until there is a token."""
+        return max(0, (1 - self.tokens) / self.rate)
+
+
+class SwitchQueue:
+    """Messages waiting to be sent to a connection, by lane."""
+
+    def __init__(self, connection, bucket):
+        """Create empty lanes."""
+        self.connection = connection
+        self.bucket = bucket
+        #: Events by lane. A FLOW_MOD entry is [event, offset, remaining]:
+        #: the byte offset and number of messages not sent yet.
+        self.lanes = {lane: deque() for lane in QUEUED_LANES}
+        #: Whether the queue is in the round robin of each lane
+        self.active = {lane: False for lane in QUEUED_LANES}
+
+    def __len__(self):
+        """Return the number of events waiting."""
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def pop(self, lane, now):
+        """Return the next event of ``lane`` allowed now.
+
+        Returns:
+            tuple: The event, or None and the seconds until the switch has
+                tokens to send a flow mod.
+        """
+        events = self.lanes[lane]
+        self.bucket.refill(now)
+        if lane == PACKET_OUT:
+            event = events.popleft()
+            self.bucket.consume(_count_flow_mods(event))
+            return event, None
+        if self.bucket.tokens < 1:
+            return None, self.bucket.get_delay()
+        entry = events[0]
+        event, offset, remaining = entry
+        message = event.content['message']
+        if not isinstance(message, PackedMessages):
+            events.popleft()
+            self.bucket.consume(1)
+            return event, None
+        count = min(remaining, int(self.bucket.tokens),
+                    settings.OUTBOUND_FLOW_MOD_QUANTUM)
+        if offset == 0 and count == message.count:
+            events.popleft()
+            chunk = message
+        else:
+            chunk, entry[1] = message.slice(offset, count)
+            entry[2] -= count
+            if not entry[2]:
+                events.popleft()
+            event = KytosEvent(name=event.name,
+                               content=dict(event.content, message=chunk))
+        self.bucket.consume(count)
+        return event, None
+
+    def as_dict(self):
+        """Return the messages waiting by lane and the bucket state."""
+        return {'packet_out': len(self.lanes[PACKET_OUT]),
+                'flow_mod': sum(entry[2] for entry in self.lanes[FLOW_MOD]),
+                'tokens': self.bucket.tokens, 'rate': self.bucket.rate,
+                'burst': self.bucket.burst}
+
+
+class OutboundScheduler:
+    """Messages to switches sent by lane, in round robin over the switches.
+
+    Events are put in ``msg_out`` by a thread started by of_core. Before it
+    is started, all events are put in ``msg_out`` at once.
+    """
+
+    def __init__(self):
+        """Create a scheduler without queues."""
+        self._controller = None
+        self._thread = None
+        self._running = False
+        #: SwitchQueue by connection
+        self._queues = {}
+        #: SwitchQueues with events, in round robin order, by lane
+        self._active = {lane: deque() for lane in QUEUED_LANES}
+        self._condition = Condition()
+        #: Whether the thread waits for msg_out to be written
+        self._backlogged = False
+
+    def start(self, controller):
+        """Start sending the events queued to ``controller``."""
+        with self._condition:
+            self._controller = controller
+            self._running = True
+            self._thread = Thread(target=self._run,
+                                  name='legacy/of_core.outbound', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread, putting the events queued in ``msg_out``."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        with self._condition:
+            for queue in self._queues.values():
+                for lane in QUEUED_LANES:
+                    for entry in queue.lanes[lane]:
+                        self._controller.buffers.msg_out.put(
+                            self._get_remaining(lane, entry))
+            self._queues.clear()
+            for active in self._active.values():
+                active.clear()
+
+    def send(self, controller, event, lane=CONTROL):
+        """Send a message event to its destination in ``lane``.
+
+        Args:
+            controller: Kytos controller.
+            event (KytosEvent): Event with the ``message`` and its
+                ``destination`` connection.
+            lane (int): :data:`CONTROL`, :data:`PACKET_OUT` or
+                :data:`FLOW_MOD`.
+        """
+        with self._condition:
+            if lane == CONTROL or not self._running:
+                controller.buffers.msg_out.put(event)
+                return
+            connection = event.content['destination']
+            queue = self._queues.get(connection)
+            if queue is None:
+                self._forget_closed()
+                queue = SwitchQueue(connection, self._new_bucket(connection))
+                self._queues[connection] = queue
+            if lane == FLOW_MOD:
+                message = event.content['message']
+                count = (message.count if isinstance(message, PackedMessages)
+                         else 1)
+                queue.lanes[lane].append([event, 0, count])
+            else:
+                queue.lanes[lane].append(event)
+            if not queue.active[lane]:
+                queue.active[lane] = True
+                self._active[lane].append(queue)
+            self._condition.notify()
+
+    def written(self):
+        """Wake the thread if it waits for ``msg_out`` to be written.
+
+        Called by of_core, on the thread writing ``msg_out``, after each
+        message is written to a switch.
+        """
+        if self._backlogged:
+            with self._condition:
+                self._condition.notify()
+
+    def as_dict(self):
+        """Return the state of the queue of each switch, by dpid."""
+        with self._condition:
+            return {self._get_dpid(connection) or '%s:%s' % connection.id:
+                    queue.as_dict()
+                    for connection, queue in self._queues.items()}
+
+    @staticmethod
+    def _get_dpid(connection):
+        """Return the dpid of the switch of ``connection``, or None."""
+        switch = getattr(connection, 'switch', None)
+        return None if switch is None else switch.dpid
+
+    def _new_bucket(self, connection):
+        """Return the token bucket of the switch of ``connection``.
+
+        Invalid rates in OUTBOUND_FLOW_MOD_RATES are replaced by the default.
+        """
+        dpid = self._get_dpid(connection)
+        default = (settings.OUTBOUND_FLOW_MOD_RATE,
+                   settings.OUTBOUND_FLOW_MOD_BURST)
+        rate, burst = settings.OUTBOUND_FLOW_MOD_RATES.get(dpid, default)
+        try:
+            return TokenBucket(rate, burst)
+        except ValueError as error:
+            log.warning('Switch %s: %s, using the default.', dpid, error)
+            return TokenBucket(*default)
+
+    def _run(self):
+        """Put the events allowed in ``msg_out``, waiting for the others."""
+        msg_out = self._controller.buffers.msg_out
+        backlog_wait = BACKLOG_WAIT
+        while self._running:
+            with self._condition:
+                if not self._running:
+                    return
+                # Set before the size is read, so a write after it notifies
+                self._backlogged = True
+                if msg_out.qsize() >= settings.OUTBOUND_BACKLOG:
+                    self._condition.wait(backlog_wait)
+                    backlog_wait = min(2 * backlog_wait, BACKLOG_WAIT_MAX)
+                    continue
+                self._backlogged = False
+                backlog_wait = BACKLOG_WAIT
+                event, delay = self._next(monotonic())
+                if event is None:
+                    self._condition.wait(delay)
+                    continue
+            msg_out.put(event)
+
+    def _next(self, now):
+        """Return the next event, or None and the seconds to wait.
+
+        Call holding the lock. Connections closed are dropped with their
+        events.
+        """
+        wait = None
+        for lane in QUEUED_LANES:
+            active = self._active[lane]
+            for _ in range(len(active)):
+                queue = active.popleft()
+                if not queue.connection.is_alive():
+                    queue.active[lane] = False
+                    self._drop(queue)
+                    continue
+                event, delay = queue.pop(lane, now)
+                if queue.lanes[lane]:
+                    active.append(queue)
+                else:
+                    queue.active[lane] = False
+                if event is not None:
+                    return event, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _drop(self, queue):
+        """Forget the queue of a closed connection and its events."""
+        log.debug('Dropping %d events to closed connection %s', len(queue),
+                  queue.connection.id)
+        del self._queues[queue.connection]
+        for lane in QUEUED_LANES:
+            if queue.active[lane]:
+                self._active[lane].remove(queue)
+
+    def _forget_closed(self):
+        """Forget the empty queues of closed connections."""
+        closed = [connection for connection, queue in self._queues.items()
+                  if not queue and not connection.is_alive()]
+        for connection in closed:
+            del self._queues[connection]
+
+    @staticmethod
+    def _get_remaining(lane, entry):
+        """Return the event of the messages of ``entry`` not sent yet."""
+        if lane != FLOW_MOD:
+            return entry
+        event, offset, remaining = entry
+        message = event.content['message']
+        if offset == 0:
+            return event
+        chunk, _ = message.slice(offset, remaining)
+        return KytosEvent(name=event.name,
+                          content=dict(event.content, message=chunk))
+
+
+#: Outbound scheduler shared by the NApps and started by of_core
+outbound = OutboundScheduler()  # pylint: disable=invalid-name
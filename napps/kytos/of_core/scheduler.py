@@ -0,0 +1,183 @@
+"""Periodic per-switch tasks shared by the NApps.
+
+NApps register tasks with :data:`scheduler`, the single instance driven by
+of_core. Each task runs for every established switch, at its own offset within
+the task interval, so the requests to all switches are not sent at once.
+
+Timers are kept in a hashed timer wheel: a circular list of slots, one for
+each tick. A timer further than a wheel turn away waits a number of rounds in
+its slot. Adding a timer and advancing a tick do not depend on the number of
+timers in other slots.
+"""
+from random import uniform
+from threading import Lock
+from time import monotonic
+
+from kytos.core import log
+
+from napps.legacy.of_core import settings
+
+
+class Task:
+    """Periodic work registered by a NApp."""
+
+    def __init__(self, name, interval, callback):
+        """Store the task attributes.
+
+        Args:
+            name (str): Unique task name, prefixed by the NApp name.
+            interval (float): Seconds between runs for the same switch.
+            callback (callable): Called with a switch. It may return the
+                seconds until its next run for that switch instead of
+                ``interval``.
+        """
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+
+
+class Timer:
+    """Next run of a task for a switch."""
+
+    __slots__ = ('task', 'switch', 'rounds', 'cancelled')
+
+    def __init__(self, task, switch, rounds):
+        """Create a timer that waits ``rounds`` wheel turns in its slot."""
+        self.task = task
+        self.switch = switch
+        self.rounds = rounds
+        self.cancelled = False
+
+
+class Scheduler:
+    """Hashed timer wheel running tasks for each switch."""
+
+    def __init__(self, tick=settings.SCHEDULER_TICK,
+                 slots=settings.SCHEDULER_SLOTS,
+                 jitter=settings.SCHEDULER_JITTER):
+        """Create an empty wheel.
+
+        Args:
+            tick (float): Seconds between slots.
+            slots (int): Number of slots in the wheel.
+            jitter (float): Maximum fraction of the interval added to or
+                subtracted from each delay.
+        """
+        self.tick = tick
+        self.jitter = jitter
+        self._wheel = [[] for _ in range(slots)]
+        self._current = 0
+        self._last_tick = None
+        self._tasks = {}
+        self._switches = {}
+        #: Current timer by (task name, dpid)
+        self._timers = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        """Return the number of timers."""
+        return len(self._timers)
+
+    def register(self, name, interval, callback):
+        """Run ``callback`` every ``interval`` seconds for each switch.
+
+        The first run for each switch happens at a random time within the
+        interval. Registering a name again replaces the previous task.
+        """
+        task = Task(name, interval, callback)
+        with self._lock:
+            self._tasks[name] = task
+            for switch in self._switches.values():
+                self._schedule(task, switch, uniform(0, interval))
+
+    def unregister(self, name):
+        """Stop running the task ``name``."""
+        with self._lock:
+            self._tasks.pop(name, None)
+            for key in [key for key in self._timers if key[0] == name]:
+                self._timers.pop(key).cancelled = True
+
+    def add_switch(self, switch):
+        """Run all tasks for ``switch``, replacing its previous timers.
+
+        Called by of_core when the OpenFlow handshake is complete.
+        """
+        with self._lock:
+            self._switches[switch.dpid] = switch
+            for task in self._tasks.values():
+                self._schedule(task, switch, uniform(0, task.interval))
+
+    def run_pending(self, now=None):
+        """Run the tasks of all slots up to ``now``.
+
+        Args:
+            now (float): Monotonic time in seconds. Defaults to the current
+                time.
+        """
+        if now is None:
+            now = monotonic()
+        if self._last_tick is None:
+            self._last_tick = now
+        while now - self._last_tick >= self.tick:
+            self._last_tick += self.tick
+            for timer in self._advance():
+                self._run(timer)
+
+    def _advance(self):
+        """Move to the next slot and return its expired timers."""
+        with self._lock:
+            self._current = (self._current + 1) % len(self._wheel)
+            slot = self._wheel[self._current]
+            expired = [timer for timer in slot
+                       if timer.rounds == 0 and not timer.cancelled]
+            waiting = []
+            for timer in slot:
+                if timer.rounds > 0 and not timer.cancelled:
+                    timer.rounds -= 1
+                    waiting.append(timer)
+            self._wheel[self._current] = waiting
+        return expired
+
+    def _run(self, timer):
+        """Run an expired timer and schedule the next run."""
+        task, switch = timer.task, timer.switch
+        connection = switch.connection
+        if connection is None or not connection.is_alive():
+            self._remove(timer)
+            return
+        delay = None
+        if switch.is_connected():
+            try:
+                delay = task.callback(switch)
+            except Exception:  # pylint: disable=broad-except
+                log.exception('Task %s failed for switch %s.', task.name,
+                              switch.dpid)
+        if delay is None:
+            delay = task.interval * (1 + uniform(-self.jitter, self.jitter))
+        with self._lock:
+            if not timer.cancelled:
+                self._schedule(task, switch, delay)
+
+    def _remove(self, timer):
+        """Forget a timer and its switch, unless the switch reconnected."""
+        dpid = timer.switch.dpid
+        with self._lock:
+            if self._timers.get((timer.task.name, dpid)) is timer:
+                del self._timers[timer.task.name, dpid]
+            if self._switches.get(dpid) is timer.switch:
+                del self._switches[dpid]
+
+    def _schedule(self, task, switch, delay):
+        """Add a timer ``delay`` seconds from now. Call holding the lock."""
+        ticks = max(1, round(delay / self.tick))
+        slots = len(self._wheel)
+        timer = Timer(task, switch, (ticks - 1) // slots)
+        self._wheel[(self._current + ticks) % slots].append(timer)
+        previous = self._timers.get((task.name, switch.dpid))
+        if previous is not None:
+            previous.cancelled = True
+        self._timers[task.name, switch.dpid] = timer
+
+
+#: Scheduler shared by the NApps and driven by of_core
+scheduler = Scheduler()  # pylint: disable=invalid-name
@@ -12,5 +12,81 @@ SEND_FEATURES_REQUEST_ON_ECHO = False
 #: Send Echo requests to switches periodically to keep connection
 SEND_ECHO_REQUESTS = True
 
+#: Send an echo request only to switches that have not sent any data for this
+#: number of seconds. Keep it below the core connection timeout.
+ECHO_IDLE_TIME = STATS_INTERVAL
+
+#: Close the connection of a switch that has not replied this number of
+#: consecutive echo requests
+ECHO_MAX_MISSED = 3
+
+#: Number of latest echo round-trip times kept per switch for percentiles
+ECHO_RTT_SAMPLES = 256
+
+#: Maximum messages received during the OpenFlow handshake, which are kept
+#: until it is complete
+DEFERRED_MESSAGES_MAX = 1024
+
+#: What to do with messages received during the handshake after
+#: DEFERRED_MESSAGES_MAX: 'drop_oldest', 'drop_newest' or 'disconnect'
+DEFERRED_MESSAGES_OVERFLOW = 'drop_oldest'
+
+#: Maximum multipart replies being reassembled per connection and NApp. The
+#: oldest reply is discarded when a new one arrives.
+MULTIPART_MAX_PENDING = 4
+
+#: Maximum fragments of a reply kept while waiting for a previous fragment.
+#: The reply is discarded when more arrive out of order.
+MULTIPART_MAX_EARLY = 64
+
 #: Send Set Config messages right after the OpenFlow handshake
 SEND_SET_CONFIG = True
+
+#: Incoming message types (e.g. 'ofpt_packet_in') to be emitted in batches,
+#: with a single event for all the messages of a type in each raw data read.
+#: Batch event names have 'batch' after the direction, e.g.
+#: 'kytos/of_core.v0x01.messages.in.batch.ofpt_packet_in'.
+BATCH_MESSAGES_IN = []
+
+#: Time one in each TIMING_SAMPLE_RATE raw data reads (slicer, unpack and emit)
+#: and listener calls (queue wait). Zero disables timing. Message and byte
+#: counters are always on.
+TIMING_SAMPLE_RATE = 0
+
+#: Seconds between slots of the timer wheel that runs periodic tasks (flow
+#: stats and echo requests, and tasks of other NApps)
+SCHEDULER_TICK = 0.25
+
+#: Number of slots in the timer wheel. A turn takes SCHEDULER_TICK *
+#: SCHEDULER_SLOTS seconds.
+SCHEDULER_SLOTS = 256
+
+#: Fraction of the task interval randomly added to or subtracted from each
+#: delay, so that tasks of different switches do not run together
+SCHEDULER_JITTER = 0.1
+
+#: Flow mods packed by python-openflow kept as templates by flow, so the
+#: same flows are packed only once for all switches
+FLOW_MOD_CACHE_SIZE = 65536
+
+#: Flows formatted as JSON while holding the lock of a flow table, in each
+#: chunk of a streamed response
+JSON_CHUNK_SIZE = 1000
+
+#: Flow mods per second sent to each switch by the outbound scheduler, and
+#: the number that can be sent at once after the switch was idle
+OUTBOUND_FLOW_MOD_RATE = 1000
+OUTBOUND_FLOW_MOD_BURST = 500
+
+#: Flow mod rate and burst of switches with a different capacity, by dpid,
+#: e.g. {'00:00:00:00:00:00:00:01': (200, 100)}. Rates must be positive and
+#: bursts at least 1, otherwise the defaults are used
+OUTBOUND_FLOW_MOD_RATES = {}
+
+#: Maximum flow mods sent to a switch in each turn of the round robin
+OUTBOUND_FLOW_MOD_QUANTUM = 100
+
+#: Packet outs and flow mods wait while the controller has this number of
+#: messages to be written, so control messages (echo, handshake) do not wait
+#: behind them
+OUTBOUND_BACKLOG = 32
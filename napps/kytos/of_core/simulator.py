@@ -0,0 +1,538 @@
+"""Simulated OpenFlow 1.0 and 1.3 switches for scale tests of a controller.
+
+Each switch connects to the controller, negotiates the version with hello
+messages (with a version bitmap when it supports more than one), and replies
+to features, echo, barrier, description, flow, port and port description
+requests. Flow tables of the configured size are sent in as many reply
+fragments as needed. Packet in messages are sent at a configured rate and
+their latency is measured until a packet out or flow mod with the same buffer
+id is received::
+
+    python -m napps.legacy.of_core.simulator --switches 1000 --flows 1000 \\
+        --packet-in-rate 1 --duration 60 -o fleet.json
+
+Only python-openflow is needed, so the fleet can run on another host. Larger
+fleets can be split in many processes with different ``--first-dpid``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+from time import monotonic
+
+from pyof.v0x04.common.flow_match import MatchType
+
+#: Header of OpenFlow messages: version, type, length and xid
+HEADER = struct.Struct('!BBHI')
+#: Hello element with the version bitmap: type, length and bitmap
+HELLO_BITMAP = struct.Struct('!HHI')
+#: Features reply body: datapath_id, n_buffers, n_tables, auxiliary_id (1.3),
+#: capabilities and actions (1.0) or reserved (1.3)
+FEATURES_V0x01 = struct.Struct('!QIB3xII')
+FEATURES_V0x04 = struct.Struct('!QIBB2xII')
+#: Stats (1.0) and multipart (1.3) type and flags
+STATS_V0x01 = struct.Struct('!HH')
+MULTIPART_V0x04 = struct.Struct('!HH4x')
+#: ofp_desc: manufacturer, hardware, software, serial and datapath
+DESC = struct.Struct('!256s256s256s32s256s')
+#: ofp_phy_port (1.0) and ofp_port (1.3)
+PORT_V0x01 = struct.Struct('!H6s16sIIIIII')
+PORT_V0x04 = struct.Struct('!I4x6s2x16sIIIIIIII')
+#: ofp_port_stats: port, 12 counters and duration (1.3)
+PORT_STATS_V0x01 = struct.Struct('!H6x12Q')
+PORT_STATS_V0x04 = struct.Struct('!I4x12QII')
+#: ofp_flow_stats of 1.0 with the match and one output action
+FLOW_STATS_V0x01 = struct.Struct('!HBxIH6s6sHBxHBB2xIIHHIIHHH6xQQQHHHH')
+#: ofp_flow_stats of 1.3 up to the match, followed by the match with in_port
+#: and an apply actions instruction with one output action
+FLOW_STATS_V0x04 = struct.Struct('!HBxIIHHHH4xQQQHHHBBI4xHH4xHHIH6x')
+#: Packet in up to the data: buffer_id, total_len, in_port and reason (1.0),
+#: or buffer_id, total_len, reason, table_id, cookie and the match with
+#: in_port (1.3)
+PACKET_IN_V0x01 = struct.Struct('!IHHBx')
+PACKET_IN_V0x04 = struct.Struct('!IHBBQHHHBBI4x2x')
+#: Buffer id of packet out and flow mod messages, by version and type
+BUFFER_ID = struct.Struct('!I')
+BUFFER_ID_OFFSETS = {(0x01, 13): 8, (0x01, 14): 64,
+                     (0x04, 13): 8, (0x04, 14): 32}
+
+OFPT_HELLO = 0
+OFPT_ERROR = 1
+OFPT_ECHO_REQUEST = 2
+OFPT_ECHO_REPLY = 3
+OFPT_FEATURES_REQUEST = 5
+OFPT_FEATURES_REPLY = 6
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+OFPT_FLOW_MOD = 14
+#: Message types that differ between versions
+STATS_REQUEST = {0x01: 16, 0x04: 18}
+STATS_REPLY = {0x01: 17, 0x04: 19}
+BARRIER_REQUEST = {0x01: 18, 0x04: 20}
+BARRIER_REPLY = {0x01: 19, 0x04: 21}
+
+OFPHET_VERSIONBITMAP = 1
+OFPET_HELLO_FAILED = 0
+OFPST_DESC = 0
+OFPST_FLOW = 1
+OFPST_PORT = 4
+OFPMP_PORT_DESC = 13
+REPLY_MORE = 1
+OFP_NO_BUFFER = 0xffffffff
+OFPXMC_OPENFLOW_BASIC = 0x8000
+
+#: Largest body of a stats reply fragment
+MAX_BODY = 0xffff - 16
+
+
+def message(version, message_type, xid, body=b''):
+    """Return an OpenFlow message with ``body`` after the header."""
+    return HEADER.pack(version, message_type, HEADER.size + len(body),
+                       xid) + body
+
+
+def hello(versions):
+    """Return a hello message, with a version bitmap for many versions."""
+    version = max(versions)
+    if len(versions) == 1 or version < 0x04:
+        return message(version, OFPT_HELLO, 0)
+    bitmap = sum(1 << supported for supported in versions)
+    return message(version, OFPT_HELLO, 0, HELLO_BITMAP.pack(
+        OFPHET_VERSIONBITMAP, HELLO_BITMAP.size, bitmap))
+
+
+def negotiate(versions, packet):
+    """Return the version to use after the controller ``packet`` hello.
+
+    The highest version in both bitmaps is used if the controller sent one.
+    Otherwise, the lowest of both highest versions.
+
+    Returns:
+        int: The version, or None if there is none in common.
+    """
+    version = packet[0]
+    offset = HEADER.size
+    while offset + 4 <= len(packet):
+        element_type, length = struct.unpack_from('!HH', packet, offset)
+        if element_type == OFPHET_VERSIONBITMAP and length >= 8:
+            bitmap = struct.unpack_from('!I', packet, offset + 4)[0]
+            common = [supported for supported in versions
+                      if bitmap >> supported & 1]
+            return max(common) if common else None
+        if length < 4:
+            break
+        offset += (length + 7) // 8 * 8
+    version = min(version, max(versions))
+    return version if version in versions else None
+
+
+def flow_stats_v0x01(index):
+    """Return an OpenFlow 1.0 flow stats entry with one output action."""
+    return FLOW_STATS_V0x01.pack(
+        FLOW_STATS_V0x01.size, 0,
+        # Match all fields but in_port
+        0x3ffffe, index % 48 + 1, bytes(6), bytes(6), 0, 0, 0, 0, 0, 0, 0,
+        0, 0, index, 0, index % 100, 0, 0, index, index, index * 64,
+        0, 8, index % 47 + 1, 0)
+
+
+def flow_stats_v0x04(index):
+    """Return an OpenFlow 1.3 flow stats entry with one output action."""
+    return FLOW_STATS_V0x04.pack(
+        FLOW_STATS_V0x04.size, 0, index, 0, index % 100, 0, 0, 0, index,
+        index, index * 64,
+        MatchType.OFPMT_OXM, 12, OFPXMC_OPENFLOW_BASIC, 0, 4, index % 48 + 1,
+        4, 24, 0, 16, index % 47 + 1, 0)
+
+
+def port_v0x01(port_no, dpid):
+    """Return an OpenFlow 1.0 physical port description."""
+    return PORT_V0x01.pack(port_no, _mac(dpid, port_no),
+                           b'eth%d' % port_no, 0, 0, 0x2c0, 0x2c0, 0x2c0, 0)
+
+
+def port_v0x04(port_no, dpid):
+    """Return an OpenFlow 1.3 port description."""
+    return PORT_V0x04.pack(port_no, _mac(dpid, port_no),
+                           b'eth%d' % port_no, 0, 4, 0x2820, 0x2820, 0x2820,
+                           0, 10000000, 10000000)
+
+
+def port_stats(version, port_no, seconds):
+    """Return the stats of a port, growing with ``seconds``."""
+    packets = int(seconds * 1000)
+    counters = (packets, packets, packets * 500, packets * 500, 0, 0, 0, 0,
+                0, 0, 0, 0)
+    if version == 0x01:
+        return PORT_STATS_V0x01.pack(port_no, *counters)
+    return PORT_STATS_V0x04.pack(port_no, *counters, int(seconds), 0)
+
+
+def _mac(dpid, number):
+    """Return a hardware address from a datapath and a port or host."""
+    return struct.pack('!HI', number, dpid & 0xffffffff)
+
+
+def fragments(version, xid, stats_type, entries):
+    """Return stats reply messages with ``entries``, split as needed."""
+    header = STATS_V0x01 if version == 0x01 else MULTIPART_V0x04
+    bodies = []
+    body = []
+    size = 0
+    for entry in entries:
+        if size + len(entry) > MAX_BODY:
+            bodies.append(b''.join(body))
+            body, size = [], 0
+        body.append(entry)
+        size += len(entry)
+    bodies.append(b''.join(body))
+    return [message(version, STATS_REPLY[version], xid,
+                    header.pack(stats_type,
+                                REPLY_MORE if i < len(bodies) - 1 else 0) +
+                    body)
+            for i, body in enumerate(bodies)]
+
+
+class FlowTables:
+    """Flow stats reply bodies by version and number of flows.
+
+    Switches with the same table size share the same bodies, so only the
+    message headers are built for each reply.
+    """
+
+    def __init__(self):
+        """Start without bodies."""
+        self._bodies = {}
+
+    def get(self, version, flows):
+        """Return the flow stats reply fragments without the header."""
+        key = version, flows
+        if key not in self._bodies:
+            entry = flow_stats_v0x01 if version == 0x01 else flow_stats_v0x04
+            self._bodies[key] = [
+                packet[HEADER.size:] for packet in
+                fragments(version, 0, OFPST_FLOW,
+                          (entry(index) for index in range(flows)))]
+        return self._bodies[key]
+
+
+class FleetStats:
+    """Measurements of all simulated switches."""
+
+    #: Maximum packet in latency samples kept
+    MAX_SAMPLES = 100000
+
+    def __init__(self):
+        """Start without measurements."""
+        self.started = monotonic()
+        self.connected = 0
+        self.disconnected = 0
+        self.handshakes = 0
+        #: Seconds from the connection to the features reply
+        self.handshake_times = []
+        self.last_handshake = None
+        self.echo_requests = 0
+        self.stats_replies = 0
+        self.stats_bytes = 0
+        self.flow_mods = 0
+        self.packets_in = 0
+        self.latencies = []
+
+    def add_latency(self, seconds):
+        """Add a packet in latency sample."""
+        if len(self.latencies) < self.MAX_SAMPLES:
+            self.latencies.append(seconds)
+        else:
+            self.latencies[random.randrange(self.MAX_SAMPLES)] = seconds
+
+    def as_dict(self):
+        """Return the measurements as a JSON serializable dictionary."""
+        elapsed = monotonic() - self.started
+        handshake_elapsed = (self.last_handshake or monotonic()) - self.started
+        return {'seconds': elapsed,
+                'connected': self.connected,
+                'disconnected': self.disconnected,
+                'handshakes': self.handshakes,
+                'handshakes_per_sec': (self.handshakes / handshake_elapsed
+                                       if handshake_elapsed else 0.0),
+                'handshake_seconds': percentiles(self.handshake_times),
+                'echo_requests': self.echo_requests,
+                'stats_replies': self.stats_replies,
+                'stats_bytes_per_sec': self.stats_bytes / elapsed,
+                'flow_mods': self.flow_mods,
+                'packets_in': self.packets_in,
+                'packet_in_latency_seconds': percentiles(self.latencies)}
+
+
+def percentiles(samples):
+    """Return the number of samples, median, 90th, 99th percentile and max."""
+    if not samples:
+        return {'samples': 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {'samples': len(ordered),
+            'p50': ordered[last * 50 // 100],
+            'p90': ordered[last * 90 // 100],
+            'p99': ordered[last * 99 // 100],
+            'max': ordered[last]}
+
+
+class SimulatedSwitch:
+    """An OpenFlow switch with ports, a flow table and hosts."""
+
+    def __init__(self, dpid, versions, fleet, ports=4, flows=100,
+                 packet_in_rate=0.0):
+        """Configure the switch.
+
+        Args:
+            dpid (int): Datapath id.
+            versions (list): Supported OpenFlow versions.
+            fleet (Fleet): Fleet with the measurements and flow tables.
+            ports (int): Number of ports.
+            flows (int): Number of flows in the flow stats replies.
+            packet_in_rate (float): Packet in messages per second.
+        """
+        self.dpid = dpid
+        self.versions = versions
+        self.fleet = fleet
+        self.ports = ports
+        self.flows = flows
+        self.packet_in_rate = packet_in_rate
+        self.version = None
+        self.connected_at = None
+        self.handshake_complete = False
+        self._writer = None
+        self._buffer_id = 0
+        #: Send time of packets in by buffer id
+        self._pending = {}
+
+    async def run(self, host, port):
+        """Connect to the controller and handle messages until closed."""
+        stats = self.fleet.stats
+        reader, self._writer = await asyncio.open_connection(host, port)
+        self.connected_at = monotonic()
+        stats.connected += 1
+        self._writer.write(hello(self.versions))
+        packets_in = None
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                length = HEADER.unpack(header)[2]
+                packet = header + await reader.readexactly(
+                    max(length - HEADER.size, 0))
+                self.handle(packet)
+                if packets_in is None and self.packet_in_rate and \
+                        packet[1] == OFPT_FEATURES_REQUEST:
+                    packets_in = asyncio.ensure_future(self.send_packets_in())
+                await self._writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if packets_in is not None:
+                packets_in.cancel()
+            self._writer.close()
+            stats.disconnected += 1
+
+    def handle(self, packet):
+        """Reply to a message from the controller."""
+        message_type, xid = packet[1], HEADER.unpack_from(packet)[3]
+        version = self.version
+        if version is None and message_type != OFPT_HELLO:
+            return
+        if message_type == OFPT_HELLO:
+            self.version = negotiate(self.versions, packet)
+            if self.version is None:
+                self.send(message(max(self.versions), OFPT_ERROR, xid,
+                                  struct.pack('!HH', OFPET_HELLO_FAILED, 0)))
+                self._writer.close()
+        elif message_type == OFPT_ECHO_REQUEST:
+            self.fleet.stats.echo_requests += 1
+            self.send(message(version, OFPT_ECHO_REPLY, xid,
+                              packet[HEADER.size:]))
+        elif message_type == OFPT_FEATURES_REQUEST:
+            self.send(self.features_reply(xid))
+            stats = self.fleet.stats
+            if not self.handshake_complete:
+                self.handshake_complete = True
+                now = monotonic()
+                stats.handshakes += 1
+                stats.handshake_times.append(now - self.connected_at)
+                stats.last_handshake = now
+        elif message_type == STATS_REQUEST[version]:
+            stats_type = struct.unpack_from('!H', packet, HEADER.size)[0]
+            for reply in self.stats_reply(xid, stats_type):
+                self.fleet.stats.stats_replies += 1
+                self.fleet.stats.stats_bytes += len(reply)
+                self.send(reply)
+        elif message_type == BARRIER_REQUEST[version]:
+            self.send(message(version, BARRIER_REPLY[version], xid))
+        elif message_type in (OFPT_PACKET_OUT, OFPT_FLOW_MOD):
+            if message_type == OFPT_FLOW_MOD:
+                self.fleet.stats.flow_mods += 1
+            offset = BUFFER_ID_OFFSETS[version, message_type]
+            if len(packet) >= offset + BUFFER_ID.size:
+                buffer_id = BUFFER_ID.unpack_from(packet, offset)[0]
+                sent = self._pending.pop(buffer_id, None)
+                if sent is not None:
+                    self.fleet.stats.add_latency(monotonic() - sent)
+
+    def send(self, packet):
+        """Send ``packet`` to the controller."""
+        self._writer.write(packet)
+
+    def features_reply(self, xid):
+        """Return the features reply, with the ports in OpenFlow 1.0."""
+        if self.version == 0x01:
+            ports = b''.join(port_v0x01(port_no, self.dpid)
+                             for port_no in range(1, self.ports + 1))
+            body = FEATURES_V0x01.pack(self.dpid, 256, 1, 0xc7, 0xfff) + ports
+        else:
+            body = FEATURES_V0x04.pack(self.dpid, 256, 1, 0, 0x4f, 0)
+        return message(self.version, OFPT_FEATURES_REPLY, xid, body)
+
+    def stats_reply(self, xid, stats_type):
+        """Return the stats reply messages of a request."""
+        version = self.version
+        if stats_type == OFPST_FLOW:
+            return [HEADER.pack(version, STATS_REPLY[version],
+                                HEADER.size + len(body), xid) + body
+                    for body in self.fleet.flow_tables.get(version,
+                                                           self.flows)]
+        if stats_type == OFPST_DESC:
+            entries = [DESC.pack(b'Kytos', b'Simulated switch', b'simulator',
+                                 b'%d' % self.dpid, b'')]
+        elif stats_type == OFPST_PORT:
+            seconds = monotonic() - self.connected_at
+            entries = [port_stats(version, port_no, seconds)
+                       for port_no in range(1, self.ports + 1)]
+        elif stats_type == OFPMP_PORT_DESC and version == 0x04:
+            entries = [port_v0x04(port_no, self.dpid)
+                       for port_no in range(1, self.ports + 1)]
+        else:
+            entries = []
+        return fragments(version, xid, stats_type, entries)
+
+    async def send_packets_in(self):
+        """Send packet in messages at random intervals of the given rate."""
+        frames = [self.frame(host) for host in range(1, self.ports + 1)]
+        while True:
+            await asyncio.sleep(random.expovariate(self.packet_in_rate))
+            self._buffer_id = (self._buffer_id + 1) % OFP_NO_BUFFER
+            port_no = random.randint(1, self.ports)
+            self.send(self.packet_in(self._buffer_id, port_no,
+                                     frames[port_no - 1]))
+            self._pending[self._buffer_id] = monotonic()
+            if len(self._pending) > 1024:
+                # Packets the controller did not reply
+                del self._pending[next(iter(self._pending))]
+            self.fleet.stats.packets_in += 1
+
+    def packet_in(self, buffer_id, port_no, frame):
+        """Return a packet in message with ``frame``."""
+        if self.version == 0x01:
+            body = PACKET_IN_V0x01.pack(buffer_id, len(frame), port_no, 0)
+        else:
+            body = PACKET_IN_V0x04.pack(
+                buffer_id, len(frame), 0, 0, 0, MatchType.OFPMT_OXM, 12,
+                OFPXMC_OPENFLOW_BASIC, 0, 4, port_no)
+        return message(self.version, OFPT_PACKET_IN, 0, body + frame)
+
+    def frame(self, host):
+        """Return an Ethernet frame from ``host`` to a random host."""
+        destination = random.randint(1, self.ports)
+        return (_mac(self.dpid, 0x100 + destination) +
+                _mac(self.dpid, 0x100 + host) + b'\x08\x00' + bytes(46))
+
+
+class Fleet:
+    """Simulated switches connecting to the same controller."""
+
+    def __init__(self, switches, versions, first_dpid=1, **options):
+        """Create the switches.
+
+        Args:
+            switches (int): Number of switches.
+            versions (list): Lists of supported versions, assigned to the
+                switches in turns.
+            first_dpid (int): Datapath id of the first switch.
+            options: Other :class:`SimulatedSwitch` arguments.
+        """
+        self.stats = FleetStats()
+        self.flow_tables = FlowTables()
+        self._switches = [
+            SimulatedSwitch(first_dpid + index,
+                            versions[index % len(versions)], self, **options)
+            for index in range(switches)]
+
+    async def run(self, host, port, connect_rate, duration):
+        """Connect ``connect_rate`` switches per second and run ``duration``.
+
+        Returns:
+            dict: Measurements, as in :meth:`FleetStats.as_dict`.
+        """
+        self.stats = FleetStats()
+        tasks = []
+        for switch in self._switches:
+            tasks.append(asyncio.ensure_future(switch.run(host, port)))
+            if connect_rate:
+                await asyncio.sleep(1 / connect_rate)
+        await asyncio.sleep(duration)
+        result = self.stats.as_dict()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return result
+
+
+def _versions(value):
+    """Parse supported versions such as ``1,4`` or ``0x01``."""
+    return sorted(int(version, 0) for version in value.split(','))
+
+
+def _parse_args(args):
+    """Return the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Simulate OpenFlow switches connected to a controller.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6633)
+    parser.add_argument('-n', '--switches', type=int, default=100)
+    parser.add_argument('-v', '--versions', type=_versions, action='append',
+                        help='versions supported by a switch, e.g. 1,4;'
+                        ' repeat to alternate (default: 1)')
+    parser.add_argument('--first-dpid', type=int, default=1)
+    parser.add_argument('--ports', type=int, default=4)
+    parser.add_argument('--flows', type=int, default=100,
+                        help='flows in each flow table')
+    parser.add_argument('--packet-in-rate', type=float, default=0.0,
+                        help='packet in messages per second per switch')
+    parser.add_argument('--connect-rate', type=float, default=500.0,
+                        help='new connections per second (0: all at once)')
+    parser.add_argument('-d', '--duration', type=float, default=30.0,
+                        help='seconds to run after all switches connected')
+    parser.add_argument('-o', '--output', help='JSON results file')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Run a fleet from the command line."""
+    args = _parse_args(args)
+    fleet = Fleet(args.switches, args.versions or [[0x01]],
+                  first_dpid=args.first_dpid, ports=args.ports,
+                  flows=args.flows, packet_in_rate=args.packet_in_rate)
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(fleet.run(
+            args.host, args.port, args.connect_rate, args.duration))
+    finally:
+        loop.close()
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
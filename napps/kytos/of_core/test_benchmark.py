@@ -0,0 +1,35 @@
+"""Test the receive path benchmark."""
+import unittest
+
+from napps.legacy.of_core.benchmark import (count_messages, measure, Replay,
+                                            split, synthesize)
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test synthesized streams and their replay."""
+
+    def test_synthesize(self):
+        """Streams have at least the requested number of messages."""
+        for version in 0x01, 0x04:
+            stream, messages = synthesize(version, 50)
+            self.assertGreaterEqual(messages, 50)
+            self.assertEqual(messages, count_messages(stream))
+
+    def test_split(self):
+        """Chunks have the whole stream."""
+        stream, _ = synthesize(0x01, 20)
+        chunks = split(stream, 1, 64)
+        self.assertEqual(stream, b''.join(chunks))
+        self.assertTrue(all(1 <= len(chunk) <= 64 for chunk in chunks))
+
+    def test_replay(self):
+        """All messages are handled and the handshake is completed."""
+        replay = Replay()
+        stream, messages = synthesize(0x04, 50)
+        connection, _ = replay.run(split(stream, 1, 512))
+        self.assertTrue(connection.switch is not None)
+        self.assertIsNone(connection.deferred_messages)
+        result = measure(replay, split(stream), messages, repeat=1)
+        self.assertEqual(len(stream), result['bytes'])
+        self.assertGreater(result['messages_per_sec'], 0)
+        self.assertIn('unpack', result['stage_seconds'])
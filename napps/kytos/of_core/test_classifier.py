@@ -0,0 +1,85 @@
+"""Test the tuple space search classifier."""
+import random
+import unittest
+
+from napps.legacy.of_core.classifier import Classifier, get_rule, to_int
+from napps.legacy.of_core.flow import Flow
+
+#: OpenFlow 1.0 wildcards of all fields
+OFPFW_ALL = (1 << 22) - 1
+
+
+def _header(**fields):
+    """Return a packet header with integer values."""
+    return {name: to_int(value) for name, value in fields.items()}
+
+
+class TestClassifier(unittest.TestCase):
+    """Test finding the flow of highest priority for a packet."""
+
+    def setUp(self):
+        """Create an empty classifier."""
+        self.classifier = Classifier()
+
+    def test_priority(self):
+        """The matching flow of highest priority is found."""
+        self.classifier.add('any', Flow(priority=1))
+        self.classifier.add('port', Flow(priority=10, in_port=1))
+        self.classifier.add('mac', Flow(priority=20, in_port=1,
+                                        dl_dst='00:00:00:00:00:02'))
+        self.assertEqual('mac', self.classifier.lookup(_header(
+            in_port=1, dl_dst='00:00:00:00:00:02')))
+        self.assertEqual('port', self.classifier.lookup(_header(
+            in_port=1, dl_dst='00:00:00:00:00:03')))
+        self.assertEqual('any', self.classifier.lookup(_header(in_port=2)))
+        self.classifier.remove('mac', Flow(priority=20, in_port=1,
+                                           dl_dst='00:00:00:00:00:02'))
+        self.assertEqual('port', self.classifier.lookup(_header(
+            in_port=1, dl_dst='00:00:00:00:00:02')))
+
+    def test_wildcards(self):
+        """OpenFlow 1.0 flows match the fields not wildcarded."""
+        # Exact in_port, nw_dst with 8 wildcarded bits
+        wildcards = OFPFW_ALL & ~1 & ~(0x3f << 14) | 8 << 14
+        self.classifier.add('subnet', Flow(
+            priority=5, wildcards=wildcards, in_port=1, dl_src='ff:ff:ff:ff',
+            nw_dst='10.0.1.0'))
+        self.assertEqual('subnet', self.classifier.lookup(_header(
+            in_port=1, dl_src='00:00:00:00:00:01', nw_dst='10.0.1.7')))
+        self.assertIsNone(self.classifier.lookup(_header(
+            in_port=1, nw_dst='10.0.2.7')))
+        self.assertIsNone(self.classifier.lookup(_header(in_port=1)))
+
+    def test_masked(self):
+        """Masked values of OpenFlow 1.3 flows are matched."""
+        self.classifier.add('masked', Flow(nw_src='10.0.0.0/255.255.0.0',
+                                           dl_type=0x0800))
+        self.assertEqual('masked', self.classifier.lookup(_header(
+            nw_src='10.0.5.5', dl_type=0x0800)))
+        self.assertIsNone(get_rule(Flow(oxm_fields={'metadata': '01'})))
+
+    def test_linear_scan(self):
+        """Lookups are the same as a linear scan by priority."""
+        rand = random.Random(0)
+        flows = []
+        for index in range(300):
+            fields = {name: rand.choice(values) for name, values in
+                      (('in_port', (1, 2, 3)), ('dl_type', (0x0800, 0x0806)),
+                       ('nw_proto', (6, 17)), ('tp_dst', (22, 80)))
+                      if rand.random() < 0.5}
+            flow = Flow(priority=rand.randrange(100), **fields)
+            flows.append((index, fields, flow))
+            self.classifier.add(index, flow)
+        for _ in range(200):
+            header = {'in_port': rand.choice((1, 2, 3)),
+                      'dl_type': rand.choice((0x0800, 0x0806)),
+                      'nw_proto': rand.choice((6, 17)),
+                      'tp_dst': rand.choice((22, 80))}
+            matches = [flow.priority for _, fields, flow in flows
+                       if all(header[name] == value
+                              for name, value in fields.items())]
+            item = self.classifier.lookup(header)
+            if matches:
+                self.assertEqual(max(matches), flows[item][2].priority)
+            else:
+                self.assertIsNone(item)
@@ -0,0 +1,55 @@
+"""Test of_core traffic counters."""
+import unittest
+from unittest.mock import Mock
+
+from kytos.core import KytosEvent
+from pyof.v0x01.symmetric.echo_reply import EchoReply
+from pyof.v0x01.symmetric.echo_request import EchoRequest
+
+from napps.legacy.of_core.counters import count_message_out, get_counters
+from napps.legacy.of_core.utils import PackedMessages
+
+
+class TestConnectionCounters(unittest.TestCase):
+    """Test counting messages by their headers."""
+
+    def setUp(self):
+        """Use a connection without socket."""
+        self.connection = Mock(spec=['send'])
+        self.send = self.connection.send
+        self.counters = get_counters(self.connection)
+
+    def test_count_in(self):
+        """Incoming messages are counted by version and type."""
+        packet = EchoRequest(data=b'a').pack()
+        self.counters.count_read(packet * 2)
+        self.counters.count_in(packet)
+        self.counters.count_in(packet)
+        counters = self.counters.as_dict()
+        self.assertEqual(2 * len(packet), counters['bytes_in'])
+        self.assertEqual({'v0x01.ofpt_echo_request': 2},
+                         counters['messages_in'])
+
+    def _written(self, message):
+        """Count ``message`` as written to the connection."""
+        count_message_out(KytosEvent(
+            name='test.messages.out.ofpt_echo_request',
+            content={'destination': self.connection, 'message': message}))
+
+    def test_count_out(self):
+        """Every message written is counted, without patching send."""
+        reply = EchoReply(data=b'abc')
+        buffer = EchoRequest().pack() + reply.pack()
+        self._written(PackedMessages(buffer))
+        self._written(reply)
+        counters = self.counters.as_dict()
+        self.assertEqual(len(buffer) + 11, counters['bytes_out'])
+        self.assertEqual({'v0x01.ofpt_echo_request': 1,
+                          'v0x01.ofpt_echo_reply': 2},
+                         counters['messages_out'])
+        self.assertIs(self.send, self.connection.send)
+        self.send.assert_not_called()
+
+    def test_same_counters(self):
+        """Counters are created only once per connection."""
+        self.assertIs(self.counters, get_counters(self.connection))
@@ -0,0 +1,38 @@
+"""Test echo round-trip time measurement."""
+import unittest
+
+from napps.legacy.of_core.echo import EchoMonitor
+
+
+class TestEchoMonitor(unittest.TestCase):
+    """Test matching echo replies with requests."""
+
+    def setUp(self):
+        """Start without echoes."""
+        self.monitor = EchoMonitor()
+
+    def test_reply(self):
+        """A reply with our data gives the round-trip time."""
+        data = self.monitor.new_data()
+        self.assertEqual(1, self.monitor.missed)
+        self.assertGreaterEqual(self.monitor.reply(data), 0)
+        self.assertEqual(0, self.monitor.missed)
+        self.assertEqual(1, self.monitor.as_dict()['samples'])
+
+    def test_older_echoes(self):
+        """Echoes sent before the replied one are not missed anymore."""
+        self.monitor.new_data()
+        data = self.monitor.new_data()
+        self.monitor.new_data()
+        self.assertEqual(3, self.monitor.missed)
+        self.monitor.reply(data)
+        self.assertEqual(1, self.monitor.missed)
+
+    def test_unknown_data(self):
+        """Replies to echoes we did not send are ignored."""
+        self.monitor.new_data()
+        self.assertIsNone(self.monitor.reply(b'kytosd_10'))
+        self.assertIsNone(self.monitor.reply(b''))
+        self.assertEqual(1, self.monitor.missed)
+        self.assertEqual({'missed': 1, 'samples': 0, 'last': None,
+                          'p50': None, 'p99': None}, self.monitor.as_dict())
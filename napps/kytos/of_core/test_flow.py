@@ -0,0 +1,53 @@
+"""Test flow identity."""
+import unittest
+
+from napps.legacy.of_core.flow import Flow, OutputAction
+
+
+def _flow(**kwargs):
+    """Return a flow from in port 1 to port 2 with other ``kwargs``."""
+    return Flow(in_port=1, actions=[OutputAction(2)], **kwargs)
+
+
+class TestFlow(unittest.TestCase):
+    """Test flow keys, equality, hash and id."""
+
+    def test_equal(self):
+        """Flows with the same fields are equal, whatever their counters."""
+        flow, other = _flow(), _flow()
+        other.packet_count = 10
+        self.assertEqual(flow, other)
+        self.assertEqual(hash(flow), hash(other))
+        self.assertEqual(flow.id, other.id)
+        self.assertEqual({flow}, {flow, other})
+
+    def test_read_only(self):
+        """Fields of the flow key can not be changed, counters can."""
+        flow = _flow()
+        for name in 'in_port', 'actions', 'oxm_fields', 'key':
+            with self.assertRaises(AttributeError):
+                setattr(flow, name, None)
+        flow.packet_count = 5
+        self.assertEqual(_flow(), flow)
+        self.assertEqual(1, flow.in_port)
+
+    def test_different(self):
+        """Flows with different match fields or actions are different."""
+        flow = _flow()
+        self.assertNotEqual(flow, _flow(priority=1))
+        self.assertNotEqual(flow, Flow(in_port=1, actions=[OutputAction(3)]))
+        self.assertNotEqual(flow.id, _flow(oxm_fields={'metadata': '01'}).id)
+
+    def test_unambiguous_id(self):
+        """Ids of different field values do not collide when concatenated."""
+        self.assertNotEqual(Flow(idle_timeout=1, hard_timeout=23).id,
+                            Flow(idle_timeout=12, hard_timeout=3).id)
+
+    def test_from_dict(self):
+        """A flow built from its dict is equal to it."""
+        flow = _flow(cookie=5)
+        flow.byte_count = 64
+        copy = Flow.from_dict(flow.as_dict()['flow'])
+        self.assertEqual(flow, copy)
+        self.assertEqual(flow.id, copy.id)
+        self.assertEqual(0, copy.byte_count)
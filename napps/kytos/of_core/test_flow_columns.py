@@ -0,0 +1,48 @@
+"""Test the columnar storage of flows."""
+import unittest
+
+from napps.legacy.of_core.flow import Flow, OutputAction
+from napps.legacy.of_core.flow_columns import FlowColumns
+
+
+class TestFlowColumns(unittest.TestCase):
+    """Test storing flows and creating views."""
+
+    def setUp(self):
+        """Create empty columns."""
+        self.columns = FlowColumns()
+
+    def test_view(self):
+        """Views are equal to the flows stored, including their ids."""
+        flows = [Flow(priority=10, table_id=0, in_port=1,
+                      dl_src='00:00:00:00:00:01', nw_dst='10.0.0.1',
+                      actions=[OutputAction(2)]),
+                 Flow(cookie=2 ** 64 - 1, dl_dst='AA:00:00:00:00:01',
+                      nw_src='10.0.0.0/8', oxm_fields={'ipv6_src': 'fe80'}),
+                 Flow(table_id=None, in_port=2 ** 32)]
+        flows[0].byte_count = 100
+        for flow in flows:
+            view = self.columns.flow(self.columns.store(flow))
+            self.assertEqual(flow.key, view.key)
+            self.assertEqual(flow.id, view.id)
+            self.assertEqual(flow.byte_count, view.byte_count)
+
+    def test_value(self):
+        """Single values are read without creating views."""
+        row = self.columns.store(Flow(dl_src='00:00:00:00:00:01',
+                                      actions=[OutputAction(2)]))
+        self.assertEqual('00:00:00:00:00:01',
+                         self.columns.value(row, 'dl_src'))
+        self.assertIsNone(self.columns.value(row, 'in_port'))
+        self.assertEqual((2,), self.columns.output_ports(row))
+
+    def test_free(self):
+        """Free rows are reused and shared side values are kept."""
+        actions = [OutputAction(1)]
+        first = self.columns.store(Flow(in_port=1, actions=actions))
+        second = self.columns.store(Flow(in_port=2, actions=actions))
+        self.columns.free(first)
+        self.assertEqual(1, len(self.columns))
+        self.assertEqual(first, self.columns.store(Flow(in_port=3)))
+        self.assertEqual(2, self.columns.value(second, 'in_port'))
+        self.assertEqual(3, self.columns.value(first, 'in_port'))
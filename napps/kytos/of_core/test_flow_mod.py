@@ -0,0 +1,60 @@
+"""Test packing flow mods from templates."""
+import unittest
+
+from pyof.v0x01.common.header import Type
+from pyof.v0x01.controller2switch.flow_mod import FlowModCommand
+
+from napps.legacy.of_core.flow import Flow, OutputAction
+from napps.legacy.of_core.flow_mod import (new_flow_mod, new_flow_mods,
+                                           pack_flow_mods)
+
+
+def _flow(in_port):
+    """Return a flow matching ``in_port``."""
+    return Flow(priority=10, table_id=0, cookie=7, in_port=in_port,
+                dl_src='00:00:00:00:00:01', actions=[OutputAction(2)])
+
+
+class TestFlowMod(unittest.TestCase):
+    """Test flow mods copied from templates."""
+
+    def test_same_as_python_openflow(self):
+        """Only the xid and command differ from the template."""
+        for command in (FlowModCommand.OFPFC_ADD,
+                        FlowModCommand.OFPFC_DELETE):
+            flow_mod = _flow(1).as_flow_mod(command)
+            flow_mod.header.xid = 5
+            self.assertEqual(flow_mod.pack(),
+                             new_flow_mod(_flow(1), command, 5).pack())
+
+    def test_pack_flow_mods(self):
+        """Flow mods are packed one after the other, with their xids."""
+        flows = [_flow(1), _flow(2)]
+        packed = pack_flow_mods(flows, FlowModCommand.OFPFC_DELETE, (3, 4))
+        size = len(packed) // 2
+        for index, flow in enumerate(flows):
+            message = new_flow_mod(flow, FlowModCommand.OFPFC_DELETE,
+                                   index + 3)
+            self.assertEqual(message.pack(),
+                             packed[index * size:(index + 1) * size])
+            self.assertEqual(FlowModCommand.OFPFC_DELETE, message.command)
+
+    def test_new_flow_mods(self):
+        """A buffer of flow mods is a single message with many messages."""
+        flows = [_flow(1), _flow(2), _flow(3)]
+        messages = new_flow_mods(flows, xids=(3, 4, 5))
+        self.assertEqual(3, messages.count)
+        self.assertEqual(3, messages.header.xid)
+        self.assertEqual(pack_flow_mods(flows, xids=(3, 4, 5)),
+                         messages.pack())
+        self.assertEqual([flow.in_port for flow in flows],
+                         [message.match.in_port for message in messages])
+
+    def test_barrier(self):
+        """Flow mods can be followed by a barrier request."""
+        messages = new_flow_mods([_flow(1)], xids=(3,), barrier_xid=4)
+        self.assertEqual(2, messages.count)
+        barrier = list(messages)[1]
+        self.assertEqual(Type.OFPT_BARRIER_REQUEST,
+                         barrier.header.message_type)
+        self.assertEqual(4, barrier.header.xid)
@@ -0,0 +1,170 @@
+"""Test updating flow tables from flow stats."""
+import json
+import unittest
+from unittest.mock import patch
+
+from pyof.v0x01.common.action import ActionOutput
+from pyof.v0x01.common.flow_match import Match
+from pyof.v0x01.controller2switch.common import FlowStats
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.flow_table import FlowTable
+
+
+def _as_json(flows):
+    """Return the flows by id as in :meth:`FlowTable.iter_json`."""
+    flows_by_id = {}
+    for flow in flows:
+        flow_dict = flow.as_dict()['flow']
+        flows_by_id[flow_dict.pop('self.id')] = flow_dict
+    return flows_by_id
+
+
+def _flow_stats(in_port, out_port=1, packet_count=0):
+    """Return FlowStats matching ``in_port``, as unpacked from a reply."""
+    flow_stats = FlowStats(length=0, table_id=0, match=Match(in_port=in_port),
+                           duration_sec=0, duration_nsec=0, priority=10,
+                           idle_timeout=0, hard_timeout=0, cookie=0,
+                           packet_count=packet_count, byte_count=0,
+                           actions=[ActionOutput(port=out_port)])
+    flow_stats.length = flow_stats.get_size()
+    unpacked = FlowStats()
+    unpacked.unpack(flow_stats.pack())
+    return unpacked
+
+
+def _header(in_port):
+    """Return the header of a packet matching the flow of ``in_port``."""
+    return {'in_port': in_port, 'dl_vlan': 0, 'dl_vlan_pcp': 0,
+            'dl_type': 0, 'nw_proto': 0, 'tp_src': 0, 'tp_dst': 0}
+
+
+class TestFlowTable(unittest.TestCase):
+    """Test flow table reconciliation."""
+
+    def setUp(self):
+        """Create a table with flows for in ports 1 and 2."""
+        self.table = FlowTable()
+        self.changes = self.table.update([_flow_stats(1), _flow_stats(2)])
+
+    def test_added(self):
+        """All flows of the first update are new."""
+        self.assertEqual([1, 2], [flow.in_port for flow in self.table])
+        self.assertEqual(list(self.table), self.changes.added)
+        self.assertEqual([], self.changes.removed)
+
+    def test_unchanged(self):
+        """Unchanged flows are kept and only their counters are updated."""
+        flows = list(self.table)
+        changes = self.table.update([_flow_stats(1, packet_count=5),
+                                     _flow_stats(2)])
+        self.assertFalse(changes)
+        self.assertEqual(flows, list(self.table))
+        self.assertEqual(5, list(self.table)[0].packet_count)
+
+    def test_changes(self):
+        """Removed, modified and new flows are reported."""
+        old_flows = list(self.table)
+        changes = self.table.update([_flow_stats(2, out_port=3),
+                                     _flow_stats(4)])
+        self.assertEqual([old_flows[0]], changes.removed)
+        self.assertEqual([4], [flow.in_port for flow in changes.added])
+        (previous, current), = changes.modified
+        self.assertEqual(old_flows[1], previous)
+        self.assertEqual(3, current.actions[0].output_port)
+        self.assertEqual([current, changes.added[0]], list(self.table))
+
+    def test_fragments(self):
+        """The table is replaced only when the update is finished."""
+        flows = list(self.table)
+        update = self.table.start_update()
+        update.add([_flow_stats(2)])
+        self.assertEqual(flows, list(self.table))
+        update.add([_flow_stats(3)])
+        changes = update.finish()
+        self.assertEqual([flows[0]], changes.removed)
+        self.assertEqual([2, 3], [flow.in_port for flow in self.table])
+
+    def test_overlapping_updates(self):
+        """Updates started before another one changed the table are dropped."""
+        self.assertEqual([], self.table.query(in_port=3))
+        first, second = self.table.start_update(), self.table.start_update()
+        for update in first, second:
+            update.add([_flow_stats(1), _flow_stats(3)])
+        changes = first.finish()
+        self.assertEqual([3], [flow.in_port for flow in changes.added])
+        self.assertEqual([2], [flow.in_port for flow in changes.removed])
+        self.assertFalse(second.finish())
+        self.assertEqual([1, 3], [flow.in_port for flow in self.table])
+        self.assertEqual(1, len(self.table.query(in_port=3)))
+        self.assertEqual(2, len(self.table.query(priority=10)))
+
+    def test_overlapping_unchanged(self):
+        """Updates that do not change the table do not drop others."""
+        first, second = self.table.start_update(), self.table.start_update()
+        first.add([_flow_stats(1), _flow_stats(2)])
+        self.assertFalse(first.finish())
+        second.add([_flow_stats(1, packet_count=5)])
+        changes = second.finish()
+        self.assertEqual([2], [flow.in_port for flow in changes.removed])
+        self.assertEqual(5, list(self.table)[0].packet_count)
+
+    def test_query(self):
+        """Flows are found by indexed and other fields."""
+        flow = list(self.table)[1]
+        self.assertEqual(flow, self.table.get(flow.id))
+        self.assertIsNone(self.table.get('unknown'))
+        self.assertEqual([flow], self.table.query(in_port=2, out_port=1))
+        self.assertEqual([], self.table.query(in_port=2, out_port=3))
+        self.assertEqual(2, len(self.table.query(priority=10, table_id=0)))
+        self.assertEqual([flow], self.table.query(in_port=2, table_id=0))
+
+    def test_query_after_changes(self):
+        """Indexes built by queries are updated with the table."""
+        self.assertEqual(2, len(self.table.query(out_port=1)))
+        self.assertEqual(1, len(self.table.query(in_port=1)))
+        changes = self.table.update([_flow_stats(2, out_port=3),
+                                     _flow_stats(4)])
+        self.assertEqual(changes.added, self.table.query(out_port=1))
+        (_, current), = changes.modified
+        self.assertEqual([current], self.table.query(out_port=3))
+        self.assertEqual([], self.table.query(in_port=1))
+
+    def test_sum_by_output_port(self):
+        """Counters are added by output port."""
+        self.table.update([_flow_stats(1, packet_count=5),
+                           _flow_stats(2, out_port=3, packet_count=7),
+                           _flow_stats(4, packet_count=1)])
+        self.assertEqual({1: 6, 3: 7},
+                         self.table.sum_by_output_port('packet_count'))
+
+    def test_classify(self):
+        """The classifier is updated with the table."""
+        self.assertEqual(2, self.table.classify(_header(2)).in_port)
+        self.table.update([_flow_stats(1), _flow_stats(3)])
+        self.assertIsNone(self.table.classify(_header(2)))
+        self.assertEqual(3, self.table.classify(_header(3)).in_port)
+
+    def test_iter_json(self):
+        """Cached JSON of flows has the current counters and contents."""
+        def loads(**filters):
+            return json.loads('{%s}' % ', '.join(
+                self.table.iter_json(**filters)))
+
+        self.assertEqual(_as_json(self.table), loads())
+        self.table.update([_flow_stats(1, packet_count=5),
+                           _flow_stats(2, out_port=3), _flow_stats(4)])
+        self.assertEqual(_as_json(self.table), loads())
+        self.assertEqual(5, loads(in_port=1)[list(self.table)[0].id][
+            'packet_count'])
+        self.assertEqual(_as_json(self.table.query(out_port=1)),
+                         loads(out_port=1))
+
+    @patch.object(settings, 'JSON_CHUNK_SIZE', 1)
+    def test_iter_json_during_update(self):
+        """Flows no longer matching after an update are skipped."""
+        chunks = self.table.iter_json(out_port=1)
+        first = json.loads('{%s}' % next(chunks))
+        self.assertEqual(_as_json(list(self.table)[:1]), first)
+        self.table.update([_flow_stats(2, out_port=3)])
+        self.assertEqual([], list(chunks))
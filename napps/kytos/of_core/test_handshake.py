@@ -0,0 +1,62 @@
+"""Test the handshake state machine."""
+import unittest
+from unittest.mock import Mock
+
+from napps.legacy.of_core import handshake
+
+
+def _connection():
+    """Return a connection in the initial state."""
+    connection = Mock(spec=['protocol'])
+    connection.protocol = Mock(spec=[])
+    handshake.start(connection)
+    return connection
+
+
+class TestHandshake(unittest.TestCase):
+    """Test packet actions and state transitions."""
+
+    def test_actions(self):
+        """Only the features reply is emitted during the handshake."""
+        connection = _connection()
+        hello = b'\x04\x00\x00\x08\x00\x00\x00\x01'
+        features_reply = b'\x04\x06\x00\x20\x00\x00\x00\x02'
+        echo_request = b'\x04\x02\x00\x08\x00\x00\x00\x03'
+        self.assertEqual(handshake.NEGOTIATE,
+                         handshake.get_action(connection, hello))
+        handshake.transition(connection, (handshake.NEW,),
+                             handshake.SENDING_FEATURES)
+        self.assertEqual(handshake.EMIT,
+                         handshake.get_action(connection, features_reply))
+        self.assertEqual(handshake.IN_ORDER,
+                         handshake.get_action(connection, echo_request))
+        handshake.transition(connection, (handshake.SENDING_FEATURES,),
+                             handshake.HANDSHAKE_COMPLETE)
+        self.assertEqual(handshake.IN_ORDER,
+                         handshake.get_action(connection, features_reply))
+
+    def test_transition(self):
+        """The state changes only from the expected states."""
+        connection = _connection()
+        self.assertFalse(handshake.transition(
+            connection, (handshake.SENDING_FEATURES,),
+            handshake.WAITING_FEATURES_REPLY))
+        self.assertEqual('new', handshake.get_state_name(connection))
+        timer = handshake.TIMERS[handshake.NEW, handshake.SENDING_FEATURES]
+        count = timer.count
+        self.assertTrue(handshake.transition(
+            connection, (handshake.NEW,), handshake.SENDING_FEATURES))
+        self.assertEqual(count + 1, timer.count)
+
+    def test_invalid_transition(self):
+        """Transitions not in TRANSITIONS are rejected."""
+        connection = _connection()
+        with self.assertRaises(ValueError):
+            handshake.transition(connection, (handshake.NEW,),
+                                 handshake.HANDSHAKE_COMPLETE)
+
+    def test_as_dict(self):
+        """Connections are counted by state name."""
+        stats = handshake.as_dict([_connection(), _connection()])
+        self.assertEqual(2, stats['states']['new'])
+        self.assertIn('new->sending_features', stats['transitions'])
@@ -0,0 +1,120 @@
+"""Test reassembly of multipart replies."""
+import struct
+import unittest
+from unittest.mock import Mock
+
+from napps.legacy.of_core.multipart import (REPLY_MORE, Reassembly,
+                                            number_fragment)
+from napps.legacy.of_core.utils import LazyMessage
+
+
+def _reply(xid, body, more=False):
+    """Return xid, flags and body of a reply fragment."""
+    return xid, REPLY_MORE if more else 0, body
+
+
+def _stats_reply(xid, more=False):
+    """Return an OpenFlow 1.0 flow stats reply fragment without flows."""
+    return LazyMessage(struct.pack('!BBHIHH', 1, 17, 12, xid, 1,
+                                   REPLY_MORE if more else 0))
+
+
+class ListBuilder:
+    """Join fragment bodies in a list."""
+
+    def __init__(self):
+        """Start with no items."""
+        self.items = []
+
+    def add(self, body):
+        """Add the items in ``body``, raising ValueError if it is None."""
+        if body is None:
+            raise ValueError('corrupt fragment')
+        self.items.extend(body)
+
+    def finish(self):
+        """Return all items."""
+        return self.items
+
+
+class TestReassembly(unittest.TestCase):
+    """Test adding reply fragments to builders."""
+
+    def setUp(self):
+        """Create a reassembly of at most 2 replies."""
+        self.reassembly = Reassembly(max_pending=2)
+
+    def test_single(self):
+        """A reply without more fragments is finished at once."""
+        result = self.reassembly.add(*_reply(1, [1, 2]), ListBuilder)
+        self.assertEqual([1, 2], result)
+        self.assertEqual(0, len(self.reassembly))
+
+    def test_interleaved(self):
+        """Fragments are added to the reply with the same xid."""
+        add = self.reassembly.add
+        self.assertIsNone(add(*_reply(1, [1], more=True), ListBuilder))
+        self.assertIsNone(add(*_reply(2, [10], more=True), ListBuilder))
+        self.assertIsNone(add(*_reply(1, [2], more=True), ListBuilder))
+        self.assertEqual([10, 11], add(*_reply(2, [11]), ListBuilder))
+        self.assertEqual([1, 2, 3], add(*_reply(1, [3]), ListBuilder))
+
+    def test_max_pending(self):
+        """The oldest incomplete reply is discarded."""
+        for xid in range(3):
+            self.reassembly.add(*_reply(xid, [xid], more=True), ListBuilder)
+        self.assertEqual(2, len(self.reassembly))
+        result = self.reassembly.add(*_reply(0, [0]), ListBuilder)
+        self.assertEqual([0], result)
+
+    def test_out_of_order(self):
+        """Fragments are added in the order of their index."""
+        add = self.reassembly.add
+        self.assertIsNone(add(*_reply(1, [3]), ListBuilder, 2))
+        self.assertIsNone(add(*_reply(1, [2], more=True), ListBuilder, 1))
+        self.assertEqual(1, len(self.reassembly))
+        self.assertEqual([1, 2, 3],
+                         add(*_reply(1, [1], more=True), ListBuilder, 0))
+        self.assertEqual(0, len(self.reassembly))
+
+    def test_corrupt_fragment(self):
+        """Replies are discarded when a fragment fails to be built."""
+        add = self.reassembly.add
+        self.assertIsNone(add(*_reply(1, [1], more=True), ListBuilder, 0))
+        self.assertIsNone(add(*_reply(1, [3]), ListBuilder, 2))
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(add(*_reply(1, None, more=True), ListBuilder,
+                                  1))
+        self.assertEqual(0, len(self.reassembly))
+        self.assertEqual([4], add(*_reply(1, [4]), ListBuilder))
+
+    def test_late_fragment(self):
+        """Fragments after a corrupt one are ignored."""
+        add = self.reassembly.add
+        with self.assertLogs(level='WARNING'):
+            add(*_reply(1, None, more=True), ListBuilder, 0)
+        self.assertIsNone(add(*_reply(1, [2]), ListBuilder, 1))
+        self.assertEqual(0, len(self.reassembly))
+
+    def test_max_early(self):
+        """Replies with too many fragments out of order are discarded."""
+        reassembly = Reassembly(max_early=2)
+        for index in 1, 2, 3:
+            reassembly.add(*_reply(1, [index], more=True), ListBuilder,
+                           index)
+        self.assertIsNone(reassembly.add(*_reply(1, [4]), ListBuilder, 4))
+        self.assertIsNone(reassembly.add(*_reply(1, [0], more=True),
+                                         ListBuilder, 0))
+        self.assertEqual(0, len(reassembly))
+
+    def test_number_fragment(self):
+        """Fragments are numbered by xid in the order they were read."""
+        connection = Mock(spec=[])
+        messages = [_stats_reply(1, more=True), _stats_reply(2, more=True),
+                    _stats_reply(1, more=True), _stats_reply(1),
+                    _stats_reply(2), _stats_reply(1)]
+        for message in messages:
+            number_fragment(connection, message)
+        self.assertEqual([0, 0, 1, 2, 1, 0],
+                         [message.fragment for message in messages])
+        self.assertFalse(messages[0].is_unpacked())
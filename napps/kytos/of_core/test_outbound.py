@@ -0,0 +1,148 @@
+"""Test the outbound scheduler lanes and flow mod rate limits."""
+import unittest
+from threading import Event
+from time import monotonic
+from unittest.mock import Mock, patch
+
+from kytos.core import KytosEvent
+
+from napps.legacy.of_core import settings
+from napps.legacy.of_core.flow import Flow
+from napps.legacy.of_core.flow_mod import new_flow_mod, new_flow_mods
+from napps.legacy.of_core.outbound import (CONTROL, FLOW_MOD, PACKET_OUT,
+                                           OutboundScheduler)
+
+
+def _connection(dpid):
+    """Return an alive connection mock of a switch."""
+    connection = Mock()
+    connection.switch.dpid = dpid
+    connection.is_alive.return_value = True
+    return connection
+
+
+def _event(connection, name='packet_out', message=None):
+    """Return a message event to ``connection``."""
+    return KytosEvent(name='test.messages.out.ofpt_' + name,
+                      content={'destination': connection,
+                               'message': message or Mock()})
+
+
+def _flow_mods(count):
+    """Return a buffer of ``count`` flow mods."""
+    return new_flow_mods([Flow(in_port=port) for port in range(count)])
+
+
+@patch.object(settings, 'OUTBOUND_FLOW_MOD_RATE', 10)
+@patch.object(settings, 'OUTBOUND_FLOW_MOD_BURST', 5)
+@patch.object(settings, 'OUTBOUND_FLOW_MOD_QUANTUM', 3)
+class TestOutboundScheduler(unittest.TestCase):
+    """Test the order of the events sent."""
+
+    def setUp(self):
+        """Create a scheduler without starting its thread."""
+        self.controller = Mock()
+        self.outbound = OutboundScheduler()
+        # pylint: disable=protected-access
+        self.outbound._running = True
+        self.now = None
+
+    def _send_all(self, seconds=0):
+        """Return the events allowed ``seconds`` from now, in order."""
+        if self.now is None:
+            self.now = monotonic()
+        events = []
+        while True:
+            # pylint: disable=protected-access
+            event, _ = self.outbound._next(self.now + seconds)
+            if event is None:
+                return events
+            events.append(event)
+
+    def test_control(self):
+        """Control messages are not queued."""
+        event = _event(_connection('a'))
+        self.outbound.send(self.controller, event, CONTROL)
+        self.controller.buffers.msg_out.put.assert_called_once_with(event)
+
+    def test_lanes(self):
+        """Packet outs go before flow mods, in round robin over switches."""
+        switch_a, switch_b = _connection('a'), _connection('b')
+        flow_mod = _event(switch_a, 'flow_mod')
+        self.outbound.send(self.controller, flow_mod, FLOW_MOD)
+        packet_outs = [_event(switch_a), _event(switch_a), _event(switch_b)]
+        for event in packet_outs:
+            self.outbound.send(self.controller, event, PACKET_OUT)
+        self.assertEqual(
+            [packet_outs[0], packet_outs[2], packet_outs[1], flow_mod],
+            self._send_all())
+
+    def test_rate(self):
+        """Flow mod buffers are split by the tokens of each switch."""
+        switch_a, switch_b = _connection('a'), _connection('b')
+        flow_mods = _flow_mods(10)
+        self.outbound.send(self.controller,
+                           _event(switch_a, 'flow_mod', flow_mods), FLOW_MOD)
+        self.outbound.send(self.controller,
+                           _event(switch_b, 'flow_mod', _flow_mods(2)),
+                           FLOW_MOD)
+        events = self._send_all()
+        self.assertEqual([(switch_a, 3), (switch_b, 2), (switch_a, 2)],
+                         [(event.destination, event.content['message'].count)
+                          for event in events])
+        self.assertEqual([], self._send_all(0.05))
+        events += self._send_all(0.5)
+        self.assertEqual([3, 2, 2, 3, 2], [event.content['message'].count
+                                           for event in events])
+        self.assertEqual(flow_mods.pack(), b''.join(
+            event.content['message'].pack() for event in events
+            if event.destination is switch_a))
+
+    def test_lazy_flow_mod(self):
+        """Single flow mods are queued without being unpacked."""
+        switch = _connection('a')
+        flow_mod = new_flow_mod(Flow(in_port=1))
+        event = _event(switch, 'flow_mod', flow_mod)
+        self.outbound.send(self.controller, event, FLOW_MOD)
+        self.assertEqual([event], self._send_all())
+        self.assertFalse(flow_mod.is_unpacked())
+
+    @patch.object(settings, 'OUTBOUND_FLOW_MOD_RATES', {'a': (0, 5)})
+    def test_invalid_rate(self):
+        """Invalid rates of a switch are replaced by the default."""
+        switch = _connection('a')
+        self.outbound.send(self.controller,
+                           _event(switch, 'flow_mod', _flow_mods(8)),
+                           FLOW_MOD)
+        self.assertEqual([3, 2], [event.content['message'].count
+                                  for event in self._send_all()])
+        self.assertEqual(10, self.outbound.as_dict()['a']['rate'])
+
+    def test_closed_connection(self):
+        """Events to closed connections are dropped."""
+        connection = _connection('a')
+        self.outbound.send(self.controller, _event(connection), PACKET_OUT)
+        connection.is_alive.return_value = False
+        self.assertEqual([], self._send_all())
+        self.assertEqual({}, self.outbound.as_dict())
+
+    @patch.object(settings, 'OUTBOUND_BACKLOG', 1)
+    @patch('napps.legacy.of_core.outbound.BACKLOG_WAIT', 60)
+    def test_backlog(self):
+        """Events wait for msg_out to be written, without polling it."""
+        msg_out = self.controller.buffers.msg_out
+        msg_out.qsize.return_value = 1
+        put = Event()
+        msg_out.put.side_effect = lambda event: put.set()
+        scheduler = OutboundScheduler()
+        scheduler.start(self.controller)
+        try:
+            scheduler.send(self.controller, _event(_connection('a')),
+                           PACKET_OUT)
+            self.assertFalse(put.wait(0.05))
+            self.assertEqual(1, msg_out.qsize.call_count)
+            msg_out.qsize.return_value = 0
+            scheduler.written()
+            self.assertTrue(put.wait(5))
+        finally:
+            scheduler.stop()
@@ -0,0 +1,87 @@
+"""Test the timer wheel of periodic per-switch tasks."""
+import unittest
+from collections import Counter
+from unittest.mock import Mock
+
+from napps.legacy.of_core.scheduler import Scheduler
+
+
+def _switch(dpid):
+    """Return a connected switch mock."""
+    switch = Mock(dpid=dpid)
+    switch.is_connected.return_value = True
+    switch.connection.is_alive.return_value = True
+    return switch
+
+
+class TestScheduler(unittest.TestCase):
+    """Test running tasks for each switch."""
+
+    def setUp(self):
+        """Create a wheel of 1-second ticks with 8 slots and no jitter."""
+        self.scheduler = Scheduler(tick=1, slots=8, jitter=0)
+        self.runs = []
+
+    def _advance(self, seconds):
+        """Advance the wheel a tick at a time, returning the runs."""
+        self.runs = []
+        for _ in range(seconds):
+            self.now += 1
+            self.scheduler.run_pending(self.now)
+        return self.runs
+
+    def _start(self, interval, switches, callback=None):
+        """Register a task recording the runs of ``switches``."""
+        self.now = 0
+        self.scheduler.run_pending(self.now)
+        self.scheduler.register('test', interval,
+                                callback or self.runs_append)
+        for switch in switches:
+            self.scheduler.add_switch(switch)
+
+    def runs_append(self, switch):
+        """Record a run for ``switch``."""
+        self.runs.append((self.now, switch.dpid))
+
+    def test_spread(self):
+        """Switches run once per interval at different times."""
+        switches = [_switch(str(dpid)) for dpid in range(100)]
+        self._start(20, switches)
+        runs = self._advance(20)
+        self.assertEqual(100, len(runs))
+        self.assertEqual(100, len(set(dpid for _, dpid in runs)))
+        self.assertLess(max(Counter(now for now, _ in runs).values()), 20)
+        self.assertEqual(100, len(self._advance(20)))
+
+    def test_callback_delay(self):
+        """The delay returned by the callback replaces the interval."""
+        callback = Mock(return_value=3)
+        self._start(1, [_switch('a')], callback)
+        self._advance(1)
+        self.assertEqual(1, callback.call_count)
+        self._advance(2)
+        self.assertEqual(1, callback.call_count)
+        self._advance(1)
+        self.assertEqual(2, callback.call_count)
+
+    def test_disconnected(self):
+        """Timers of dead connections are removed."""
+        switch = _switch('a')
+        self._start(2, [switch])
+        switch.connection.is_alive.return_value = False
+        self.assertEqual([], self._advance(2))
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_reconnected(self):
+        """Adding a switch again replaces its timers."""
+        switch = _switch('a')
+        self._start(2, [switch, switch])
+        self.assertEqual(1, len(self._advance(2)))
+        self.assertEqual(1, len(self.scheduler))
+
+    def test_unregister(self):
+        """Unregistered tasks do not run anymore."""
+        self._start(2, [_switch('a')])
+        self.scheduler.unregister('test')
+        self.assertEqual([], self._advance(10))
+        self.assertEqual(0, len(self.scheduler))
@@ -0,0 +1,82 @@
+"""Test the simulated switches."""
+import asyncio
+import struct
+import unittest
+
+from napps.legacy.of_core import simulator
+from napps.legacy.of_core.v0x04.flow_stats import iter_flow_stats
+
+
+class TestMessages(unittest.TestCase):
+    """Test the messages of simulated switches."""
+
+    def test_negotiate(self):
+        """Bitmaps are used if present, otherwise the header version."""
+        self.assertEqual(0x04, simulator.negotiate(
+            [0x01, 0x04], simulator.hello([0x01, 0x04])))
+        self.assertEqual(0x01, simulator.negotiate(
+            [0x01], simulator.hello([0x01, 0x04])))
+        self.assertEqual(0x01, simulator.negotiate(
+            [0x01, 0x04], simulator.message(0x01, simulator.OFPT_HELLO, 0)))
+        self.assertIsNone(simulator.negotiate(
+            [0x04], simulator.message(0x01, simulator.OFPT_HELLO, 0)))
+
+    def test_flow_fragments(self):
+        """Large flow tables are split in fragments decoded by of_core."""
+        bodies = simulator.FlowTables().get(0x04, 2000)
+        self.assertGreater(len(bodies), 1)
+        flows = 0
+        for index, body in enumerate(bodies):
+            flags = struct.unpack_from('!H', body, 2)[0]
+            self.assertEqual(index < len(bodies) - 1,
+                             bool(flags & simulator.REPLY_MORE))
+            flows += len(list(iter_flow_stats(body[8:])))
+        self.assertEqual(2000, flows)
+
+
+class TestSwitch(unittest.TestCase):
+    """Test a switch connected to a controller on loopback."""
+
+    def setUp(self):
+        """Start an event loop."""
+        self.loop = asyncio.new_event_loop()
+        self.received = []
+
+    def tearDown(self):
+        """Close the event loop."""
+        self.loop.close()
+
+    async def _controller(self, reader, writer):
+        """Send requests and a packet out for the first packet in."""
+        for message_type, body in ((simulator.OFPT_HELLO, struct.pack(
+                '!HHI', simulator.OFPHET_VERSIONBITMAP, 8, 0x12)),
+                                   (simulator.OFPT_FEATURES_REQUEST, b''),
+                                   (18, struct.pack('!HH4x', 1, 0))):
+            writer.write(simulator.message(0x04, message_type, 1, body))
+        while True:
+            header = await reader.readexactly(8)
+            packet = header + await reader.readexactly(
+                struct.unpack('!H', header[2:4])[0] - 8)
+            self.received.append(packet[1])
+            if packet[1] == simulator.OFPT_PACKET_IN:
+                writer.write(simulator.message(
+                    0x04, simulator.OFPT_PACKET_OUT, 2, packet[8:12] +
+                    bytes(8)))
+                break
+
+    def test_run(self):
+        """The switch replies to the requests and measures latency."""
+        server = self.loop.run_until_complete(asyncio.start_server(
+            self._controller, '127.0.0.1', 0))
+        port = server.sockets[0].getsockname()[1]
+        fleet = simulator.Fleet(1, [[0x01, 0x04]], flows=10,
+                                packet_in_rate=50)
+        result = self.loop.run_until_complete(
+            fleet.run('127.0.0.1', port, 0, 0.5))
+        server.close()
+        self.loop.run_until_complete(server.wait_closed())
+        self.assertEqual([simulator.OFPT_HELLO, simulator.OFPT_FEATURES_REPLY,
+                          19], self.received[:3])
+        self.assertEqual(1, result['handshakes'])
+        self.assertEqual(1, result['stats_replies'])
+        self.assertEqual(1, result['packet_in_latency_seconds']['samples'])
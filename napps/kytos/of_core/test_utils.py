@@ -0,0 +1,155 @@
+"""Test of_core utilities."""
+import unittest
+from unittest.mock import Mock
+
+from pyof.foundation.exceptions import UnpackException
+from pyof.v0x01.common.header import Type
+from pyof.v0x04.symmetric.echo_request import EchoRequest
+
+from napps.legacy.of_core.utils import (DeferredMessages, LazyMessage,
+                                        MessageTemplate, ReceiveBuffer,
+                                        SizeHistogram, listen_in_order,
+                                        of_slicer)
+
+
+def _packet(payload=b'', xid=0):
+    """Return an OpenFlow v0x01 echo request with ``payload``."""
+    length = 8 + len(payload)
+    return b'\x01\x02' + length.to_bytes(2, 'big') + \
+        xid.to_bytes(4, 'big') + payload
+
+
+class TestReceiveBuffer(unittest.TestCase):
+    """Test slicing raw data into OpenFlow packets."""
+
+    def test_chunked_data(self):
+        """Packets split across many reads are sliced only when complete."""
+        packets = [_packet(b'a' * size, xid) for xid, size in
+                   enumerate((0, 3, 100, 7))]
+        data = b''.join(packets)
+        buffer = ReceiveBuffer()
+        sliced = []
+        for i in range(0, len(data), 5):
+            buffer.feed(data[i:i + 5])
+            sliced.extend(bytes(pkt) for pkt in buffer.slice_packets())
+        self.assertEqual(packets, sliced)
+        self.assertEqual(0, len(buffer))
+
+    def test_compaction_keeps_views(self):
+        """Views handed out remain valid when the buffer grows."""
+        buffer = ReceiveBuffer()
+        buffer.COMPACT_THRESHOLD = 8
+        buffer.feed(_packet(b'x', 1) + _packet()[:4])
+        first = buffer.slice_packets()
+        buffer.feed(_packet()[4:] + _packet(b'y', 2))
+        second = buffer.slice_packets()
+        self.assertEqual([_packet(b'x', 1)], [bytes(p) for p in first])
+        self.assertEqual([_packet(), _packet(b'y', 2)],
+                         [bytes(p) for p in second])
+
+    def test_invalid_length(self):
+        """A length smaller than the header can not be sliced."""
+        buffer = ReceiveBuffer(b'\x01\x02\x00\x00\x00\x00\x00\x00')
+        self.assertRaises(UnpackException, buffer.slice_packets)
+
+    def test_of_slicer(self):
+        """Return packets and remaining data as bytes."""
+        packets, remaining = of_slicer(_packet(b'a') + b'\x01\x02')
+        self.assertEqual([_packet(b'a')], packets)
+        self.assertEqual(b'\x01\x02', remaining)
+
+    def test_listen_in_order(self):
+        """Listeners in order are registered without a thread wrapper."""
+        def handler(event):
+            """Return the event."""
+            return event
+        decorated = listen_in_order('a', 'b')(handler)
+        self.assertIs(handler, decorated)
+        self.assertEqual(['a', 'b'], decorated.events)
+
+
+class TestDeferredMessages(unittest.TestCase):
+    """Test messages kept during the handshake."""
+
+    def setUp(self):
+        """Create a connection mock."""
+        self.connection = Mock()
+        self.replayed = []
+
+    def _defer(self, overflow, messages):
+        """Defer ``messages`` in a queue of 2 and replay them."""
+        deferred = DeferredMessages(2, overflow)
+        for message in messages:
+            self.assertTrue(deferred.defer(self.connection, message))
+        deferred.replay(self.replayed.extend)
+        return deferred
+
+    def test_replay(self):
+        """Messages are replayed in order and not deferred afterwards."""
+        deferred = self._defer('drop_oldest', [1, 2])
+        self.assertEqual([1, 2], self.replayed)
+        self.assertFalse(deferred.defer(self.connection, 3))
+        self.assertEqual(0, len(deferred))
+
+    def test_overflow(self):
+        """Each policy keeps the right messages."""
+        deferred = self._defer('drop_oldest', [1, 2, 3])
+        self.assertEqual(([2, 3], 1), (self.replayed, deferred.dropped))
+        self.replayed = []
+        self._defer('drop_newest', [1, 2, 3])
+        self.assertEqual([1, 2], self.replayed)
+        self.connection.close.assert_not_called()
+        self._defer('disconnect', [1, 2, 3])
+        self.connection.close.assert_called_once_with()
+
+
+class TestLazyMessage(unittest.TestCase):
+    """Test header-only decoding of messages."""
+
+    def test_header(self):
+        """Only the header is decoded on creation."""
+        message = LazyMessage(_packet(b'data', xid=42))
+        self.assertEqual(1, message.header.version)
+        self.assertEqual(Type.OFPT_ECHO_REQUEST, message.header.message_type)
+        self.assertEqual(12, message.header.length)
+        self.assertEqual(42, message.header.xid)
+        self.assertFalse(message.is_unpacked())
+        self.assertEqual(_packet(b'data', xid=42), message.pack())
+
+    def test_body(self):
+        """Body attributes are unpacked on first access."""
+        packet = EchoRequest(xid=7, data=b'kytos').pack()
+        message = LazyMessage(packet)
+        self.assertEqual(b'kytos', message.data.value)
+        self.assertTrue(message.is_unpacked())
+        self.assertEqual(packet, message.pack())
+
+    def test_invalid_header(self):
+        """Unknown versions and wrong lengths are rejected upfront."""
+        unknown_version = b'\x09' + _packet()[1:]
+        self.assertRaises(UnpackException, LazyMessage, unknown_version)
+        self.assertRaises(UnpackException, LazyMessage, _packet() + b'\x00')
+
+
+class TestMessageTemplate(unittest.TestCase):
+    """Test pre-packed constant messages."""
+
+    def test_new_message(self):
+        """Only the xid differs from the template message."""
+        template = MessageTemplate(EchoRequest(xid=1, data=b'kytos'))
+        message = template.new_message(xid=2)
+        self.assertEqual(2, message.header.xid)
+        self.assertEqual(EchoRequest(xid=2, data=b'kytos').pack(),
+                         message.pack())
+
+
+class TestSizeHistogram(unittest.TestCase):
+    """Test the batch size distribution."""
+
+    def test_buckets(self):
+        """Sizes are counted in power of two buckets."""
+        histogram = SizeHistogram()
+        for size in (1, 2, 3, 4, 5, 100):
+            histogram.add(size)
+        self.assertEqual({'<=1': 1, '<=2': 1, '<=4': 2, '<=8': 1, '<=128': 1},
+                         histogram.as_dict())
@@ -0,0 +1,99 @@
+"""Test decoding of OpenFlow 1.0 flow stats."""
+import random
+import unittest
+
+from pyof.foundation.exceptions import UnpackException
+from pyof.v0x01.common.action import ActionOutput, ActionVlanVid
+from pyof.v0x01.common.flow_match import Match
+from pyof.v0x01.controller2switch.common import FlowStats
+from pyof.v0x01.controller2switch.stats_reply import StatsReply
+
+from napps.legacy.of_core.flow import Flow
+from napps.legacy.of_core.flow_table import FlowTable
+from napps.legacy.of_core.v0x01.flow_stats import (FlowTableUpdateV0x01,
+                                                   iter_flow_stats)
+
+
+def _mac(rand):
+    """Return a random hardware address."""
+    return ':'.join('%02x' % rand.randrange(256) for _ in range(6))
+
+
+def _ipv4(rand):
+    """Return a random IPv4 address."""
+    return '.'.join(str(rand.randrange(256)) for _ in range(4))
+
+
+def _flow_stats(rand):
+    """Return FlowStats with random values."""
+    match = Match(in_port=rand.randrange(1, 0xff00), dl_src=_mac(rand),
+                  dl_dst=_mac(rand), dl_vlan=rand.randrange(4096),
+                  dl_vlan_pcp=rand.randrange(8), dl_type=0x0800,
+                  nw_tos=rand.randrange(64), nw_proto=rand.randrange(256),
+                  nw_src=_ipv4(rand), nw_dst=_ipv4(rand),
+                  tp_src=rand.randrange(65536), tp_dst=rand.randrange(65536))
+    actions = [ActionOutput(port=rand.randrange(1, 0xff00))
+               for _ in range(rand.randrange(3))]
+    if rand.random() < 0.5:
+        actions.insert(0, ActionVlanVid(vlan_id=rand.randrange(4096)))
+    flow_stats = FlowStats(length=0, table_id=rand.randrange(255),
+                           match=match, duration_sec=rand.randrange(2 ** 32),
+                           duration_nsec=0, priority=rand.randrange(65536),
+                           idle_timeout=rand.randrange(65536),
+                           hard_timeout=rand.randrange(65536),
+                           cookie=rand.randrange(2 ** 64),
+                           packet_count=rand.randrange(2 ** 64),
+                           byte_count=rand.randrange(2 ** 64),
+                           actions=actions)
+    flow_stats.length = flow_stats.get_size()
+    return flow_stats
+
+
+def _body(flows_stats):
+    """Return the packed body and the python-openflow unpacked flow stats."""
+    body = b''.join(flow_stats.pack() for flow_stats in flows_stats)
+    reply = StatsReply()
+    reply.unpack((b'\x01\x11' + (12 + len(body)).to_bytes(2, 'big') +
+                  bytes(4) + b'\x00\x01\x00\x00' + body)[8:])
+    return body, reply.body
+
+
+class TestFlowStats(unittest.TestCase):
+    """Test decoding flow stats against python-openflow."""
+
+    def setUp(self):
+        """Create random flow stats."""
+        self.body, self.unpacked = _body(
+            _flow_stats(random.Random(seed)) for seed in range(50))
+
+    def test_flows(self):
+        """Flows are the same as those built from python-openflow."""
+        flows = [entry.as_flow() for entry in iter_flow_stats(self.body)]
+        expected = [Flow.from_flow_stats(flow_stats)
+                    for flow_stats in self.unpacked]
+        self.assertEqual([flow.key for flow in expected],
+                         [flow.key for flow in flows])
+        self.assertEqual([flow.id for flow in expected],
+                         [flow.id for flow in flows])
+        self.assertEqual(
+            [(flow.packet_count, flow.byte_count, flow.duration_sec)
+             for flow in expected],
+            [(flow.packet_count, flow.byte_count, flow.duration_sec)
+             for flow in flows])
+
+    def test_flow_table(self):
+        """Tables updated from bytes and from python-openflow are equal."""
+        table, expected = FlowTable(), FlowTable()
+        update = FlowTableUpdateV0x01(table)
+        update.add(memoryview(self.body))
+        self.assertEqual(50, len(update.finish().added))
+        expected.update(self.unpacked)
+        self.assertEqual(list(expected), list(table))
+        update = FlowTableUpdateV0x01(table)
+        update.add(memoryview(self.body))
+        self.assertFalse(update.finish())
+
+    def test_invalid_length(self):
+        """Entries longer than the body are rejected."""
+        self.assertRaises(UnpackException, list,
+                          iter_flow_stats(self.body[:-1]))
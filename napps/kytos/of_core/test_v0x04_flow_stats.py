@@ -0,0 +1,89 @@
+"""Test decoding of OpenFlow 1.3 flow stats."""
+import unittest
+
+from pyof.foundation.exceptions import UnpackException
+from pyof.v0x04.common.action import ActionOutput
+from pyof.v0x04.common.flow_instructions import InstructionApplyAction
+from pyof.v0x04.common.flow_match import (Match, MatchType, OxmClass,
+                                          OxmOfbMatchField, OxmTLV)
+from pyof.v0x04.controller2switch.multipart_reply import FlowStats
+
+from napps.legacy.of_core.flow_table import FlowTable
+from napps.legacy.of_core.v0x04.flow_stats import (FLOW_STATS,
+                                                   FlowTableUpdateV0x04,
+                                                   iter_flow_stats, iter_oxm)
+
+
+def _oxm(field, value):
+    """Return an OpenFlow basic OXM TLV."""
+    return OxmTLV(oxm_class=OxmClass.OFPXMC_OPENFLOW_BASIC, oxm_field=field,
+                  oxm_hasmask=False, oxm_value=value)
+
+
+def _flow_stats(in_port, out_port=1, packet_count=0):
+    """Return a packed OpenFlow 1.3 flow stats entry."""
+    match = Match(match_type=MatchType.OFPMT_OXM, oxm_match_fields=[
+        _oxm(OxmOfbMatchField.OFPXMT_OFB_IN_PORT, in_port.to_bytes(4, 'big')),
+        _oxm(OxmOfbMatchField.OFPXMT_OFB_ETH_TYPE, b'\x08\x00'),
+        _oxm(OxmOfbMatchField.OFPXMT_OFB_IPV4_DST, b'\x0a\x00\x00\x01'),
+        _oxm(OxmOfbMatchField.OFPXMT_OFB_METADATA, b'\x00' * 7 + b'\x01')])
+    instructions = InstructionApplyAction(
+        actions=[ActionOutput(port=out_port, max_length=0)]).pack()
+    flow_stats = FlowStats(length=0, table_id=0, duration_sec=1,
+                           duration_nsec=0, priority=10, idle_timeout=0,
+                           hard_timeout=0, flags=0, cookie=7,
+                           packet_count=packet_count, byte_count=0,
+                           match=match)
+    flow_stats.length = flow_stats.get_size() + len(instructions)
+    return flow_stats.pack() + instructions
+
+
+class TestFlowStats(unittest.TestCase):
+    """Test decoding flow stats and building flows."""
+
+    def test_flow(self):
+        """Match fields and output actions are decoded."""
+        entry, = iter_flow_stats(_flow_stats(3, out_port=4, packet_count=9))
+        flow = entry.as_flow()
+        self.assertEqual((3, 0x0800, '10.0.0.1'),
+                         (flow.in_port, flow.dl_type, flow.nw_dst))
+        self.assertEqual({'metadata': '0000000000000001'}, flow.oxm_fields)
+        self.assertEqual([4], [action.output_port for action in flow.actions])
+        self.assertEqual((7, 10, 9), (flow.cookie, flow.priority,
+                                      flow.packet_count))
+
+    def test_invalid_length(self):
+        """Entries longer than the body are rejected."""
+        body = _flow_stats(1)[:-1]
+        self.assertRaises(UnpackException, list, iter_flow_stats(body))
+
+    def test_truncated(self):
+        """Entries shorter than their fixed fields are rejected."""
+        body = _flow_stats(1) + _flow_stats(2)[:FLOW_STATS.size]
+        self.assertRaises(UnpackException, list, iter_flow_stats(body))
+
+    def test_invalid_match_length(self):
+        """Matches shorter than their header are rejected."""
+        body = bytearray(_flow_stats(1))
+        body[FLOW_STATS.size + 2:FLOW_STATS.size + 4] = b'\x00\x02'
+        self.assertRaises(UnpackException, list, iter_flow_stats(body))
+
+    def test_invalid_oxm_length(self):
+        """OXM fields longer than the match are rejected."""
+        match = _oxm(OxmOfbMatchField.OFPXMT_OFB_IN_PORT, b'\x00' * 4).pack()
+        self.assertEqual(1, len(list(iter_oxm(match))))
+        self.assertRaises(UnpackException, list, iter_oxm(match[:-1]))
+
+    def test_flow_table(self):
+        """Flows are kept while their match and instructions are equal."""
+        table = FlowTable()
+        update = FlowTableUpdateV0x04(table)
+        update.add(_flow_stats(1) + _flow_stats(2))
+        self.assertEqual(2, len(update.finish().added))
+        flows = list(table)
+        update = FlowTableUpdateV0x04(table)
+        update.add(_flow_stats(1, packet_count=5) + _flow_stats(2, 3))
+        changes = update.finish()
+        self.assertEqual(flows[0], list(table)[0])
+        self.assertEqual(5, list(table)[0].packet_count)
+        self.assertEqual(1, len(changes.modified))
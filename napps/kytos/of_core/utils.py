@@ -1,28 +1,134 @@
 import struct
 
-import pyof.v0x01 as pyof_01
-import pyof.v0x04 as pyof_04
-
-from collections import OrderedDict
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+from importlib import import_module
+from random import getrandbits
+from threading import Lock
 
 from kytos.core import KytosEvent, log
 
 from pyof.foundation.exceptions import PackException, UnpackException
+from pyof.utils import PYOF_VERSION_LIBS, unpack
 from pyof.v0x01.common.header import Type as OFPTYPE
 
+# pyof.utils.unpack uses the utils module of each version without importing it
+for _pyof_lib in PYOF_VERSION_LIBS.values():
+    import_module(_pyof_lib.__name__ + '.common.utils')
+
+
 def of_slicer(remaining_data):
     """Slice a raw bytes into OpenFlow packets"""
-    data_len = len(remaining_data)
-    pkts = []
-    while data_len > 3:
-        length_field = struct.unpack('!H', remaining_data[2:4])[0]
-        if data_len >= length_field:
-            pkts.append(remaining_data[:length_field])
-            remaining_data = remaining_data[length_field:]
-            data_len = len(remaining_data)
-        else:
-            break
-    return pkts, remaining_data
+    buffer = ReceiveBuffer(remaining_data)
+    pkts = [bytes(packet) for packet in buffer.slice_packets()]
+    return pkts, bytes(buffer)
+
+
+class ReceiveBuffer():
+    """Growable per-connection buffer of raw OpenFlow bytes.
+
+    New data is appended at the end and whole packets are consumed from a read
+    cursor, so each received byte is copied into the buffer only once. Packets
+    are handed out as :class:`memoryview` slices and the already consumed
+    bytes are discarded (compacted) only when the buffer needs to grow.
+    """
+
+    #: OpenFlow header size, the minimum valid packet length
+    HEADER_SIZE = 8
+
+    #: Do not compact the buffer while less than this number of bytes was read
+    COMPACT_THRESHOLD = 2**16
+
+    def __init__(self, data=b''):
+        """Create a buffer holding ``data``.
+
+        Args:
+            data (bytes): initial unprocessed data.
+        """
+        self._data = bytearray(data)
+        self._start = 0
+        #: Held while data is fed and sliced into packets and the packets are
+        #: numbered and emitted, so they are handled in the order received
+        self.lock = Lock()
+
+    def __len__(self):
+        """Return the number of bytes not consumed yet."""
+        return len(self._data) - self._start
+
+    def __bytes__(self):
+        """Return a copy of the bytes not consumed yet."""
+        return bytes(self._data[self._start:])
+
+    def feed(self, data):
+        """Append newly received data to the end of the buffer.
+
+        Args:
+            data (bytes): data read from the connection socket.
+        """
+        if self._start == len(self._data):
+            # Everything was consumed, so start over without copying.
+            self._data = bytearray(data)
+            self._start = 0
+            return
+        if self._start >= self.COMPACT_THRESHOLD and \
+                self._start * 2 >= len(self._data):
+            self._compact()
+        try:
+            self._data += data
+        except BufferError:
+            # Packets handed out are still referenced: leave their memory to
+            # them and continue on a new buffer.
+            self._compact()
+            self._data += data
+
+    def slice_packets(self):
+        """Consume all the complete OpenFlow packets in the buffer.
+
+        Returns:
+            list: :class:`memoryview` of each packet, in order.
+
+        Raises:
+            UnpackException: if a packet header has an invalid length.
+        """
+        data = self._data
+        data_len = len(data)
+        offset = self._start
+        if data_len - offset < self.HEADER_SIZE:
+            return []
+
+        view = memoryview(data)
+        pkts = []
+        while data_len - offset > 3:
+            length_field = int.from_bytes(data[offset + 2:offset + 4],
+                                          byteorder='big')
+            if length_field < self.HEADER_SIZE:
+                raise UnpackException('invalid packet length')
+            if data_len - offset < length_field:
+                break
+            pkts.append(view[offset:offset + length_field])
+            offset += length_field
+        self._start = offset
+        return pkts
+
+    def _compact(self):
+        """Discard consumed bytes by copying the rest to a new bytearray."""
+        self._data = self._data[self._start:]
+        self._start = 0
+
+
+def listen_in_order(event, *events):
+    """Decorate a listener to be called by the thread of its event buffer.
+
+    Unlike :func:`kytos.core.helpers.listen_to`, which starts a new thread
+    for each event, the listener handles the events one at a time, in the
+    order they were put in the buffer. It must return quickly, since the
+    other events of the buffer wait for it.
+    """
+    def decorator(handler):
+        """Set the events of ``handler``, as read by KytosNApp."""
+        handler.events = [event] + list(events)
+        return handler
+    return decorator
 
 
 def _unpack_int(packet, offset=0, size=None):
@@ -45,21 +151,52 @@ def _emit_message(controller, connection, message, direction):
     else:
         raise Exception("direction must be 'in' or 'out'")
 
-    name = message.header.message_type.name.lower()
-    hex_version = 'v0x%0.2x' % (message.header.version + 0)
     of_event = KytosEvent(
-        name=f"kytos/of_core.{hex_version}.messages.{direction}.{name}",
+        name=_event_name(direction, message.header.version + 0,
+                         message.header.message_type),
         content={'message': message,
                  address_type: connection})
     message_buffer.put(of_event)
 
 
+@lru_cache(maxsize=None)
+def _event_name(direction, version, message_type):
+    """Return the event name of a message, computed once per message type."""
+    name = message_type.name.lower()
+    hex_version = 'v0x%0.2x' % version
+    return f"kytos/of_core.{hex_version}.messages.{direction}.{name}"
+
+
 def emit_message_in(controller, connection, message):
     """Make controller emit a KytosEvent for an incoming message
     containing the message and the source."""
     _emit_message(controller, connection, message, 'in')
 
 
+def emit_messages_in(controller, connection, messages):
+    """Make controller emit a single KytosEvent for many incoming messages.
+
+    All messages must have the same version and type. The event name is the
+    one of a single message with ``batch`` after the direction, e.g.
+    ``kytos/of_core.v0x01.messages.in.batch.ofpt_packet_in``, and the messages
+    are in the ``messages`` content key. See :func:`iter_messages`.
+    """
+    header = messages[0].header
+    of_event = KytosEvent(
+        name=_event_name('in.batch', header.version + 0, header.message_type),
+        content={'messages': messages,
+                 'source': connection})
+    controller.buffers.msg_in.put(of_event)
+
+
+def iter_messages(event):
+    """Iterate over the messages of a single or a batch message event."""
+    messages = event.content.get('messages')
+    if messages is None:
+        return iter((event.content['message'],))
+    return iter(messages)
+
+
 def emit_message_out(controller, connection, message):
     """Make controller emit a KytosEvent for an outgoing message
     containing the message and the destination."""
@@ -171,6 +308,271 @@ class GenericHello():
             self.versions = None
 
 
+class DeferredMessages():
+    """Messages received during the OpenFlow handshake, in order.
+
+    Messages other than the features reply are kept already unpacked until the
+    handshake is complete and then replayed. At most ``max_size`` messages are
+    kept. After that, ``overflow`` defines what happens to new messages:
+
+    - ``'drop_oldest'``: the oldest message is discarded;
+    - ``'drop_newest'``: the new message is discarded;
+    - ``'disconnect'``: the connection is closed.
+    """
+
+    #: Overflow policies
+    POLICIES = ('drop_oldest', 'drop_newest', 'disconnect')
+
+    def __init__(self, max_size, overflow):
+        """Create an empty queue.
+
+        Args:
+            max_size (int): Maximum number of messages.
+            overflow (str): One of :attr:`POLICIES`.
+        """
+        if overflow not in self.POLICIES:
+            raise ValueError('Invalid overflow policy: %s' % overflow)
+        self.max_size = max_size
+        self.overflow = overflow
+        #: Number of messages discarded
+        self.dropped = 0
+        self._messages = deque()
+        self._replayed = False
+        self._lock = Lock()
+
+    def __len__(self):
+        """Return the number of messages waiting to be replayed."""
+        return len(self._messages)
+
+    def defer(self, connection, message):
+        """Keep ``message`` until the handshake is complete.
+
+        Returns:
+            bool: False if the messages were already replayed, so ``message``
+                must be handled now.
+        """
+        with self._lock:
+            if self._replayed:
+                return False
+            if len(self._messages) < self.max_size:
+                self._messages.append(message)
+                return True
+            self.dropped += 1
+            if self.dropped == 1:
+                log.warning('Connection %s: more than %s messages during'
+                            ' handshake, policy: %s', connection.id,
+                            self.max_size, self.overflow)
+            if self.overflow == 'drop_oldest':
+                self._messages.popleft()
+                self._messages.append(message)
+            elif self.overflow == 'disconnect':
+                connection.close()
+            return True
+
+    def replay(self, handle):
+        """Call ``handle`` with the list of deferred messages, in order.
+
+        No message is deferred afterwards. New messages wait for ``handle`` to
+        return, so they are handled after the deferred ones.
+        """
+        with self._lock:
+            self._replayed = True
+            messages = list(self._messages)
+            self._messages.clear()
+            if messages:
+                handle(messages)
+
+
+class LazyMessage():
+    """OpenFlow message whose body is only unpacked when needed.
+
+    Only the header (version, message type, length and xid) is decoded when
+    the message is created, which is enough to name and route its event. Any
+    other attribute access unpacks the whole message with python-openflow and
+    is delegated to it, so listeners can use it as the unpacked message.
+    """
+
+    class LazyHeader():
+        """Header with plain values, decoded from the first 8 bytes."""
+
+        def __init__(self, version, message_type, length, xid):
+            """Assign header fields."""
+            self.version = version
+            self.message_type = message_type
+            self.length = length
+            self.xid = xid
+
+    def __init__(self, packet):
+        """Decode the header of ``packet``.
+
+        Args:
+            packet (bytes): a whole OpenFlow packet.
+
+        Raises:
+            UnpackException: if the header is invalid or not supported.
+        """
+        if len(packet) < 8:
+            raise UnpackException('invalid packet')
+        version, message_type, length, xid = struct.unpack_from('!BBHI',
+                                                                packet)
+        if length != len(packet):
+            raise UnpackException('invalid packet')
+        try:
+            type_enum = PYOF_VERSION_LIBS[version].common.header.Type
+            message_type = type_enum(message_type)
+        except (KeyError, ValueError):
+            raise UnpackException('Version or message type not supported')
+
+        self.header = self.LazyHeader(version, message_type, length, xid)
+        self._packet = packet
+        self._message = None
+        #: Index of a multipart reply fragment among those of its xid, set
+        #: by the reader of the connection
+        self.fragment = None
+
+    def __getattr__(self, name):
+        """Unpack the whole message and return its attribute ``name``."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_message(), name)
+
+    def get_message(self):
+        """Return the python-openflow message, unpacking it only once.
+
+        Raises:
+            UnpackException: if the message body can not be unpacked.
+        """
+        if self._message is None:
+            self._message = unpack(self._packet)
+        return self._message
+
+    def get_packet(self):
+        """Return the binary message as received."""
+        return self._packet
+
+    def is_unpacked(self):
+        """Whether the message body has already been unpacked."""
+        return self._message is not None
+
+    def pack(self):
+        """Return the binary message, packing it only if it was unpacked."""
+        if self._message is None:
+            return self._packet
+        return self._message.pack()
+
+
+class MessageTemplate():
+    """Constant message packed only once, of which only the xid changes."""
+
+    def __init__(self, message):
+        """Pack ``message`` to be used as template.
+
+        Args:
+            message (GenericMessage): python-openflow message with constant
+                content.
+        """
+        self._packet = message.pack()
+
+    def new_message(self, xid=None, data=b''):
+        """Return a copy of the template message with a new xid.
+
+        Args:
+            xid (int): message xid. Defaults to a random integer.
+            data (bytes): appended to the template message, e.g. the data of
+                an echo request whose template has no data.
+
+        Returns:
+            LazyMessage: message ready to be emitted.
+        """
+        if xid is None:
+            xid = getrandbits(32)
+        packet = bytearray(self._packet)
+        if data:
+            packet += data
+            struct.pack_into('!H', packet, 2, len(packet))
+        struct.pack_into('!I', packet, 4, xid)
+        return LazyMessage(bytes(packet))
+
+
+class PackedMessages():
+    """Many packed messages sent to a connection with a single write.
+
+    The header is the one of the first message, so the event of the whole
+    buffer is handled by the controller as a single message.
+    """
+
+    def __init__(self, packet):
+        """Decode the header of the first message and count the messages.
+
+        Args:
+            packet (bytes): one or more whole OpenFlow packets.
+
+        Raises:
+            UnpackException: if a message length is invalid.
+        """
+        offset = 0
+        self.count = 0
+        while offset < len(packet):
+            length = _unpack_int(packet, offset + 2, 2)
+            if length < 8 or offset + length > len(packet):
+                raise UnpackException('invalid packet')
+            self._last_offset = offset
+            offset += length
+            self.count += 1
+        self.header = LazyMessage(packet[:_unpack_int(packet, 2, 2)]).header
+        self._packet = packet
+
+    def __iter__(self):
+        """Iterate over each message, as a :class:`LazyMessage`."""
+        offset = 0
+        while offset < len(self._packet):
+            length = _unpack_int(self._packet, offset + 2, 2)
+            yield LazyMessage(self._packet[offset:offset + length])
+            offset += length
+
+    @property
+    def last_xid(self):
+        """Return the xid of the last message."""
+        return _unpack_int(self._packet, self._last_offset + 4, 4)
+
+    def slice(self, offset, count):
+        """Return ``count`` messages starting at byte ``offset``.
+
+        Returns:
+            tuple: The messages, as PackedMessages, and the offset of the
+                next message.
+        """
+        end = offset
+        for _ in range(count):
+            end += _unpack_int(self._packet, end + 2, 2)
+        return PackedMessages(self._packet[offset:end]), end
+
+    def pack(self):
+        """Return all the messages packed."""
+        return self._packet
+
+
+class SizeHistogram():
+    """Thread-safe histogram of sizes in power of two buckets."""
+
+    def __init__(self):
+        """Start with no sizes counted."""
+        self._buckets = Counter()
+        self._lock = Lock()
+
+    def add(self, size):
+        """Count ``size`` in the smallest bucket that is not lower than it."""
+        bucket = 1 << max(size - 1, 0).bit_length()
+        with self._lock:
+            self._buckets[bucket] += 1
+
+    def as_dict(self):
+        """Return the count of each bucket, keyed by its upper limit."""
+        with self._lock:
+            return {f'<={bucket}': self._buckets[bucket]
+                    for bucket in sorted(self._buckets)}
+
+
 class NegotiationException(Exception):
     """OF version negotiation failed Exception"""
 
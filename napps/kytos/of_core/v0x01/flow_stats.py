@@ -0,0 +1,130 @@
+"""Flow stats of OpenFlow 1.0 stats replies (OFPST_FLOW).
+
+Flow stats are decoded with struct from the reply body, without unpacking
+them with python-openflow, so large flow tables can be polled. The match and
+actions are kept as bytes and only decoded to build new Flow objects, with
+the same values as :meth:`Flow.from_flow_stats`.
+"""
+import socket
+import struct
+
+from pyof.foundation.exceptions import UnpackException
+
+from napps.legacy.of_core.flow import Flow, OutputAction
+from napps.legacy.of_core.flow_table import FlowTableUpdate
+
+#: ofp_flow_stats without the actions: length, table_id, pad, match,
+#: duration_sec, duration_nsec, priority, idle_timeout, hard_timeout, pad,
+#: cookie, packet_count and byte_count
+FLOW_STATS = struct.Struct('!HBx40sIIHHH6xQQQ')
+#: ofp_match: wildcards, in_port, dl_src, dl_dst, dl_vlan, dl_vlan_pcp, pad,
+#: dl_type, nw_tos, nw_proto, pad, nw_src, nw_dst, tp_src and tp_dst
+MATCH = struct.Struct('!IH6s6sHBxHBB2x4s4sHH')
+#: Type and length of ofp_action_header
+TYPE_LENGTH = struct.Struct('!HH')
+#: Port of ofp_action_output
+OUTPUT_PORT = struct.Struct('!H')
+
+OFPAT_OUTPUT = 0
+
+
+def _mac(value):
+    """Decode a hardware address."""
+    return ':'.join('%02x' % byte for byte in value)
+
+
+class FlowStatsEntry:
+    """Flow stats of an entry, with match and actions as bytes."""
+
+    __slots__ = ('table_id', 'match', 'duration_sec', 'priority',
+                 'idle_timeout', 'hard_timeout', 'cookie', 'packet_count',
+                 'byte_count', 'actions')
+
+    def __init__(self, values, actions):
+        """Assign the decoded FLOW_STATS ``values``, except the length."""
+        (self.table_id, self.match, self.duration_sec, _, self.priority,
+         self.idle_timeout, self.hard_timeout, self.cookie,
+         self.packet_count, self.byte_count) = values
+        self.actions = actions
+
+    def get_key(self):
+        """Return the fields that identify the entry in the switch."""
+        return self.table_id, self.priority, self.match
+
+    def get_content(self):
+        """Return the fields that a flow modification can change."""
+        return self.cookie, self.idle_timeout, self.hard_timeout, self.actions
+
+    def get_counters(self):
+        """Return the packet count, byte count and duration of the entry."""
+        return self.packet_count, self.byte_count, self.duration_sec
+
+    def as_flow(self):
+        """Return a new Flow with the match fields and output actions."""
+        (wildcards, in_port, dl_src, dl_dst, dl_vlan, dl_vlan_pcp, dl_type,
+         _, nw_proto, nw_src, nw_dst, tp_src, tp_dst) = \
+            MATCH.unpack(self.match)
+        flow = Flow(idle_timeout=self.idle_timeout,
+                    hard_timeout=self.hard_timeout, cookie=self.cookie,
+                    priority=self.priority, table_id=self.table_id,
+                    wildcards=wildcards, in_port=in_port, dl_src=_mac(dl_src),
+                    dl_dst=_mac(dl_dst), dl_vlan=dl_vlan,
+                    dl_vlan_pcp=dl_vlan_pcp, dl_type=dl_type,
+                    nw_proto=nw_proto,
+                    nw_src=socket.inet_ntoa(nw_src),
+                    nw_dst=socket.inet_ntoa(nw_dst), tp_src=tp_src,
+                    tp_dst=tp_dst,
+                    actions=[OutputAction(port) for port in
+                             iter_output_ports(self.actions)])
+        flow.packet_count = self.packet_count
+        flow.byte_count = self.byte_count
+        flow.duration_sec = self.duration_sec
+        return flow
+
+
+def iter_flow_stats(body):
+    """Yield a FlowStatsEntry for each ofp_flow_stats in ``body``.
+
+    Raises:
+        UnpackException: if an entry length is invalid.
+    """
+    offset = 0
+    while offset < len(body):
+        if offset + FLOW_STATS.size > len(body):
+            raise UnpackException('truncated flow stats')
+        values = FLOW_STATS.unpack_from(body, offset)
+        length = values[0]
+        if length < FLOW_STATS.size or offset + length > len(body):
+            raise UnpackException('invalid flow stats length')
+        actions = bytes(body[offset + FLOW_STATS.size:offset + length])
+        yield FlowStatsEntry(values[1:], actions)
+        offset += length
+
+
+def iter_output_ports(actions):
+    """Yield the port of each output action."""
+    offset = 0
+    while offset + TYPE_LENGTH.size <= len(actions):
+        action_type, length = TYPE_LENGTH.unpack_from(actions, offset)
+        if length < 8 or offset + length > len(actions):
+            break
+        if action_type == OFPAT_OUTPUT:
+            yield OUTPUT_PORT.unpack_from(actions, offset + 4)[0]
+        offset += length
+
+
+class FlowTableUpdateV0x01(FlowTableUpdate):
+    """Update of a flow table from OpenFlow 1.0 stats reply bodies.
+
+    :class:`FlowTableUpdate` handles the same flow stats unpacked by
+    python-openflow, with the same Flow objects.
+    """
+
+    key = staticmethod(FlowStatsEntry.get_key)
+    content = staticmethod(FlowStatsEntry.get_content)
+    new_flow = staticmethod(FlowStatsEntry.as_flow)
+    counters = staticmethod(FlowStatsEntry.get_counters)
+
+    def add(self, flows_stats):
+        """Add the entries of an OFPST_FLOW reply body (bytes)."""
+        super().add(iter_flow_stats(flows_stats))
@@ -1,14 +1,34 @@
 """Utilities module for of_core OpenFlow v0x01 operations"""
+import struct
+
 from kytos.core.switch import Interface
 
-from napps.legacy.of_core.utils import emit_message_out
+from napps.legacy.of_core.echo import get_echo_monitor
+from napps.legacy.of_core.utils import emit_message_out, MessageTemplate
 
+from pyof.v0x01.controller2switch.barrier_request import BarrierRequest
 from pyof.v0x01.controller2switch.common import ConfigFlags, FlowStatsRequest
+from pyof.v0x01.controller2switch.features_request import FeaturesRequest
 from pyof.v0x01.controller2switch.set_config import SetConfig
 from pyof.v0x01.controller2switch.stats_request import StatsRequest, StatsTypes
 from pyof.v0x01.symmetric.echo_request import EchoRequest
 from pyof.v0x01.symmetric.hello import Hello
 
+#: Constant messages, packed only once
+HELLO = MessageTemplate(Hello())
+ECHO_REQUEST = MessageTemplate(EchoRequest())
+FEATURES_REQUEST = MessageTemplate(FeaturesRequest())
+SET_CONFIG = MessageTemplate(SetConfig(flags=ConfigFlags.OFPC_FRAG_NORMAL,
+                                       # Send the whole packet
+                                       miss_send_len=0xffff))
+FLOW_STATS_REQUEST = MessageTemplate(StatsRequest(
+    body_type=StatsTypes.OFPST_FLOW,
+    body=FlowStatsRequest()))
+BARRIER_REQUEST = MessageTemplate(BarrierRequest())
+
+#: Stats type and flags after the header of a stats reply
+STATS_REPLY = struct.Struct('!HH')
+
 
 def update_flow_list(controller, switch):
     """Method responsible for request stats of flow to switches.
@@ -19,14 +39,20 @@ def update_flow_list(controller, switch):
         switch(:class:`~kytos.core.switch.Switch`):
             target to send a stats request.
     """
-    body = FlowStatsRequest()
-    stats_request = StatsRequest(
-        body_type=StatsTypes.OFPST_FLOW,
-        body=body)
-    # req.pack()
+    stats_request = FLOW_STATS_REQUEST.new_message()
     emit_message_out(controller, switch.connection, stats_request)
 
 
+def unpack_stats_reply(packet):
+    """Return stats type, flags and body of a stats reply packet.
+
+    The body is not unpacked, so large replies can be decoded as needed.
+    """
+    stats_type, flags = STATS_REPLY.unpack_from(packet, 8)
+    body = memoryview(packet)[8 + STATS_REPLY.size:]
+    return stats_type, flags, body
+
+
 def handle_features_reply(controller, event):
     """Handle OF v0x01 features_reply message events.
 
@@ -60,19 +86,25 @@ def handle_features_reply(controller, event):
 def send_echo(controller, switch):
     """Send echo request to a datapath.
 
-    Keep the connection alive through symmetric echoes.
+    Keep the connection alive through symmetric echoes. The echo data is
+    used to measure the round-trip time when the reply arrives.
     """
-    echo = EchoRequest(data=b'kytosd_10')
+    data = get_echo_monitor(switch.connection).new_data()
+    echo = ECHO_REQUEST.new_message(data=data)
     emit_message_out(controller, switch.connection, echo)
 
 def send_set_config(controller, switch):
     """Send a SetConfig message after the OpenFlow handshake."""
-    set_config = SetConfig()
-    set_config.flags = ConfigFlags.OFPC_FRAG_NORMAL
-    set_config.miss_send_len = 0xffff #Send the whole packet
+    set_config = SET_CONFIG.new_message()
     emit_message_out (controller, switch.connection, set_config)
 
 def say_hello(controller, connection):
     """Send back a Hello packet with the same version as the switch."""
-    hello = Hello()
+    hello = HELLO.new_message()
     emit_message_out(controller, connection, hello)
+
+
+def send_features_request(controller, connection):
+    """Send a FeaturesRequest to start the handshake."""
+    features_request = FEATURES_REQUEST.new_message()
+    emit_message_out(controller, connection, features_request)
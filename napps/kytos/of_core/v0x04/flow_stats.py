@@ -0,0 +1,219 @@
+"""Flow stats of OpenFlow 1.3 multipart replies (OFPMP_FLOW).
+
+Flow stats are decoded with struct from the reply body, without unpacking
+them with python-openflow, so large flow tables can be polled. The match and
+instructions are kept as bytes and only decoded to build new Flow objects.
+"""
+import struct
+from ipaddress import IPv4Address
+
+from pyof.foundation.exceptions import UnpackException
+from pyof.v0x04.common.flow_match import OxmOfbMatchField
+
+from napps.legacy.of_core.flow import Flow, OutputAction
+from napps.legacy.of_core.flow_table import FlowTableUpdate
+
+#: ofp_flow_stats up to the match: length, table_id, pad, duration_sec,
+#: duration_nsec, priority, idle_timeout, hard_timeout, flags, pad, cookie,
+#: packet_count and byte_count
+FLOW_STATS = struct.Struct('!HBxIIHHHH4xQQQ')
+#: Type and length of ofp_match, ofp_instruction and ofp_action_header
+TYPE_LENGTH = struct.Struct('!HH')
+#: OXM class, field and has mask bit, and payload length
+OXM_HEADER = struct.Struct('!HBB')
+#: Port of ofp_action_output
+OUTPUT_PORT = struct.Struct('!I')
+
+OFPXMC_OPENFLOW_BASIC = 0x8000
+OFPVID_PRESENT = 0x1000
+OFPIT_WRITE_ACTIONS = 3
+OFPIT_APPLY_ACTIONS = 4
+OFPAT_OUTPUT = 0
+
+
+def _int(value):
+    """Decode an unsigned integer."""
+    return int.from_bytes(value, 'big')
+
+
+def _mac(value):
+    """Decode a hardware address."""
+    return ':'.join('%02x' % byte for byte in value)
+
+
+def _ipv4(value):
+    """Decode an IPv4 address."""
+    return str(IPv4Address(value))
+
+
+def _vlan(value):
+    """Decode a VLAN id without the OFPVID_PRESENT bit."""
+    return _int(value) & ~OFPVID_PRESENT
+
+
+#: Flow attribute and decoding function by OXM basic field
+OXM_ATTRIBUTES = {
+    OxmOfbMatchField.OFPXMT_OFB_IN_PORT: ('in_port', _int),
+    OxmOfbMatchField.OFPXMT_OFB_ETH_DST: ('dl_dst', _mac),
+    OxmOfbMatchField.OFPXMT_OFB_ETH_SRC: ('dl_src', _mac),
+    OxmOfbMatchField.OFPXMT_OFB_ETH_TYPE: ('dl_type', _int),
+    OxmOfbMatchField.OFPXMT_OFB_VLAN_VID: ('dl_vlan', _vlan),
+    OxmOfbMatchField.OFPXMT_OFB_VLAN_PCP: ('dl_vlan_pcp', _int),
+    OxmOfbMatchField.OFPXMT_OFB_IP_PROTO: ('nw_proto', _int),
+    OxmOfbMatchField.OFPXMT_OFB_IPV4_SRC: ('nw_src', _ipv4),
+    OxmOfbMatchField.OFPXMT_OFB_IPV4_DST: ('nw_dst', _ipv4),
+    OxmOfbMatchField.OFPXMT_OFB_TCP_SRC: ('tp_src', _int),
+    OxmOfbMatchField.OFPXMT_OFB_TCP_DST: ('tp_dst', _int),
+    OxmOfbMatchField.OFPXMT_OFB_UDP_SRC: ('tp_src', _int),
+    OxmOfbMatchField.OFPXMT_OFB_UDP_DST: ('tp_dst', _int)}
+
+
+class FlowStatsEntry:
+    """Flow stats of an entry, with match and instructions as bytes."""
+
+    __slots__ = ('table_id', 'duration_sec', 'priority', 'idle_timeout',
+                 'hard_timeout', 'flags', 'cookie', 'packet_count',
+                 'byte_count', 'match', 'instructions')
+
+    def __init__(self, values, match, instructions):
+        """Assign the decoded FLOW_STATS ``values``, except the length."""
+        (self.table_id, self.duration_sec, _, self.priority,
+         self.idle_timeout, self.hard_timeout, self.flags, self.cookie,
+         self.packet_count, self.byte_count) = values
+        self.match = match
+        self.instructions = instructions
+
+    def get_key(self):
+        """Return the fields that identify the entry in the switch."""
+        return self.table_id, self.priority, self.match
+
+    def get_content(self):
+        """Return the fields that a flow modification can change."""
+        return (self.cookie, self.idle_timeout, self.hard_timeout, self.flags,
+                self.instructions)
+
+    def get_counters(self):
+        """Return the packet count, byte count and duration of the entry."""
+        return self.packet_count, self.byte_count, self.duration_sec
+
+    def as_flow(self):
+        """Return a new Flow with the match fields and output actions."""
+        match = {}
+        oxm_fields = {}
+        for oxm_class, field, value, mask in iter_oxm(self.match):
+            if oxm_class == OFPXMC_OPENFLOW_BASIC and field in OXM_ATTRIBUTES:
+                attribute, decode = OXM_ATTRIBUTES[field]
+                match[attribute] = _masked(decode, value, mask)
+            else:
+                oxm_fields[_oxm_name(oxm_class, field)] = \
+                    _masked(bytes.hex, value, mask)
+        flow = Flow(idle_timeout=self.idle_timeout,
+                    hard_timeout=self.hard_timeout, cookie=self.cookie,
+                    priority=self.priority, table_id=self.table_id,
+                    actions=[OutputAction(port) for port in
+                             iter_output_ports(self.instructions)],
+                    oxm_fields=oxm_fields, **match)
+        flow.packet_count = self.packet_count
+        flow.byte_count = self.byte_count
+        flow.duration_sec = self.duration_sec
+        return flow
+
+
+def _masked(decode, value, mask):
+    """Return the decoded value, followed by the decoded mask if any."""
+    if mask is None:
+        return decode(value)
+    return '%s/%s' % (decode(value), decode(mask))
+
+
+def _oxm_name(oxm_class, field):
+    """Return a name for an OXM field without a Flow attribute."""
+    if oxm_class == OFPXMC_OPENFLOW_BASIC:
+        try:
+            return OxmOfbMatchField(field).name[len('OFPXMT_OFB_'):].lower()
+        except ValueError:
+            pass
+    return '0x%04x:%d' % (oxm_class, field)
+
+
+def iter_flow_stats(body):
+    """Yield a FlowStatsEntry for each ofp_flow_stats in ``body``.
+
+    Raises:
+        UnpackException: if an entry length is invalid.
+    """
+    offset = 0
+    while offset < len(body):
+        if offset + FLOW_STATS.size + TYPE_LENGTH.size > len(body):
+            raise UnpackException('truncated flow stats')
+        values = FLOW_STATS.unpack_from(body, offset)
+        length = values[0]
+        match_offset = offset + FLOW_STATS.size
+        match_length = TYPE_LENGTH.unpack_from(body, match_offset)[1]
+        if match_length < TYPE_LENGTH.size:
+            raise UnpackException('invalid match length')
+        instructions_offset = match_offset + (match_length + 7) // 8 * 8
+        if length < instructions_offset - offset or \
+                offset + length > len(body):
+            raise UnpackException('invalid flow stats length')
+        match = bytes(body[match_offset + 4:match_offset + match_length])
+        instructions = bytes(body[instructions_offset:offset + length])
+        yield FlowStatsEntry(values[1:], match, instructions)
+        offset += length
+
+
+def iter_oxm(match):
+    """Yield class, field, value and mask (or None) of each OXM TLV.
+
+    Raises:
+        UnpackException: if a TLV length exceeds the match.
+    """
+    offset = 0
+    while offset + OXM_HEADER.size <= len(match):
+        oxm_class, field_mask, length = OXM_HEADER.unpack_from(match, offset)
+        if offset + OXM_HEADER.size + length > len(match):
+            raise UnpackException('invalid OXM length')
+        payload = match[offset + OXM_HEADER.size:
+                        offset + OXM_HEADER.size + length]
+        if field_mask & 1:
+            value, mask = payload[:length // 2], payload[length // 2:]
+        else:
+            value, mask = payload, None
+        yield oxm_class, field_mask >> 1, value, mask
+        offset += OXM_HEADER.size + length
+
+
+def iter_output_ports(instructions):
+    """Yield the port of each output action in apply or write actions."""
+    offset = 0
+    while offset + TYPE_LENGTH.size <= len(instructions):
+        instruction_type, length = TYPE_LENGTH.unpack_from(instructions,
+                                                           offset)
+        if length < TYPE_LENGTH.size:
+            break
+        if instruction_type in (OFPIT_WRITE_ACTIONS, OFPIT_APPLY_ACTIONS):
+            # Actions follow the instruction header and 4 pad bytes
+            action_offset = offset + 8
+            while action_offset + 8 <= offset + length:
+                action_type, action_length = TYPE_LENGTH.unpack_from(
+                    instructions, action_offset)
+                if action_length < 8:
+                    break
+                if action_type == OFPAT_OUTPUT:
+                    yield OUTPUT_PORT.unpack_from(instructions,
+                                                  action_offset + 4)[0]
+                action_offset += action_length
+        offset += length
+
+
+class FlowTableUpdateV0x04(FlowTableUpdate):
+    """Update of a flow table from OpenFlow 1.3 multipart reply bodies."""
+
+    key = staticmethod(FlowStatsEntry.get_key)
+    content = staticmethod(FlowStatsEntry.get_content)
+    new_flow = staticmethod(FlowStatsEntry.as_flow)
+    counters = staticmethod(FlowStatsEntry.get_counters)
+
+    def add(self, flows_stats):
+        """Add the entries of an OFPMP_FLOW reply body (bytes)."""
+        super().add(iter_flow_stats(flows_stats))
@@ -1,16 +1,45 @@
 """Utilities module for of_core OpenFlow v0x04 operations"""
-from kytos.core import log
+import struct
+
 from kytos.core.switch import Interface
 
-from napps.legacy.of_core.utils import emit_message_out
+from napps.legacy.of_core.echo import get_echo_monitor
+from napps.legacy.of_core.utils import emit_message_out, MessageTemplate
 
 from pyof.v0x04.symmetric.echo_request import EchoRequest
 from pyof.v0x04.controller2switch.common import ConfigFlags, MultipartTypes
-from pyof.v0x04.controller2switch.multipart_request import MultipartRequest
+from pyof.v0x04.controller2switch.features_request import FeaturesRequest
+from pyof.v0x04.controller2switch.group_mod import Group
+from pyof.v0x04.controller2switch.multipart_request import (FlowStatsRequest,
+                                                            MultipartRequest)
 from pyof.v0x04.controller2switch.set_config import SetConfig
+from pyof.v0x04.controller2switch.table_mod import Table
 from pyof.v0x04.common.action import ControllerMaxLen
+from pyof.v0x04.common.flow_match import Match, MatchType
+from pyof.v0x04.common.port import PortNo
 from pyof.v0x04.symmetric.hello import Hello
 
+#: Constant messages, packed only once
+HELLO = MessageTemplate(Hello())
+ECHO_REQUEST = MessageTemplate(EchoRequest())
+FEATURES_REQUEST = MessageTemplate(FeaturesRequest())
+SET_CONFIG = MessageTemplate(SetConfig(
+    flags=ConfigFlags.OFPC_FRAG_NORMAL,
+    miss_send_len=ControllerMaxLen.OFPCML_NO_BUFFER))
+PORT_DESC_REQUEST = MessageTemplate(MultipartRequest(
+    multipart_type=MultipartTypes.OFPMP_PORT_DESC,
+    flags=0))
+FLOW_STATS_REQUEST = MessageTemplate(MultipartRequest(
+    multipart_type=MultipartTypes.OFPMP_FLOW,
+    flags=0,
+    body=FlowStatsRequest(table_id=Table.OFPTT_ALL, out_port=PortNo.OFPP_ANY,
+                          out_group=Group.OFPG_ANY, cookie=0, cookie_mask=0,
+                          match=Match(match_type=MatchType.OFPMT_OXM))))
+
+#: Multipart type, flags and padding after the header of a multipart reply
+MULTIPART_REPLY = struct.Struct('!HH4x')
+
+
 def update_flow_list(controller, switch):
     """Method responsible for request stats of flow to switches.
 
@@ -20,13 +49,23 @@ def update_flow_list(controller, switch):
         switch(:class:`~kytos.core.switch.Switch`):
             target to send a stats request.
     """
-    log.error("update_flow_list not implemented yet for OF v0x04")
+    flow_stats_request = FLOW_STATS_REQUEST.new_message()
+    emit_message_out(controller, switch.connection, flow_stats_request)
+
+
+def unpack_multipart_reply(packet):
+    """Return multipart type, flags and body of a multipart reply packet.
+
+    The body is not unpacked, so large replies can be decoded as needed.
+    """
+    multipart_type, flags = MULTIPART_REPLY.unpack_from(packet, 8)
+    body = memoryview(packet)[8 + MULTIPART_REPLY.size:]
+    return multipart_type, flags, body
 
 
 def send_port_request(controller, connection):
     """Send a Port Description Request after the Features Reply."""
-    port_request = MultipartRequest()
-    port_request.multipart_type = MultipartTypes.OFPMP_PORT_DESC
+    port_request = PORT_DESC_REQUEST.new_message()
     emit_message_out(controller, connection, port_request)
 
 def handle_features_reply(controller, event):
@@ -65,19 +104,24 @@ def handle_port_desc(switch, port_list):
 def send_echo(controller, switch):
     """Send echo request to a datapath.
 
-    Keep the connection alive through symmetric echoes.
+    Keep the connection alive through symmetric echoes. The echo data is
+    used to measure the round-trip time when the reply arrives.
     """
-    echo = EchoRequest(data=b'kytosd_13')
+    data = get_echo_monitor(switch.connection).new_data()
+    echo = ECHO_REQUEST.new_message(data=data)
     emit_message_out(controller, switch.connection, echo)
 
 def send_set_config(controller, switch):
     """Send a SetConfig message after the OpenFlow handshake."""
-    set_config = SetConfig()
-    set_config.flags = ConfigFlags.OFPC_FRAG_NORMAL
-    set_config.miss_send_len = ControllerMaxLen.OFPCML_NO_BUFFER
+    set_config = SET_CONFIG.new_message()
     emit_message_out (controller, switch.connection, set_config)
 
 def say_hello(controller, connection):
     """Send back a Hello packet with the same version as the switch."""
-    hello = Hello()
+    hello = HELLO.new_message()
     emit_message_out(controller, connection, hello)
+
+def send_features_request(controller, connection):
+    """Send a FeaturesRequest to start the handshake."""
+    features_request = FEATURES_REQUEST.new_message()
+    emit_message_out(controller, connection, features_request)
@@ -0,0 +1,233 @@
+"""Flow jobs: flow mods sent to switches and confirmed by barrier replies.
+
+Each job sends flow mods to one or more switches, followed by a barrier
+request per switch. The flow mods of a switch have consecutive xids and the
+barrier request has the next one, so barrier replies and errors are matched
+to the job by the switch and xid. A switch replies to the barrier request
+only after processing, and reporting the errors of, the flow mods before it.
+"""
+import time
+from collections import OrderedDict
+from random import getrandbits
+from threading import Lock
+from uuid import uuid4
+
+from napps.legacy.of_flow_manager import settings
+
+#: Switch states of a job
+QUEUED = 'queued'
+SENT = 'sent'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+
+#: Switch states of a job that is still running
+RUNNING = (QUEUED, SENT)
+
+
+class SwitchJob:
+    """Flow mods of a job sent to a switch."""
+
+    def __init__(self, dpid, flows, first_xid):
+        """Start with the flow mods queued.
+
+        Args:
+            dpid (str): Switch datapath id.
+            flows (list): Flows modified, in the order of their flow mods.
+            first_xid (int): Xid of the first flow mod.
+        """
+        self.dpid = dpid
+        self.flows = flows
+        self.first_xid = first_xid
+        #: Xid of the barrier request after the flow mods
+        self.barrier_xid = first_xid + len(flows)
+        self.state = QUEUED
+        self.errors = []
+        self.queued_at = time.time()
+        #: Time the barrier request was written to the switch
+        self.sent_at = None
+        #: Time the job was queued or its last flow mods were written
+        self.active_at = self.queued_at
+        self.finished_at = None
+
+    def finish(self, state):
+        """Set the final ``state``."""
+        self.state = state
+        self.finished_at = time.time()
+
+    def as_dict(self):
+        """Return the state, errors and times of the switch."""
+        return {'state': self.state, 'flow_mods': len(self.flows),
+                'errors': self.errors, 'queued_at': self.queued_at,
+                'sent_at': self.sent_at, 'finished_at': self.finished_at}
+
+
+class FlowJob:
+    """Flow mods of a request, sent to many switches."""
+
+    def __init__(self, command):
+        """Create a job without switches.
+
+        Args:
+            command (str): ``install`` or ``delete``.
+        """
+        self.id = uuid4().hex
+        self.command = command
+        self.created_at = time.time()
+        #: SwitchJob by dpid
+        self.switches = {}
+
+    @property
+    def state(self):
+        """Return ``running`` until all switches finished, then the result.
+
+        The result is ``done`` if all switches processed the flow mods
+        without errors, otherwise ``failed``.
+        """
+        states = {switch.state for switch in self.switches.values()}
+        if states & set(RUNNING):
+            return 'running'
+        if states - {DONE}:
+            return FAILED
+        return DONE
+
+    def as_dict(self):
+        """Return the job id, command, state and the state of each switch."""
+        return {'id': self.id, 'command': self.command, 'state': self.state,
+                'created_at': self.created_at,
+                'switches': {dpid: switch.as_dict()
+                             for dpid, switch in self.switches.items()}}
+
+
+class JobTracker:
+    """Jobs in flight and recently finished, by id.
+
+    Up to ``JOBS_MAX`` jobs are kept, dropping the oldest. Switches time out
+    when nothing was written to them for ``JOB_TIMEOUT`` seconds, since the
+    job was queued or its last flow mods were written, or when they do not
+    reply in ``JOB_TIMEOUT`` seconds after the barrier request was written.
+    Flow mods paced by the outbound queue of a switch keep it active.
+    """
+
+    def __init__(self):
+        """Start without jobs."""
+        self._jobs = OrderedDict()
+        #: Running SwitchJobs by barrier xid, by dpid
+        self._running = {}
+        self._xid = getrandbits(31)
+        self._lock = Lock()
+
+    def allocate_xids(self, count):
+        """Return the first of ``count`` consecutive xids not used recently.
+
+        Ranges never wrap around, so they can be compared as integers.
+        """
+        with self._lock:
+            if self._xid + count >= 1 << 32:
+                self._xid = 1
+            first = self._xid
+            self._xid += count
+            return first
+
+    def add(self, job, switch_job):
+        """Add ``switch_job`` to ``job``, to be matched by xid.
+
+        Switches must be added before their messages are sent.
+        """
+        with self._lock:
+            self._expire()
+            job.switches[switch_job.dpid] = switch_job
+            if job.id not in self._jobs:
+                self._jobs[job.id] = job
+                while len(self._jobs) > settings.JOBS_MAX:
+                    _, dropped = self._jobs.popitem(last=False)
+                    self._forget(dropped)
+            if switch_job.state in RUNNING:
+                running = self._running.setdefault(switch_job.dpid, {})
+                running[switch_job.barrier_xid] = switch_job
+
+    def sent(self, switch_job, last=True):
+        """Record that flow mods of ``switch_job`` were written to the switch.
+
+        Args:
+            switch_job (SwitchJob): Switch job of the flow mods.
+            last (bool): Whether the barrier request was written too, so
+                the switch job is sent.
+        """
+        with self._lock:
+            switch_job.active_at = time.time()
+            if last and switch_job.state == QUEUED:
+                switch_job.state = SENT
+                switch_job.sent_at = switch_job.active_at
+
+    def barrier_reply(self, dpid, xid):
+        """Finish the switch job of a barrier reply, if any.
+
+        Returns:
+            bool: Whether the reply matched a switch job.
+        """
+        with self._lock:
+            switch_job = self._running.get(dpid, {}).pop(xid, None)
+            if switch_job is None:
+                return False
+            switch_job.finish(FAILED if switch_job.errors else DONE)
+            return True
+
+    def error(self, dpid, xid, error):
+        """Add ``error`` to the switch job of a flow mod, if any.
+
+        Args:
+            dpid (str): Switch datapath id.
+            xid (int): Xid of the message that caused the error.
+            error (dict): Error type and code.
+
+        Returns:
+            bool: Whether the error matched a switch job.
+        """
+        with self._lock:
+            for switch_job in self._running.get(dpid, {}).values():
+                if switch_job.first_xid <= xid <= switch_job.barrier_xid:
+                    index = xid - switch_job.first_xid
+                    if index < len(switch_job.flows):
+                        error = dict(error,
+                                     flow=switch_job.flows[index].id)
+                    switch_job.errors.append(error)
+                    return True
+            return False
+
+    def disconnected(self, dpid):
+        """Fail the running switch jobs of a switch that disconnected."""
+        with self._lock:
+            for switch_job in self._running.pop(dpid, {}).values():
+                switch_job.errors.append({'error': 'switch disconnected'})
+                switch_job.finish(FAILED)
+
+    def get(self, job_id):
+        """Return the job with ``job_id`` as a dictionary, or None."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            return None if job is None else job.as_dict()
+
+    def get_all(self):
+        """Return the id, command and state of the jobs kept, oldest first."""
+        with self._lock:
+            self._expire()
+            return [{'id': job.id, 'command': job.command,
+                     'state': job.state} for job in self._jobs.values()]
+
+    def _forget(self, job):
+        """Stop matching the running switch jobs of a dropped job."""
+        for switch_job in job.switches.values():
+            running = self._running.get(switch_job.dpid, {})
+            if running.get(switch_job.barrier_xid) is switch_job:
+                del running[switch_job.barrier_xid]
+
+    def _expire(self):
+        """Time out the switch jobs inactive for more than JOB_TIMEOUT."""
+        limit = time.time() - settings.JOB_TIMEOUT
+        for running in self._running.values():
+            expired = [xid for xid, switch_job in running.items()
+                       if switch_job.active_at < limit]
+            for xid in expired:
+                running.pop(xid).finish(TIMEOUT)
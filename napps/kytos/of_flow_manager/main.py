@@ -1,15 +1,87 @@
 """NApp responsible for installing or removing flows on the switches."""
 
 import json
+from collections import deque
+from threading import Lock
 
-from flask import request
+from flask import Response, request
 
 from kytos.core import KytosEvent, KytosNApp, log, rest
+from kytos.core.helpers import listen_to
+from kytos.core.switch import Interface
 
 from pyof.v0x01.controller2switch.flow_mod import FlowModCommand
 
-from napps.legacy.of_core.flow import Flow
+from napps.legacy.of_core.classifier import HEADER_FIELDS, to_int
+from napps.legacy.of_core.flow import Flow, FLOW_FIELDS, OutputAction
+from napps.legacy.of_core.flow_mod import new_flow_mods
+from napps.legacy.of_core.flow_table import get_flow_table
+from napps.legacy.of_core.outbound import FLOW_MOD, outbound
+from napps.legacy.of_core.utils import iter_messages
 from napps.legacy.of_flow_manager import settings
+from napps.legacy.of_flow_manager.jobs import (DONE, FAILED, QUEUED,
+                                               FlowJob, JobTracker, SwitchJob)
+
+#: Flow fields accepted as query string filters
+FILTERS = ('id', 'out_port') + tuple(name for name in FLOW_FIELDS
+                                     if name not in ('actions', 'oxm_fields'))
+
+
+def parse_filters(args):
+    """Return the flow filters in the query string ``args``.
+
+    Numbers may be decimal or hexadecimal (``0x`` prefix). Other values, such
+    as addresses, are compared as strings, with MAC addresses in lowercase.
+
+    Raises:
+        ValueError: if a filter is not in :data:`FILTERS`.
+
+    Returns:
+        dict: Filter values by Flow attribute, for :meth:`FlowTable.query`.
+    """
+    filters = {}
+    for name, value in args.items():
+        if name not in FILTERS:
+            raise ValueError('Unknown flow filter: %s' % name)
+        if name == 'id':
+            filters[name] = value
+            continue
+        try:
+            filters[name] = (int(value, 16) if value[:2].lower() == '0x'
+                             else int(value))
+        except ValueError:
+            filters[name] = value.lower() if name in ('dl_src', 'dl_dst') \
+                else value
+    return filters
+
+
+def parse_header(args):
+    """Return the packet header in the query string ``args``.
+
+    Raises:
+        ValueError: if a field is not in :data:`HEADER_FIELDS` or a value is
+            not valid.
+
+    Returns:
+        dict: Header values by field, for :meth:`FlowTable.classify`.
+    """
+    header = {}
+    for name, value in args.items():
+        if name not in HEADER_FIELDS:
+            raise ValueError('Unknown header field: %s' % name)
+        if value[:2].lower() == '0x':
+            header[name] = int(value, 16)
+        elif value.isdigit():
+            header[name] = int(value)
+        else:
+            header[name] = to_int(value)
+    return header
+
+
+def _get_dpid(connection):
+    """Return the dpid of the switch of ``connection``, or None."""
+    switch = getattr(connection, 'switch', None)
+    return None if switch is None else switch.dpid
 
 
 class Main(KytosNApp):
@@ -41,42 +113,149 @@ class Main(KytosNApp):
         """Retrieve all flows from a switch identified by dpid.
 
         If no dpid has been specified, returns the flows from all switches.
+        Flows can be filtered by the fields in :data:`FILTERS` in the query
+        string, e.g. ``?in_port=1&dl_dst=00:00:00:00:00:01``.
+
+        The response is streamed, switch by switch, with the JSON of the
+        flows cached by each flow table.
         """
-        switch_flows = {}
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as error:
+            return json.dumps({'error': str(error)}), 400
 
         if dpid:
             target = [dpid]
         else:
-            target = self.controller.switches
+            target = list(self.controller.switches)
 
+        tables = []
         for switch_dpid in target:
             switch = self.controller.get_switch_by_dpid(switch_dpid)
-            flows = {}
-            for flow in switch.flows:
-                flow = (flow.as_dict()['flow'])
-                flow_id = flow.pop('self.id', 0)
-                flows[flow_id] = flow
-            switch_flows[switch_dpid] = flows
-        return json.dumps(switch_flows)
+            if switch is None:
+                return json.dumps({'error': 'Unknown switch: %s' %
+                                   switch_dpid}), 404
+            tables.append((switch_dpid, get_flow_table(switch)))
+        return Response(self._stream_flows(tables, filters),
+                        mimetype='application/json')
+
+    @staticmethod
+    def _stream_flows(tables, filters):
+        """Yield the JSON of the flows in (dpid, FlowTable) ``tables``."""
+        yield '{'
+        for index, (switch_dpid, table) in enumerate(tables):
+            yield '%s%s: {' % (', ' if index else '', json.dumps(switch_dpid))
+            chunks = table.iter_json(**filters)
+            for chunk_index, chunk in enumerate(chunks):
+                yield ', ' + chunk if chunk_index else chunk
+            yield '}'
+        yield '}'
+
+    @rest('trace/<dpid>')
+    def trace(self, dpid):
+        """Trace a packet entering the switch identified by dpid.
+
+        The packet header is given in the query string, with at least the
+        ``in_port``. Returns the flow matching the packet in each switch it
+        goes through, following the output ports and the links between
+        switches.
+        """
+        try:
+            header = parse_header(request.args)
+        except ValueError as error:
+            return json.dumps({'error': str(error)}), 400
+        if 'in_port' not in header:
+            return json.dumps({'error': 'in_port is required'}), 400
+        return json.dumps(self.flow_manager.trace(dpid, header))
 
     @rest('flows', methods=['POST'])
     @rest('flows/<dpid>', methods=['POST'])
     def insert_flows(self, dpid=None):
         """Install new flows in the switch identified by dpid.
 
-        If no dpid has been specified, install flows in all switches.
+        If no dpid has been specified, install flows in all switches. The
+        flow mods of all flows are sent to each switch with a single write,
+        followed by a barrier request. The response has the id of the job,
+        whose state is given by :meth:`retrieve_job`.
         """
         json_content = request.get_json()
-        for json_flow in json_content:
-            received_flow = Flow.from_dict(json_flow)
-            if dpid:
-                self.flow_manager.install_new_flow(received_flow, dpid)
-            else:
-                for switch_dpid in self.controller.switches:
-                    self.flow_manager.install_new_flow(received_flow,
-                                                       switch_dpid)
+        flows = [Flow.from_dict(json_flow) for json_flow in json_content]
+        if dpid:
+            target = [dpid]
+        else:
+            target = list(self.controller.switches)
+        job = self.flow_manager.install_flows(flows, target)
+
+        return json.dumps({"response": "FlowMod Messages Sent",
+                           "job": job.id}), 202
+
+    @rest('jobs')
+    @rest('jobs/<job_id>')
+    def retrieve_job(self, job_id=None):
+        """Retrieve the state of a flow job, or of all jobs kept.
+
+        A job is ``running`` until every switch replied to the barrier
+        request after its flow mods, and then ``done`` or ``failed``. Each
+        switch has its state and the errors sent by the switch.
+        """
+        if job_id is None:
+            return json.dumps(self.flow_manager.jobs.get_all())
+        job = self.flow_manager.jobs.get(job_id)
+        if job is None:
+            return json.dumps({'error': 'Unknown job: %s' % job_id}), 404
+        return json.dumps(job)
+
+    @rest('progress')
+    @rest('progress/<dpid>')
+    def retrieve_progress(self, dpid=None):
+        """Retrieve the flow mods queued and sent to each switch.
+
+        If no dpid has been specified, returns the progress of all switches
+        that flows were installed in.
+        """
+        progress = self.flow_manager.get_progress()
+        if dpid:
+            progress = {dpid: progress.get(dpid, {'queued': 0, 'sent': 0})}
+        return json.dumps(progress)
 
-        return json.dumps({"response": "FlowMod Messages Sent"}), 201
+    @listen_to('kytos/of_flow-manager.messages.out.batch.ofpt_flow_mod')
+    def handle_flow_mods_sent(self, event):
+        """Count the flow mods of a buffer written to a switch.
+
+        The buffer may be split by the outbound scheduler, and the last part
+        ends with the barrier request.
+        """
+        switch_job = event.content['switch_job']
+        message = event.content['message']
+        last = message.last_xid == switch_job.barrier_xid
+        self.flow_manager.count_sent(switch_job.dpid, message.count - last)
+        self.flow_manager.jobs.sent(switch_job, last)
+
+    @listen_to('kytos/of_core.v0x0[14].messages.in.(batch.)?'
+               'ofpt_barrier_reply')
+    def handle_barrier_reply(self, event):
+        """Finish the switch job of a barrier request."""
+        dpid = _get_dpid(event.source)
+        for message in iter_messages(event):
+            self.flow_manager.jobs.barrier_reply(dpid, message.header.xid)
+
+    @listen_to('kytos/of_core.v0x0[14].messages.in.(batch.)?ofpt_error')
+    def handle_error(self, event):
+        """Add errors caused by flow mods to their switch jobs."""
+        dpid = _get_dpid(event.source)
+        for message in iter_messages(event):
+            self.flow_manager.jobs.error(
+                dpid, message.header.xid,
+                {'xid': message.header.xid,
+                 'error_type': message.error_type.value,
+                 'code': message.code.value})
+
+    @listen_to('kytos/core.openflow.connection.lost')
+    def handle_connection_lost(self, event):
+        """Fail the running switch jobs of a switch disconnected."""
+        dpid = _get_dpid(event.source)
+        if dpid is not None:
+            self.flow_manager.jobs.disconnected(dpid)
 
     @rest('flows', methods=['DELETE'])
     @rest('flows/<dpid>', methods=['DELETE'])
@@ -86,17 +265,24 @@ class Main(KytosNApp):
 
         If no flow_id has been specified, removes all flows from the switch.
         If no dpid or flow_id  has been specified, removes all flows from all
-        switches.
+        switches. Without a flow_id, only flows matching the query string
+        filters, as in :meth:`retrieve_flows`, are removed. The response has
+        the id of the job, as in :meth:`insert_flows`.
         """
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as error:
+            return json.dumps({'error': str(error)}), 400
         if flow_id:
-            self.flow_manager.delete_flow(flow_id, dpid)
+            job = self.flow_manager.delete_flow(flow_id, dpid)
         elif dpid:
-            self.flow_manager.clear_flows(dpid)
+            job = self.flow_manager.clear_flows([dpid], **filters)
         else:
-            for switch_dpid in self.controller.switches:
-                self.flow_manager.clear_flows(switch_dpid)
+            job = self.flow_manager.clear_flows(
+                list(self.controller.switches), **filters)
 
-        return json.dumps({"response": "FlowMod Messages Sent"}), 202
+        return json.dumps({"response": "FlowMod Messages Sent",
+                           "job": job.id}), 202
 
 
 class FlowManager(object):
@@ -105,54 +291,169 @@ class FlowManager(object):
     def __init__(self, controller):
         """Init method."""
         self.controller = controller
+        #: Flow mods queued and sent by flow jobs, by dpid
+        self._progress = {}
+        self._lock = Lock()
+        self.jobs = JobTracker()
 
-    def install_new_flow(self, flow, dpid):
-        """Create a new flow_mod message.
+    def install_flows(self, flows, dpids):
+        """Install ``flows`` in the switches ``dpids``.
 
-        This method is responsible for creating a new flow_mod message from
-        the Flow object received.
-        """
-        switch = self.controller.get_switch_by_dpid(dpid)
-        flow_mod = flow.as_flow_mod(FlowModCommand.OFPFC_ADD)
+        The flow mods are packed once, in a single buffer with a barrier
+        request, and each switch gets one event with the whole buffer,
+        written at once.
 
-        event_out = KytosEvent(name=('kytos/of_flow-manager.messages.out.'
-                                     'ofpt_flow_mod'),
-                               content={'destination': switch.connection,
-                                        'message': flow_mod})
-        self.controller.buffers.msg_out.put(event_out)
+        Args:
+            flows (list): Flows to be installed.
+            dpids (list): Datapath ids of the switches.
 
-    def clear_flows(self, dpid):
-        """Clear all flows from switch identified by dpid."""
-        switch = self.controller.get_switch_by_dpid(dpid)
-        for flow in switch.flows:
-            flow_mod = flow.as_flow_mod(FlowModCommand.OFPFC_DELETE)
-            event_out = KytosEvent(name=('kytos/of_flow-manager.messages.out.'
-                                         'ofpt_flow_mod'),
-                                   content={'destination': switch.connection,
-                                            'message': flow_mod})
-            self.controller.buffers.msg_out.put(event_out)
+        Returns:
+            FlowJob: The job, running until all switches reply to the barrier
+                request.
+        """
+        job = FlowJob('install')
+        first_xid = self.jobs.allocate_xids(len(flows) + 1)
+        flow_mods = self._pack(flows, FlowModCommand.OFPFC_ADD, first_xid)
+        for dpid in dpids:
+            self._send(job, dpid, flows, flow_mods, first_xid)
+        return job
+
+    def count_sent(self, dpid, count):
+        """Count ``count`` flow mods written to the switch ``dpid``."""
+        with self._lock:
+            self._progress[dpid]['sent'] += count
+
+    def get_progress(self):
+        """Return the flow mods queued and sent, by dpid."""
+        with self._lock:
+            return {dpid: dict(progress)
+                    for dpid, progress in self._progress.items()}
+
+    def clear_flows(self, dpids, **filters):
+        """Clear all flows from the switches identified by dpids.
+
+        Args:
+            dpids (list): Switch datapath ids.
+            filters: Flow attribute values, as in :meth:`FlowTable.query`.
+                Only matching flows are removed.
+
+        Returns:
+            FlowJob: The job, as in :meth:`install_flows`.
+        """
+        job = FlowJob('delete')
+        for dpid in dpids:
+            switch = self.controller.get_switch_by_dpid(dpid)
+            flows = [] if switch is None else \
+                get_flow_table(switch).query(**filters)
+            self._delete(job, dpid, flows)
+        return job
 
     def delete_flow(self, flow_id, dpid):
-        """Remove a flow from a switch identified by id and dpid."""
+        """Remove a flow from a switch identified by id and dpid.
+
+        Returns:
+            FlowJob: The job, as in :meth:`install_flows`.
+        """
+        job = FlowJob('delete')
         switch = self.controller.get_switch_by_dpid(dpid)
-        for flow in switch.flows:
-            if flow.id == flow_id:
-                flow_mod = flow.as_flow_mod(FlowModCommand.OFPFC_DELETE)
-                content = {'destination': switch.connection,
-                           'message': flow_mod}
-                event_out = KytosEvent(name=('kytos/of_flow-manager.'
-                                             'messages.out.ofpt_flow_mod'),
-                                       content=content)
-                self.controller.buffers.msg_out.put(event_out)
+        flow = None if switch is None else get_flow_table(switch).get(flow_id)
+        self._delete(job, dpid, [] if flow is None else [flow])
+        return job
+
+    def _delete(self, job, dpid, flows):
+        """Send the flow mods deleting ``flows`` from a switch in ``job``."""
+        first_xid = self.jobs.allocate_xids(len(flows) + 1)
+        flow_mods = self._pack(flows, FlowModCommand.OFPFC_DELETE, first_xid)
+        self._send(job, dpid, flows, flow_mods, first_xid)
 
     @staticmethod
-    def _get_flows(flow_stats):
-        """Create a lista of flows.
+    def _pack(flows, command, first_xid):
+        """Return the flow mods of ``flows`` and a barrier request, if any.
 
-        Creates a list of flows from the body of a flow_stats_reply message.
+        The flow mods have consecutive xids from ``first_xid`` and the
+        barrier request has the next one.
         """
-        flows = []
-        for flow_stat in flow_stats:
-            flows.append(Flow.from_flow_stats(flow_stat))
-
-        return flows
+        if not flows:
+            return None
+        barrier_xid = first_xid + len(flows)
+        return new_flow_mods(flows, command, range(first_xid, barrier_xid),
+                             barrier_xid)
+
+    def _send(self, job, dpid, flows, flow_mods, first_xid):
+        """Add a switch to ``job`` and emit its flow mods, if connected."""
+        switch_job = SwitchJob(dpid, flows, first_xid)
+        switch = self.controller.get_switch_by_dpid(dpid)
+        connection = getattr(switch, 'connection', None)
+        if connection is None or not connection.is_established():
+            switch_job.errors.append({'error': 'switch not connected'})
+            switch_job.finish(FAILED)
+        elif not flows:
+            switch_job.finish(DONE)
+        self.jobs.add(job, switch_job)
+        if switch_job.state != QUEUED:
+            return
+        with self._lock:
+            progress = self._progress.setdefault(dpid, {'queued': 0,
+                                                        'sent': 0})
+            progress['queued'] += len(flows)
+        event_out = KytosEvent(name=('kytos/of_flow-manager.messages.out.'
+                                     'batch.ofpt_flow_mod'),
+                               content={'destination': connection,
+                                        'message': flow_mods,
+                                        'switch_job': switch_job})
+        outbound.send(self.controller, event_out, FLOW_MOD)
+
+    def trace(self, dpid, header):
+        """Return the hops of a packet entering switch ``dpid``.
+
+        Each hop has the switch dpid, the input port, the matching flow
+        (None if no flow matches) and its output ports. Outputs to ports
+        linked to other switches are followed, until a switch is visited
+        again with the same input port or after ``TRACE_MAX_HOPS`` hops.
+
+        Args:
+            dpid (str): Switch where the packet enters.
+            header (dict): Packet header, as in :meth:`FlowTable.classify`.
+
+        Returns:
+            list: Hops, as dictionaries.
+        """
+        hops = []
+        pending = deque([(dpid, header['in_port'])])
+        visited = set()
+        while pending and len(hops) < settings.TRACE_MAX_HOPS:
+            dpid, in_port = pending.popleft()
+            hop = {'dpid': dpid, 'in_port': in_port, 'flow': None,
+                   'outputs': []}
+            hops.append(hop)
+            if (dpid, in_port) in visited:
+                hop['loop'] = True
+                continue
+            visited.add((dpid, in_port))
+            switch = self.controller.get_switch_by_dpid(dpid)
+            if switch is None:
+                continue
+            flow = get_flow_table(switch).classify(dict(header,
+                                                        in_port=in_port))
+            if flow is None:
+                continue
+            hop['flow'] = flow.as_dict()['flow']
+            for action in flow.actions:
+                if not isinstance(action, OutputAction):
+                    continue
+                output = {'port': action.output_port}
+                hop['outputs'].append(output)
+                interface = switch.get_interface_by_port_no(
+                    action.output_port)
+                if interface is None:
+                    continue
+                for endpoint, _ in interface.endpoints:
+                    if isinstance(endpoint, Interface):
+                        output['switch'] = endpoint.switch.dpid
+                        output['switch_port'] = endpoint.port_number
+                        pending.append((endpoint.switch.dpid,
+                                        endpoint.port_number))
+                    else:
+                        output.setdefault('hosts', []).append(
+                            str(getattr(endpoint, 'value', endpoint)))
+        return hops
@@ -1,3 +1,14 @@
 """Settings from of_flow_manager NApp."""
 # Pooling frequency
 STATS_INTERVAL = 30
+
+#: Maximum switches visited by a packet trace, which stops at loops too
+TRACE_MAX_HOPS = 64
+
+#: Seconds a switch has to reply to the barrier request after the flow mods
+#: of a job, and that the flow mods of a job may wait in its outbound queue
+#: without any being written, before the job fails with a timeout
+JOB_TIMEOUT = 60
+
+#: Flow jobs kept, running or finished, for their state to be retrieved
+JOBS_MAX = 1000
@@ -0,0 +1,103 @@
+"""Test matching barrier replies and errors to flow jobs."""
+import unittest
+from unittest.mock import Mock, patch
+
+from napps.legacy.of_flow_manager import settings
+from napps.legacy.of_flow_manager.jobs import (DONE, FAILED, QUEUED, SENT,
+                                               TIMEOUT, FlowJob, JobTracker,
+                                               SwitchJob)
+
+
+class TestJobTracker(unittest.TestCase):
+    """Test the state of the switches of a job."""
+
+    def setUp(self):
+        """Add a job sending two flow mods to two switches."""
+        self.tracker = JobTracker()
+        self.flows = [Mock(id='flow1'), Mock(id='flow2')]
+        self.job = FlowJob('install')
+        self.switches = {}
+        for dpid in 'a', 'b':
+            first_xid = self.tracker.allocate_xids(len(self.flows) + 1)
+            switch_job = SwitchJob(dpid, self.flows, first_xid)
+            self.tracker.add(self.job, switch_job)
+            self.switches[dpid] = switch_job
+
+    def _state(self, dpid):
+        """Return the state of switch ``dpid`` in the job."""
+        return self.tracker.get(self.job.id)['switches'][dpid]['state']
+
+    def test_barrier_reply(self):
+        """Switches are done when they reply to the barrier request."""
+        for switch_job in self.switches.values():
+            self.tracker.sent(switch_job)
+        self.assertEqual(SENT, self._state('a'))
+        self.assertTrue(self.tracker.barrier_reply(
+            'a', self.switches['a'].barrier_xid))
+        self.assertEqual(DONE, self._state('a'))
+        self.assertEqual('running', self.tracker.get(self.job.id)['state'])
+        self.tracker.barrier_reply('b', self.switches['b'].barrier_xid)
+        self.assertEqual(DONE, self.tracker.get(self.job.id)['state'])
+        self.assertFalse(self.tracker.barrier_reply(
+            'b', self.switches['b'].barrier_xid))
+
+    def test_error(self):
+        """Errors of flow mods fail the switch and name the flow."""
+        switch_job = self.switches['a']
+        self.assertTrue(self.tracker.error('a', switch_job.first_xid + 1,
+                                           {'error_type': 3}))
+        self.tracker.barrier_reply('a', switch_job.barrier_xid)
+        job = self.tracker.get(self.job.id)
+        self.assertEqual(FAILED, job['switches']['a']['state'])
+        self.assertEqual([{'error_type': 3, 'flow': 'flow2'}],
+                         job['switches']['a']['errors'])
+        self.assertEqual(QUEUED, job['switches']['b']['state'])
+
+    def test_unknown_error(self):
+        """Errors of xids outside every job are ignored."""
+        xid = self.switches['a'].barrier_xid + 1
+        self.assertFalse(self.tracker.error('a', xid, {}))
+        self.assertFalse(self.tracker.error('c', 0, {}))
+        self.assertEqual([], self.switches['a'].errors)
+
+    def test_timeout(self):
+        """Switches inactive for JOB_TIMEOUT time out, even if queued."""
+        self.tracker.sent(self.switches['a'])
+        with patch.object(settings, 'JOB_TIMEOUT', 10):
+            self.switches['b'].active_at -= 20
+            self.assertEqual(SENT, self._state('a'))
+            self.assertEqual(TIMEOUT, self._state('b'))
+            self.switches['a'].active_at -= 20
+            self.assertEqual(TIMEOUT, self._state('a'))
+        self.assertEqual(FAILED, self.tracker.get(self.job.id)['state'])
+
+    def test_partly_sent(self):
+        """Switches stay queued and active until the barrier is written."""
+        switch_job = self.switches['a']
+        switch_job.active_at -= 20
+        self.tracker.sent(switch_job, last=False)
+        with patch.object(settings, 'JOB_TIMEOUT', 10):
+            self.assertEqual(QUEUED, self._state('a'))
+
+    def test_disconnected(self):
+        """Switches that disconnect fail."""
+        self.tracker.disconnected('b')
+        self.assertEqual(FAILED, self._state('b'))
+        self.assertEqual([{'error': 'switch disconnected'}],
+                         self.switches['b'].errors)
+        self.assertFalse(self.tracker.barrier_reply(
+            'b', self.switches['b'].barrier_xid))
+
+    @patch.object(settings, 'JOBS_MAX', 1)
+    def test_jobs_max(self):
+        """The oldest jobs are dropped."""
+        job = FlowJob('delete')
+        first_xid = self.tracker.allocate_xids(1)
+        self.tracker.add(job, SwitchJob('a', [], first_xid))
+        self.assertIsNone(self.tracker.get(self.job.id))
+        self.assertEqual([job.id],
+                         [kept['id'] for kept in self.tracker.get_all()])
+        self.assertFalse(self.tracker.barrier_reply(
+            'b', self.switches['b'].barrier_xid))
+        self.assertFalse(self.tracker.error(
+            'b', self.switches['b'].first_xid, {}))
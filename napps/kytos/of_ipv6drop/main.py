@@ -5,6 +5,8 @@ from kytos.core.helpers import listen_to
 from pyof.v0x01.common.flow_match import Match
 from pyof.v0x01.controller2switch.flow_mod import FlowMod, FlowModCommand
 
+from napps.legacy.of_core.outbound import FLOW_MOD, outbound
+
 
 class Main(KytosNApp):
     """Main class of of_ipv6drop NApp."""
@@ -41,7 +43,7 @@ class Main(KytosNApp):
                                content={'destination': switch.connection,
                                         'message': flow_mod})
         log.info('Sending "IPv6 DROP" flow to switch %s', switch.id)
-        self.controller.buffers.msg_out.put(event_out)
+        outbound.send(self.controller, event_out, FLOW_MOD)
 
     def shutdown(self):
         """End of the application."""
@@ -10,6 +10,8 @@ from pyof.v0x01.common.phy_port import Port
 from pyof.v0x01.controller2switch.flow_mod import FlowMod, FlowModCommand
 from pyof.v0x01.controller2switch.packet_out import PacketOut
 
+from napps.legacy.of_core.outbound import PACKET_OUT, outbound
+from napps.legacy.of_core.utils import iter_messages
 from napps.legacy.of_l2ls import settings
 
 
@@ -32,7 +34,8 @@ class Main(KytosNApp):
         """
         pass
 
-    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in')
+    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in',
+               'kytos/of_core.v0x01.messages.in.batch.ofpt_packet_in')
     def handle_packet_in(self, event):
         """Handle PacketIn Event.
 
@@ -41,9 +44,12 @@ class Main(KytosNApp):
         Args:
             event (KytosPacketIn): Received Event
         """
-        log.debug("PacketIn Received")
+        for packet_in in iter_messages(event):
+            self._handle_packet_in(event.source, packet_in)
 
-        packet_in = event.content['message']
+    def _handle_packet_in(self, source, packet_in):
+        """Learn the sender port and forward the packet of a PacketIn."""
+        log.debug("PacketIn Received")
 
         ethernet = Ethernet()
         ethernet.unpack(packet_in.data.value)
@@ -55,7 +61,7 @@ class Main(KytosNApp):
 
         # Learn the port where the sender is connected
         in_port = packet_in.in_port.value
-        switch = event.source.switch
+        switch = source.switch
         switch.update_mac_table(ethernet.source, in_port)
 
         ports = switch.where_is_mac(ethernet.destination)
@@ -71,9 +77,9 @@ class Main(KytosNApp):
             flow_mod.actions.append(ActionOutput(port=ports[0]))
             event_out = KytosEvent(name=('kytos/of_l2ls.messages.out.'
                                          'ofpt_flow_mod'),
-                                   content={'destination': event.source,
+                                   content={'destination': source,
                                             'message': flow_mod})
-            self.controller.buffers.msg_out.put(event_out)
+            outbound.send(self.controller, event_out, PACKET_OUT)
 
         # Send the packet to correct destination or flood it
         packet_out = PacketOut()
@@ -85,10 +91,10 @@ class Main(KytosNApp):
         packet_out.actions.append(ActionOutput(port=port))
         event_out = KytosEvent(name=('kytos/of_l2ls.messages.out.'
                                      'ofpt_packet_out'),
-                               content={'destination': event.source,
+                               content={'destination': source,
                                         'message': packet_out})
 
-        self.controller.buffers.msg_out.put(event_out)
+        outbound.send(self.controller, event_out, PACKET_OUT)
 
     def shutdown(self):
         """Too simple to have a shutdown procedure."""
@@ -8,6 +8,9 @@ from pyof.foundation.network_types import LLDP, Ethernet
 from pyof.v0x01.common.action import ActionOutput
 from pyof.v0x01.controller2switch.packet_out import PacketOut
 
+from napps.legacy.of_core.outbound import PACKET_OUT, outbound
+from napps.legacy.of_core.scheduler import scheduler
+from napps.legacy.of_core.utils import iter_messages
 from napps.legacy.of_lldp import constants, settings
 
 
@@ -16,53 +19,56 @@ class Main(KytosNApp):
 
     def setup(self):
         """Create an empty dict to store the switches references and data."""
-        self.execute_as_loop(settings.POOLING_TIME)
+        scheduler.register('legacy/of_lldp', settings.POOLING_TIME,
+                           self.send_lldp)
         self.lldp_log = getattr(log,
                                 settings.UNKOWN_LLDP_PACKETS_LOG_LEVEL.lower())
 
     def execute(self):
-        """Implement a loop to check switches liveness."""
-        switches = list(self.controller.switches.values())
-        for switch in switches:
-            if not (switch.is_connected() and
-                    switch.connection.protocol.version == 0x01):
+        """LLDP packets are sent by the of_core scheduler."""
+        pass
+
+    def send_lldp(self, switch):
+        """Send a LLDP packet out of each port of ``switch``."""
+        if switch.connection.protocol.version != 0x01:
+            return
+        # Gerar lldp para cada uma das portas do switch
+        # Gerar o hash de cada um dos pacotes e armazenar
+
+        for port in switch.features.ports:
+            output_action = ActionOutput()
+            output_action.port = port.port_no
+
+            # Avoid ports with speed == 0
+            if port.port_no.value == 65534:
                 continue
-            # Gerar lldp para cada uma das portas do switch
-            # Gerar o hash de cada um dos pacotes e armazenar
 
-            for port in switch.features.ports:
-                output_action = ActionOutput()
-                output_action.port = port.port_no
+            ethernet = Ethernet()
+            ethernet.ether_type = constants.LLDP_ETHERTYPE
+            ethernet.source = port.hw_addr
+            ethernet.destination = constants.LLDP_MULTICAST_MAC
 
-                # Avoid ports with speed == 0
-                if port.port_no.value == 65534:
-                    continue
+            lldp = LLDP()
+            lldp.chassis_id.sub_value = DPID(switch.dpid)
+            lldp.port_id.sub_value = port.port_no
 
-                ethernet = Ethernet()
-                ethernet.ether_type = constants.LLDP_ETHERTYPE
-                ethernet.source = port.hw_addr
-                ethernet.destination = constants.LLDP_MULTICAST_MAC
+            ethernet.data = lldp.pack()
 
-                lldp = LLDP()
-                lldp.chassis_id.sub_value = DPID(switch.dpid)
-                lldp.port_id.sub_value = port.port_no
+            packet_out = PacketOut()
+            packet_out.actions.append(output_action)
+            packet_out.data = ethernet.pack()
 
-                ethernet.data = lldp.pack()
+            event_out = KytosEvent()
+            event_out.name = 'kytos/of_lldp.messages.out.ofpt_packet_out'
+            event_out.content = {'destination': switch.connection,
+                                 'message': packet_out}
+            outbound.send(self.controller, event_out, PACKET_OUT)
 
-                packet_out = PacketOut()
-                packet_out.actions.append(output_action)
-                packet_out.data = ethernet.pack()
+            log.debug("Sending a LLDP PacketOut to the switch %s",
+                      switch.dpid)
 
-                event_out = KytosEvent()
-                event_out.name = 'kytos/of_lldp.messages.out.ofpt_packet_out'
-                event_out.content = {'destination': switch.connection,
-                                     'message': packet_out}
-                self.controller.buffers.msg_out.put(event_out)
-
-                log.debug("Sending a LLDP PacketOut to the switch %s",
-                          switch.dpid)
-
-    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in')
+    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in',
+               'kytos/of_core.v0x01.messages.in.batch.ofpt_packet_in')
     def update_links(self, event):
         """Method used to update interfaces when a Ethernet packet is received.
 
@@ -88,8 +94,10 @@ class Main(KytosNApp):
                     obj.unpack(value)
             return obj
 
-        ethernet = unpack_non_empty(event.message.data, Ethernet)
-        if ethernet.ether_type == constants.LLDP_ETHERTYPE:
+        for packet_in in iter_messages(event):
+            ethernet = unpack_non_empty(packet_in.data, Ethernet)
+            if ethernet.ether_type != constants.LLDP_ETHERTYPE:
+                continue
             try:
                 lldp = unpack_non_empty(ethernet.data, LLDP)
                 dpid = unpack_non_empty(lldp.chassis_id.sub_value, DPID)
@@ -101,9 +109,9 @@ class Main(KytosNApp):
 
                 self.lldp_log('Unknown LLDP packet received: %s',
                               ethernet.data)
-                return
+                continue
 
-            port_no_a = event.message.in_port
+            port_no_a = packet_in.in_port
             switch_a = event.source.switch
             interface_a = get_interface(port_no_a, switch_a)
 
@@ -118,3 +126,4 @@ class Main(KytosNApp):
     def shutdown(self):
         """End of the application."""
         log.debug('Shutting down...')
+        scheduler.unregister('legacy/of_lldp')
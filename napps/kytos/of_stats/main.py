@@ -1,11 +1,16 @@
 """Statistics application."""
+from functools import partial
 
 from kytos.core import KytosNApp, log, rest
 from kytos.core.helpers import listen_to
 from pyof.v0x01.controller2switch.stats_request import StatsTypes
 
+from napps.legacy.of_core.multipart import get_reassembly
+from napps.legacy.of_core.scheduler import scheduler
+from napps.legacy.of_core.utils import iter_messages
 from napps.legacy.of_stats import settings
-from napps.legacy.of_stats.stats import Description, FlowStats, PortStats
+from napps.legacy.of_stats.stats import (Description, FlowStats, PortStats,
+                                         StatsReply)
 from napps.legacy.of_stats.stats_api import FlowStatsAPI, PortStatsAPI, StatsAPI
 
 
@@ -13,9 +18,7 @@ class Main(KytosNApp):
     """Main class for statistics application."""
 
     def setup(self):
-        """Initialize all statistics and set their loop interval."""
-        self.execute_as_loop(settings.STATS_INTERVAL)
-
+        """Initialize all statistics and schedule their requests."""
         # Initialize statistics
         msg_out = self.controller.buffers.msg_out
         self._stats = {StatsTypes.OFPST_DESC.value: Description(msg_out),
@@ -26,34 +29,39 @@ class Main(KytosNApp):
         Description.controller = self.controller
         StatsAPI.controller = self.controller
 
+        # Each switch is queried at its own time within the interval
+        scheduler.register('legacy/of_stats', settings.STATS_INTERVAL,
+                           self._update_stats)
+
     def execute(self):
-        """Query all switches sequentially and then sleep before repeating."""
-        switches = list(self.controller.switches.values())
-        for switch in switches:
-            if not (switch.is_connected() and
-                    switch.connection.protocol.version == 0x01):
-                continue
-            self._update_stats(switch)
+        """Statistics are requested by the of_core scheduler."""
+        pass
 
     def shutdown(self):
         """End of the application."""
         log.debug('Shutting down...')
+        scheduler.unregister('legacy/of_stats')
 
     def _update_stats(self, switch):
+        if switch.connection.protocol.version != 0x01:
+            return
         for stats in self._stats.values():
-            if switch.connection is not None:
-                stats.request(switch.connection)
+            stats.request(switch.connection)
 
-    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_stats_reply')
+    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_stats_reply',
+               'kytos/of_core.v0x01.messages.in.batch.ofpt_stats_reply')
     def listener(self, event):
         """Store switch descriptions."""
-        msg = event.content['message']
-        if msg.body_type.value in self._stats:
-            stats = self._stats[msg.body_type.value]
-            stats.listen(event.source.switch.dpid, msg.body)
-        else:
-            log.debug('No listener for %s in %s.', msg.body_type.value,
-                      list(self._stats.keys()))
+        reassembly = get_reassembly(event.source, 'legacy/of_stats')
+        dpid = event.source.switch.dpid
+        for msg in iter_messages(event):
+            if msg.body_type.value in self._stats:
+                stats = self._stats[msg.body_type.value]
+                reassembly.add(msg.header.xid, msg.flags, msg.body,
+                               partial(StatsReply, stats, dpid), msg.fragment)
+            else:
+                log.debug('No listener for %s in %s.', msg.body_type.value,
+                          list(self._stats.keys()))
 
     # REST API
 
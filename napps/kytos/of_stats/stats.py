@@ -35,8 +35,15 @@ class Stats(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def listen(self, dpid, stats):
-        """Listener for statistics."""
+    def listen(self, dpid, stats, tstamp=None):
+        """Listener for statistics.
+
+        Args:
+            dpid (str): Switch dpid.
+            stats (list): Stats in the reply body.
+            tstamp (int): Unix timestamp in seconds of the reply. All
+                fragments of a multipart reply have the same one.
+        """
         pass
 
     def _send_event(self, req, conn):
@@ -247,6 +254,27 @@ class RRD:
         return averages
 
 
+class StatsReply:
+    """Multipart reply whose fragments are stored as they arrive.
+
+    All fragments are stored with the time the first one arrived.
+    """
+
+    def __init__(self, stats, dpid):
+        """Start a reply of ``stats`` from switch ``dpid``."""
+        self._stats = stats
+        self._dpid = dpid
+        self._tstamp = int(time.time())
+
+    def add(self, body):
+        """Store the stats in a fragment body."""
+        self._stats.listen(self._dpid, body, self._tstamp)
+
+    def finish(self):
+        """Return this object, as there is nothing else to store."""
+        return self
+
+
 class PortStats(Stats):
     """Deal with PortStats messages."""
 
@@ -261,14 +289,14 @@ class PortStats(Stats):
         log.debug('Port Stats request for switch %s sent.', conn.switch.dpid)
 
     @classmethod
-    def listen(cls, dpid, ports_stats):
+    def listen(cls, dpid, ports_stats, tstamp=None):
         """Receive port stats."""
         debug_msg = 'Received port %s stats of switch %s: rx_bytes %s,' \
                     ' tx_bytes %s, rx_dropped %s, tx_dropped %s,' \
                     ' rx_errors %s, tx_errors %s'
 
         for ps in ports_stats:
-            cls.rrd.update((dpid, ps.port_no.value),
+            cls.rrd.update((dpid, ps.port_no.value), tstamp,
                            rx_bytes=ps.rx_bytes.value,
                            tx_bytes=ps.tx_bytes.value,
                            rx_dropped=ps.rx_dropped.value,
@@ -300,7 +328,7 @@ class AggregateStats(Stats):
                   conn.switch.dpid)
 
     @classmethod
-    def listen(cls, dpid, aggregate_stats):
+    def listen(cls, dpid, aggregate_stats, tstamp=None):
         """Receive flow stats."""
         debug_msg = 'Received aggregate stats from switch {}:' \
                     ' packet_count {}, byte_count {}, flow_count {}'
@@ -308,7 +336,7 @@ class AggregateStats(Stats):
         for ag in aggregate_stats:
             # need to choose the _id to aggregate_stats
             # this class isn't used yet.
-            cls.rrd.update((dpid,),
+            cls.rrd.update((dpid,), tstamp,
                            packet_count=ag.packet_count.value,
                            byte_count=ag.byte_count.value,
                            flow_count=ag.flow_count.value)
@@ -330,11 +358,11 @@ class FlowStats(Stats):
         log.debug('Flow Stats request for switch %s sent.', conn.switch.dpid)
 
     @classmethod
-    def listen(cls, dpid, flows_stats):
+    def listen(cls, dpid, flows_stats, tstamp=None):
         """Receive flow stats."""
         for fs in flows_stats:
             flow = Flow.from_flow_stats(fs)
-            cls.rrd.update((dpid, flow.id),
+            cls.rrd.update((dpid, flow.id), tstamp,
                            packet_count=fs.packet_count.value,
                            byte_count=fs.byte_count.value)
 
@@ -358,7 +386,7 @@ class Description(Stats):
             self._send_event(req, conn)
             log.debug('Desc request for switch %s sent.', dpid)
 
-    def listen(self, dpid, desc):
+    def listen(self, dpid, desc, tstamp=None):
         """Store switch description."""
         self._desc[dpid] = desc
         switch = self.controller.get_switch_by_dpid(dpid)
@@ -7,6 +7,7 @@ from kytos.core.helpers import listen_to
 from pyof.foundation.basic_types import HWAddress
 from pyof.foundation.network_types import Ethernet
 
+from napps.legacy.of_core.utils import iter_messages
 from napps.legacy.of_topology import constants
 
 
@@ -27,7 +28,8 @@ class Main(KytosNApp):
         pass
 
     @staticmethod
-    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in')
+    @listen_to('kytos/of_core.v0x01.messages.in.ofpt_packet_in',
+               'kytos/of_core.v0x01.messages.in.batch.ofpt_packet_in')
     def update_links(event):
         """Receive a kytos event and update links interface.
 
@@ -37,12 +39,14 @@ class Main(KytosNApp):
         Parameters:
             event (KytosEvent): event with Ethernet packet.
         """
-        ethernet = Ethernet()
-        ethernet.unpack(event.message.data.value)
-        if ethernet.ether_type != constants.LLDP_ETHERTYPE:
-            port_no = event.message.in_port
+        switch = event.source.switch
+        for packet_in in iter_messages(event):
+            ethernet = Ethernet()
+            ethernet.unpack(packet_in.data.value)
+            if ethernet.ether_type == constants.LLDP_ETHERTYPE:
+                continue
+            port_no = packet_in.in_port
             hw_address = ethernet.source
-            switch = event.source.switch
             interface = switch.get_interface_by_port_no(port_no.value)
 
             if interface is not None and \